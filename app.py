@@ -3,20 +3,43 @@ app.py  —  DogScan AI  |  Flask Model API
 Run: python app.py  (dev)  |  gunicorn -w 2 -b 0.0.0.0:5001 app:app  (prod)
 
 Endpoints:
-  GET  /health
+  GET  /health                    (200 once models are loaded, else 503)
+  GET  /health/live               (process up — never touches the models)
+  GET  /health/ready              (200 when serving, else 503 + per-model startup progress)
   POST /predict/breed    { "image": "<base64>" }
+  POST /predict/breed/batch  { "images": ["<base64>", ...] }
+  POST /predict/breed/stream multipart frames=<img>... | clip=<gif/webp/video>, or
+                             { "frames": ["<base64>", ...] } | { "clip": "<base64>", "filename": "x.mp4" }
+                             -> NDJSON: "update" lines as the aggregate settles, then one "final"
   POST /predict/disease  { "image": "<base64>" }
+  GET  /admin/models              (X-Admin-Token)
+  POST /admin/models/reload       { "version": "v4" } | { "rollback": true } | {}   (X-Admin-Token)
+  GET  /shadow/summary            (X-Admin-Token, SHADOW_MODEL_PATH set)
+
+Startup: importing this module does not import TensorFlow or load any model.
+Models (pre-converted TFLite / SavedModel when present, see model_formats.py)
+and the dog gate load on a background thread; /predict/* answers 503 until
+/health/ready is green. Don't use gunicorn --preload (the loader thread does
+not survive fork). STARTUP_BLOCKING=1 loads synchronously at import instead.
 """
 
-import os, json, base64, io, logging
-import numpy as np
-from flask import Flask, request, jsonify
+import os, json, hmac, time, base64, logging, threading
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from PIL import Image, ImageOps
+from werkzeug.exceptions import RequestEntityTooLarge
 
-os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-import tensorflow as tf
-from tensorflow.keras.models import load_model
+import postprocess
+from inference import (decode_image, predict_breed_probs,
+                       predict_simple, predict_simple_batch)
+import quality
+import localize
+import video_scan
+import model_registry
+import executor
+from shadow import ShadowEvaluator
+from dog_gate import DogGate
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"     # TensorFlow itself is imported lazily by the loaders
 
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:5173", "http://localhost:5174", "http://localhost:5000"])
@@ -27,195 +50,206 @@ log = logging.getLogger(__name__)
 BASE_DIR   = os.path.dirname(os.path.abspath(__file__))
 MODELS_DIR = os.path.join(BASE_DIR, "models")
 
-def load_json(filename):
-    with open(os.path.join(MODELS_DIR, filename), "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def normalize_labels(raw, name_key="name"):
-    """Convert labels from dict/list/string variants to a uniform list of dicts."""
-    if isinstance(raw, dict):
-        items = sorted(raw.items(), key=lambda x: int(x[0]) if str(x[0]).isdigit() else 0)
-        out = []
-        for i, (k, v) in enumerate(items):
-            if isinstance(v, dict):
-                out.append({
-                    "class_index": int(v.get("class_index", i)),
-                    "class_name": str(v.get("class_name", k)),
-                    "display_name": str(v.get("display_name", v.get(name_key, k))),
-                    **v,
-                })
-            else:
-                out.append({
-                    "class_index": i,
-                    "class_name": str(v),
-                    "display_name": str(v),
-                })
-        return out
-
-    if isinstance(raw, list):
-        out = []
-        for i, item in enumerate(raw):
-            if isinstance(item, dict):
-                cls_name = item.get("class_name", item.get(name_key, item.get("display_name", f"class_{i}")))
-                display = item.get("display_name", item.get(name_key, cls_name))
-                out.append({
-                    "class_index": int(item.get("class_index", i)),
-                    "class_name": str(cls_name),
-                    "display_name": str(display),
-                    **item,
-                })
-            else:
-                out.append({
-                    "class_index": i,
-                    "class_name": str(item),
-                    "display_name": str(item),
-                })
-        return out
-
-    return []
-
-log.info("Loading label files...")
-BREED_LABELS   = normalize_labels(load_json("class_labels.json"), name_key="display_name")
-EMOTION_LABELS = normalize_labels(load_json("emotion_labels.json"))
-AGE_LABELS     = normalize_labels(load_json("age_labels.json"))
-DISEASE_LABELS = normalize_labels(load_json("disease_info.json"), name_key="name")
-
-log.info("Loading Keras models... (may take a moment)")
-BREED_MODEL   = load_model(os.path.join(MODELS_DIR, "trained_model", "dog_breed_model.h5"))
-EMOTION_MODEL = load_model(os.path.join(MODELS_DIR, "trained_model","dog_emotion_model.h5"))
-AGE_MODEL     = load_model(os.path.join(MODELS_DIR, "trained_model","dog_age_model.h5"))
-DISEASE_MODEL = load_model(os.path.join(MODELS_DIR, "trained_model","dog_skin_disease_model.h5"))
-
-_dummy = np.zeros((1, 224, 224, 3), dtype=np.float32)
-for _m in [BREED_MODEL, EMOTION_MODEL, AGE_MODEL, DISEASE_MODEL]:
-    _m.predict(_dummy, verbose=0)
-log.info("All models loaded and warmed up")
-
-# TTA config — mirrors your test script exactly
-TTA_ROTATIONS  = (-15, -7, 0, 7, 15)
-TTA_HFLIP      = True
-TTA_BATCH_SIZE = 8
-
-UNCERTAIN_THRESHOLDS = {
-    "max_prob":  0.55,
-    "margin":    0.18,
-    "top3_sum":  0.60,
-    "entropy":   0.8,
-}
-MIXED_BREED_SETTINGS = {
-    "min_secondary_prob":  0.10,
-    "max_breeds_to_show":  4,
-    "confident_threshold": 0.75,
-}
-
-def preprocess_pil(img, target_size):
-    """Aspect-ratio preserving resize + white padding — same as your test script."""
-    img = img.convert("RGB")
-    img.thumbnail(target_size, Image.LANCZOS)
-    padded = Image.new("RGB", target_size, (255, 255, 255))
-    left = (target_size[0] - img.width)  // 2
-    top  = (target_size[1] - img.height) // 2
-    padded.paste(img, (left, top))
-    return np.asarray(padded).astype("float32") / 255.0
-
-def decode_image(b64_string):
-    if "," in b64_string:
-        b64_string = b64_string.split(",", 1)[1]
-    return Image.open(io.BytesIO(base64.b64decode(b64_string))).convert("RGB")
-
-def predict_with_tta(pil_img, model):
-    """Rotations + hflip variants, batch predict, average — same as your test script."""
-    input_shape = model.input_shape
-    target_size = (input_shape[2], input_shape[1])
-    variants = []
-    for angle in TTA_ROTATIONS:
-        rotated = pil_img.rotate(angle, resample=Image.BILINEAR, expand=False)
-        variants.append(preprocess_pil(rotated, target_size))
-        if TTA_HFLIP:
-            variants.append(preprocess_pil(ImageOps.mirror(rotated), target_size))
-    preds = []
-    for i in range(0, len(variants), TTA_BATCH_SIZE):
-        batch = np.stack(variants[i : i + TTA_BATCH_SIZE], axis=0)
-        preds.append(model.predict(batch, verbose=0))
-    return np.concatenate(preds, axis=0).mean(axis=0)
-
-def predict_simple(pil_img, model):
-    """Single-pass predict — used for emotion and age."""
-    input_shape = model.input_shape
-    target_size = (input_shape[2], input_shape[1])
-    arr = preprocess_pil(pil_img, target_size)
-    return model.predict(np.expand_dims(arr, 0), verbose=0)[0]
-
-def softmax_entropy(p):
-    p = np.clip(p, 1e-12, 1.0)
-    return float(-np.sum(p * np.log(p)))
-
-def label_by_index(labels, idx):
-    target = int(idx)
-    for i, item in enumerate(labels):
-        if isinstance(item, dict):
-            item_idx = item.get("class_index", i)
+MODEL_POLL_SECONDS = float(os.environ.get("MODEL_POLL_SECONDS", "10"))
+ADMIN_TOKEN        = os.environ.get("ADMIN_TOKEN", "")
+
+# Optional per-model lanes + priority scheduling (executor.py, EXECUTOR=on)
+EXECUTOR = executor.ModelExecutor.from_env()
+
+def load_model_set(version, models_dir, progress=None):
+    if not EXECUTOR:
+        return model_registry.load_model_set(version, models_dir, progress)
+    return EXECUTOR.wrap_set(model_registry.load_model_set(version, models_dir, progress, EXECUTOR.threads,
+                                                           runner=EXECUTOR.pinned))
+
+MODELS = model_registry.ModelHolder(MODELS_DIR, loader=load_model_set)
+
+# Cheap ImageNet "is there a dog" pre-filter for breed scans (DOG_GATE=off disables); set by startup().
+# Optional: if it can't load (e.g. no network for the ImageNet weights) breed scans run ungated.
+DOG_GATE = None
+
+STARTUP = {"started_at": time.time(), "phase": "starting", "ready": False, "error": None, "timings": {},
+           "dog_gate": {"status": "pending", "error": None}}
+
+def startup():
+    """Load the model set and the dog gate side by side, then start following the registry."""
+    global DOG_GATE
+    def timed(name, fn):
+        started = time.perf_counter()
+        result = fn()
+        STARTUP["timings"][name] = round(time.perf_counter() - started, 2)
+        return result
+    try:
+        STARTUP["phase"] = "loading"
+        if EXECUTOR:
+            EXECUTOR.configure_tensorflow()
+        gate = {}
+        def load_gate():
             try:
-                item_idx = int(item_idx)
-            except Exception:
-                continue
-            if item_idx == target:
-                return item
-            continue
-        if i == target:
-            text = str(item)
-            return {"class_index": i, "class_name": text, "display_name": text}
-    return {}
+                gate["gate"] = timed("dog_gate_s", DogGate.from_env)
+            except Exception as e:
+                gate["error"] = e
+        gate_thread = threading.Thread(target=load_gate, name="startup-dog-gate", daemon=True)
+        gate_thread.start()
+        timed("models_s", MODELS.load_initial)
+        gate_thread.join()
+        if "error" in gate:
+            log.warning("Dog gate failed to load — breed scans run without it: %s", gate["error"])
+            STARTUP["dog_gate"] = {"status": "failed", "error": str(gate["error"])}
+        else:
+            DOG_GATE = gate["gate"]
+            STARTUP["dog_gate"] = {"status": "on" if DOG_GATE else "off", "error": None}
+        MODELS.watch(MODEL_POLL_SECONDS)
+        STARTUP.update(phase="ready", ready=True)
+        STARTUP["timings"]["total_s"] = round(time.time() - STARTUP["started_at"], 2)
+        log.info("Ready: model version %s %s in %.1fs", MODELS.version, MODELS.current.formats,
+                 STARTUP["timings"]["total_s"])
+    except Exception as e:
+        STARTUP.update(phase="failed", error=str(e))
+        log.exception("Startup failed")
+
+if os.environ.get("STARTUP_BLOCKING", "0") == "1":
+    startup()
+else:
+    threading.Thread(target=startup, name="startup", daemon=True).start()
+
+MAX_BATCH_IMAGES = 16
+MAX_STREAM_BYTES = 50 * 1024 * 1024     # whole multi-frame upload
+app.config["MAX_CONTENT_LENGTH"] = MAX_STREAM_BYTES     # also enforced on chunked bodies (no Content-Length)
+
+# Cheap pre-inference quality gate (quality.py): "on" rejects / downgrades, "off" skips it
+QUALITY_GATE = os.environ.get("QUALITY_GATE", "on").lower() != "off"
+
+# Optional Grad-CAM dog crop before TTA / emotion / age / disease (localize.py)
+LOCALIZE = os.environ.get("LOCALIZE", "off").lower() == "on"
+
+def check_quality(pil_img):
+    return quality.assess(pil_img) if QUALITY_GATE else {"action": "full", "flags": [], "metrics": {}}
+
+def quality_rejection(q):
+    return {"error": f"Image quality too low ({', '.join(q['flags'])}). Please retake the photo.", "quality": q}
 
 def top1_result(preds, labels):
-    idx = int(np.argmax(preds))
-    return {"class_index": idx, "confidence": round(float(preds[idx]) * 100, 2), **label_by_index(labels, idx)}
-
-def analyze_breed(preds):
-    TOP_K     = 3
-    top_idx   = np.argsort(preds)[::-1][:TOP_K]
-    top_probs = preds[top_idx]
-    p1        = float(top_probs[0])
-    p2        = float(top_probs[1]) if len(top_probs) > 1 else 0.0
-    topk_sum  = float(top_probs.sum())
-    entropy   = softmax_entropy(preds)
-    margin    = p1 - p2
-
-    is_mixed, is_uncertain, reasons = False, False, []
-
-    if p1      < UNCERTAIN_THRESHOLDS["max_prob"]:  is_mixed     = True;  reasons.append(f"low_confidence ({p1:.2f})")
-    if margin  < UNCERTAIN_THRESHOLDS["margin"]:    is_mixed     = True;  reasons.append(f"close_margin ({margin:.2f})")
-    if topk_sum< UNCERTAIN_THRESHOLDS["top3_sum"]:  is_uncertain = True;  reasons.append(f"spread_predictions ({topk_sum:.2f})")
-    if entropy > UNCERTAIN_THRESHOLDS["entropy"]:   is_mixed     = True;  reasons.append(f"high_entropy ({entropy:.2f})")
-
-    is_pure    = p1 >= MIXED_BREED_SETTINGS["confident_threshold"]
-    mix_pct    = (top_probs / topk_sum * 100.0) if topk_sum > 0 else np.zeros(TOP_K)
-    top_breeds = []
-
-    for i, (idx, pct) in enumerate(zip(top_idx, mix_pct)):
-        raw  = float(preds[idx])
-        if is_mixed and raw < MIXED_BREED_SETTINGS["min_secondary_prob"]:
-            continue
-        entry = label_by_index(BREED_LABELS, idx)
-        if not entry:
-            continue
-        top_breeds.append({
-            "rank":         i + 1,
-            "class_index":  int(idx),
-            "class_name":   entry.get("class_name", ""),
-            "display_name": entry.get("display_name", ""),
-            "breed_id":     entry.get("breed_id"),
-            "confidence":   round(raw * 100, 2),
-            "mix_share":    round(float(pct), 1),
-        })
-
-    result_type = "pure_breed" if is_pure else ("mixed_breed" if is_mixed else "uncertain")
-    return {"result_type": result_type, "top_breeds": top_breeds, "entropy": round(entropy, 4), "reasons": reasons}
+    return postprocess.top1_results(preds, labels)[0]
+
+def analyze_breeds(probs, ms):
+    """Temperature comes from the same model version as the probabilities (model_registry calibration)."""
+    return postprocess.analyze_breeds(probs, ms.labels["breed"], k=3, temperature=ms.calibration["breed_temperature"])
+
+def analyze_breed(preds, ms):
+    return analyze_breeds(preds, ms)[0]
+
+def dog_regions(pil_imgs, ms):
+    """Crop each photo to the dog once per request; every model of the request reuses the crop."""
+    if not LOCALIZE:
+        return pil_imgs, [None] * len(pil_imgs)
+    cache = g.setdefault("dog_regions", {})
+    missing = [img for img in pil_imgs if id(img) not in cache]
+    if missing:
+        breed_model = getattr(ms.models["breed"], "wrapped", ms.models["breed"])     # Grad-CAM needs the Keras model
+        for img, region in zip(missing, localize.localize_images(missing, breed_model)):
+            cache[id(img)] = region
+    return [cache[id(img)][0] for img in pil_imgs], [cache[id(img)][1] for img in pil_imgs]
+
+def check_dog_presence(pil_imgs):
+    return DOG_GATE.check_batch(pil_imgs) if DOG_GATE else [None] * len(pil_imgs)
+
+def no_dog_response(presence, version, q):
+    """Early exit — none of the breed / emotion / age models ran."""
+    return {
+        "scan_type":    "breed",
+        "model_version": version,
+        "result_type":  "no_dog",
+        "top_breeds":   [],
+        "reasons":      [f"no_dog_detected ({presence['dog_probability']:.2f})"],
+        "emotion":      None,
+        "age":          None,
+        "dog_presence": presence,
+        "quality":      q,
+    }
+
+def breed_response(breed_data, emotion, age, version, q, presence=None, region=None):
+    return {
+        "scan_type":   "breed",
+        "model_version": version,
+        "result_type": breed_data["result_type"],
+        "top_breeds":  breed_data["top_breeds"],
+        "reasons":     breed_data["reasons"],
+        "emotion":     emotion,
+        "age":         age,
+        "dog_presence": presence,
+        "localization": region,
+        "quality":     q,
+    }
+
+# Optional shadow evaluation of a candidate breed model (off unless SHADOW_MODEL_PATH is set)
+SHADOW = ShadowEvaluator.from_env(predict_breed_probs, MODELS_DIR)
+if SHADOW:
+    log.info("Shadow mode on: %.0f%% of breed requests mirrored to %s", SHADOW.fraction * 100, SHADOW.model_path)
+
 
+def startup_status():
+    return {**STARTUP, "uptime_s": round(time.time() - STARTUP["started_at"], 2), "models": MODELS.progress}
+
+@app.before_request
+def require_models():
+    if request.path.startswith("/predict") and not STARTUP["ready"]:
+        error = "Model startup failed" if STARTUP["phase"] == "failed" else "Models are still loading, retry shortly"
+        return jsonify({"error": error, "startup": startup_status()}), 503
 
 @app.get("/health")
 def health():
-    return jsonify({"status": "ok", "models_loaded": 4})
+    if not STARTUP["ready"]:
+        return jsonify({"status": STARTUP["phase"], "models_loaded": 0, "model_version": None,
+                        "dog_gate": STARTUP["dog_gate"]}), 503
+    return jsonify({"status": "ok", "models_loaded": len(MODELS.current.models), "model_version": MODELS.version,
+                    "dog_gate": STARTUP["dog_gate"]})
+
+@app.get("/health/live")
+def health_live():
+    return jsonify({"status": "alive", "uptime_s": round(time.time() - STARTUP["started_at"], 2)})
+
+@app.get("/health/ready")
+def health_ready():
+    return jsonify(startup_status()), (200 if STARTUP["ready"] else 503)
+
+
+def admin_authorized():
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+@app.get("/admin/models")
+def admin_models():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    manifest = model_registry.read_manifest(MODELS_DIR) or {}
+    return jsonify({**MODELS.status(), "versions": sorted(manifest.get("versions", {})),
+                    "executor": EXECUTOR.status() if EXECUTOR else None})
+
+@app.post("/admin/models/reload")
+def admin_models_reload():
+    """Activate `version` (or re-read the manifest) and load it in the background.
+    Other workers follow via the manifest watcher."""
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    body = request.get_json(force=True, silent=True) or {}
+    try:
+        if body.get("version"):
+            model_registry.activate(body["version"], MODELS_DIR)
+        elif body.get("rollback"):
+            model_registry.rollback(MODELS_DIR)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    started = MODELS.reload_async()
+    return jsonify({**MODELS.status(), "reload_started": started}), 202
+
+@app.get("/shadow/summary")
+def shadow_summary():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if not SHADOW:
+        return jsonify({"error": "Shadow mode disabled (set SHADOW_MODEL_PATH)"}), 404
+    return jsonify(SHADOW.summary())
 
 
 @app.post("/predict/breed")
@@ -227,22 +261,170 @@ def predict_breed():
         pil_img = decode_image(body["image"])
     except Exception as e:
         return jsonify({"error": f"Image decode failed: {e}"}), 422
+    q = check_quality(pil_img)
+    if q["action"] == "reject":
+        return jsonify(quality_rejection(q)), 422
     try:
-        breed_data = analyze_breed(predict_with_tta(pil_img, BREED_MODEL))
-        emotion    = top1_result(predict_simple(pil_img, EMOTION_MODEL), EMOTION_LABELS)
-        age        = top1_result(predict_simple(pil_img, AGE_MODEL),     AGE_LABELS)
+        ms         = MODELS.current      # one version for the whole request, even across a swap
+        presence   = check_dog_presence([pil_img])[0]
+        if presence and not presence["is_dog"]:
+            return jsonify(no_dog_response(presence, ms.version, q))
+        (dog_img,), (region,) = dog_regions([pil_img], ms)
+        started    = time.perf_counter()
+        breed_probs = predict_breed_probs([dog_img], ms.models["breed"], [q["action"]], ms.serving["breed"]["tta"])[0]
+        breed_ms   = (time.perf_counter() - started) * 1000
+        breed_data = analyze_breed(breed_probs, ms)
+        emotion    = top1_result(predict_simple(dog_img, ms.models["emotion"]), ms.labels["emotion"])
+        age        = top1_result(predict_simple(dog_img, ms.models["age"]),     ms.labels["age"])
     except Exception as e:
         log.exception("Inference error (breed)")
         return jsonify({"error": f"Inference failed: {e}"}), 500
 
-    return jsonify({
-        "scan_type":   "breed",
-        "result_type": breed_data["result_type"],
-        "top_breeds":  breed_data["top_breeds"],
-        "reasons":     breed_data["reasons"],
-        "emotion":     emotion,
-        "age":         age,
-    })
+    if SHADOW and q["action"] == "full":
+        SHADOW.submit(dog_img, breed_probs, breed_ms, ms.version)
+    return jsonify(breed_response(breed_data, emotion, age, ms.version, q, presence, region))
+
+
+@app.post("/predict/breed/batch")
+def predict_breed_batch():
+    body = request.get_json(force=True, silent=True) or {}
+    images = body.get("images")
+    if not isinstance(images, list) or not images:
+        return jsonify({"error": "Missing 'images' field (list of base64)"}), 400
+    if len(images) > MAX_BATCH_IMAGES:
+        return jsonify({"error": f"At most {MAX_BATCH_IMAGES} images per batch"}), 413
+    pil_imgs = []
+    for i, b64 in enumerate(images):
+        try:
+            pil_imgs.append(decode_image(b64))
+        except Exception as e:
+            return jsonify({"error": f"Image {i} decode failed: {e}"}), 422
+    qs   = [check_quality(img) for img in pil_imgs]
+    keep = [i for i, q in enumerate(qs) if q["action"] != "reject"]
+    results = [quality_rejection(q) for q in qs]
+    ms = MODELS.current
+    try:
+        presence = dict(zip(keep, check_dog_presence([pil_imgs[i] for i in keep]))) if keep else {}
+    except Exception as e:
+        log.exception("Inference error (dog gate)")
+        return jsonify({"error": f"Inference failed: {e}"}), 500
+    for i, p in presence.items():
+        if p and not p["is_dog"]:
+            results[i] = no_dog_response(p, ms.version, qs[i])
+    keep = [i for i in keep if not (presence[i] and not presence[i]["is_dog"])]
+    if keep:
+        try:
+            # batch work yields to single-image scans on the executor lanes
+            with executor.request_priority(executor.BATCH):
+                kept, regions = dog_regions([pil_imgs[i] for i in keep], ms)
+                probs    = predict_breed_probs(kept, ms.models["breed"], [qs[i]["action"] for i in keep],
+                                               ms.serving["breed"]["tta"])
+                emotions = postprocess.top1_results(predict_simple_batch(kept, ms.models["emotion"]), ms.labels["emotion"])
+                ages     = postprocess.top1_results(predict_simple_batch(kept, ms.models["age"]),     ms.labels["age"])
+            breeds   = analyze_breeds(probs, ms)
+        except Exception as e:
+            log.exception("Inference error (breed batch)")
+            return jsonify({"error": f"Inference failed: {e}"}), 500
+        for i, b, e, a, r in zip(keep, breeds, emotions, ages, regions):
+            results[i] = breed_response(b, e, a, ms.version, qs[i], presence[i], r)
+
+    return jsonify({"results": results})
+
+
+def stream_frames_from_request():
+    """(timestamp, PIL image) iterator for /predict/breed/stream, from multipart or JSON.
+    Raises on unreadable input before the response starts, so bad uploads get a 400."""
+    if request.files:
+        if "clip" in request.files:
+            clip = request.files["clip"]
+            return video_scan.frames_from_clip(clip.read(), clip.filename or "")
+        return video_scan.frames_from_images([f.read() for f in request.files.getlist("frames")])
+    body = request.get_json(force=True, silent=True) or {}
+    if body.get("clip"):
+        clip = body["clip"].split(",", 1)[-1]
+        return video_scan.frames_from_clip(base64.b64decode(clip), body.get("filename", ""))
+    if isinstance(body.get("frames"), list) and body["frames"]:
+        return video_scan.frames_from_images([base64.b64decode(b64.split(",", 1)[-1]) for b64 in body["frames"]])
+    raise ValueError("Send 'frames' (images) or a 'clip' (GIF / WebP / video)")
+
+def stream_result(agg, ms, counts):
+    breed   = analyze_breed(agg.mean("breed"), ms)
+    emotion = top1_result(agg.mean("emotion"), ms.labels["emotion"])
+    age     = top1_result(agg.mean("age"),     ms.labels["age"])
+    return {**breed_response(breed, emotion, age, ms.version, None), "frames": {**counts, "used": agg.frames}}
+
+def stream_scan(frames, ms):
+    """Select -> gate -> batch through breed / emotion / age -> aggregate; one NDJSON line per update."""
+    selector = video_scan.FrameSelector()
+    agg      = video_scan.TemporalAggregator()
+    skipped  = {"low_quality": 0, "no_dog": 0}
+    batch, weights = [], []
+
+    def line(event, **payload):
+        return json.dumps({"event": event, **payload}) + "\n"
+
+    def run_batch():
+        presence = check_dog_presence(batch)
+        keep = [i for i, p in enumerate(presence) if not (p and not p["is_dog"])]
+        skipped["no_dog"] += len(batch) - len(keep)
+        if not keep:
+            return False
+        imgs = [batch[i] for i in keep]
+        with executor.request_priority(executor.BATCH):
+            probs = {kind: predict_simple_batch(imgs, ms.models[kind]) for kind in ("breed", "emotion", "age")}
+        agg.add(probs, [weights[i] for i in keep])
+        return True
+
+    try:
+        for ts, frame in frames:
+            if selector.counts["decoded"] >= video_scan.MAX_DECODED or selector.full:
+                break
+            img = selector.offer(ts, frame)
+            if img is None:
+                continue
+            q = check_quality(img)
+            if q["action"] == "reject":
+                skipped["low_quality"] += 1
+                continue
+            batch.append(img)
+            weights.append(1.0 if q["action"] == "full" else video_scan.REDUCED_WEIGHT)
+            if len(batch) < video_scan.BATCH_FRAMES:
+                continue
+            added, batch, weights = run_batch(), [], []
+            if added:
+                stable = agg.stable()
+                result = stream_result(agg, ms, {**selector.counts, **skipped})
+                yield line("final" if stable else "update", stable=stable, stopped_early=stable, **result)
+                if stable:
+                    return
+        if batch:
+            run_batch()
+    except Exception as e:
+        log.exception("Inference error (breed stream)")
+        yield line("error", error=f"Stream scan failed: {e}")
+        return
+
+    counts = {**selector.counts, **skipped}
+    if not agg.frames:
+        error = "No dog detected in the clip" if skipped["no_dog"] else "No usable frames in the clip"
+        yield line("final", stable=False, stopped_early=False, error=error, frames={**counts, "used": 0})
+    else:
+        yield line("final", stable=agg.stable(), stopped_early=False, **stream_result(agg, ms, counts))
+
+
+@app.post("/predict/breed/stream")
+def predict_breed_stream():
+    too_large = jsonify({"error": f"Upload larger than {MAX_STREAM_BYTES // (1024 * 1024)} MB"}), 413
+    if (request.content_length or 0) > MAX_STREAM_BYTES:
+        return too_large
+    try:
+        frames = stream_frames_from_request()
+    except RequestEntityTooLarge:                    # chunked body past MAX_CONTENT_LENGTH
+        return too_large
+    except Exception as e:
+        return jsonify({"error": f"Could not read frames: {e}"}), 400
+    ms = MODELS.current
+    return Response(stream_with_context(stream_scan(frames, ms)), mimetype="application/x-ndjson")
 
 
 @app.post("/predict/disease")
@@ -254,29 +436,20 @@ def predict_disease():
         pil_img = decode_image(body["image"])
     except Exception as e:
         return jsonify({"error": f"Image decode failed: {e}"}), 422
+    q = check_quality(pil_img)
+    if q["action"] == "reject":
+        return jsonify(quality_rejection(q)), 422
     try:
-        preds   = predict_simple(pil_img, DISEASE_MODEL)
-        top_idx = np.argsort(preds)[::-1][:3]
-        diseases = []
-        for i, idx in enumerate(top_idx):
-            entry = label_by_index(DISEASE_LABELS, idx)
-            if not entry: continue
-            diseases.append({
-                "rank":         i + 1,
-                "class_index":  int(idx),
-                "class_name":   entry.get("class_name", ""),
-                "display_name": entry.get("display_name", entry.get("class_name", "")),
-                "confidence":   round(float(preds[idx]) * 100, 2),
-                "description":  entry.get("description", ""),
-                "treatment":    entry.get("treatment", ""),
-                "severity":     entry.get("severity", ""),
-            })
+        ms       = MODELS.current
+        (dog_img,), (region,) = dog_regions([pil_img], ms)
+        diseases = postprocess.ranked_results(predict_simple(dog_img, ms.models["disease"]), ms.labels["disease"], k=3)[0]
     except Exception as e:
         log.exception("Inference error (disease)")
         return jsonify({"error": f"Inference failed: {e}"}), 500
 
-    return jsonify({"scan_type": "disease", "top_diseases": diseases})
+    return jsonify({"scan_type": "disease", "model_version": ms.version, "top_diseases": diseases,
+                    "localization": region, "quality": q})
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=False)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", "5001")), debug=False)
@@ -78,6 +78,12 @@ router.post("/breed", auth, upload.single("image"), async (req, res) => {
     // 1. Call Flask
     const flaskData = await callFlask("/predict/breed", toBase64(req.file));
     if (flaskData.error) return res.status(502).json({ error: flaskData.error });
+    if (flaskData.result_type === "no_dog")
+      return res.status(422).json({
+        error: "No dog detected in this photo. Please upload a clear picture of a dog.",
+        result_type:  "no_dog",
+        dog_presence: flaskData.dog_presence,
+      });
 
     // 2. Enrich top breeds with DB data
     const enrichedBreeds = await Promise.all(
@@ -96,12 +102,19 @@ router.post("/breed", auth, upload.single("image"), async (req, res) => {
       top_breeds: enrichedBreeds,
       emotion:    flaskData.emotion,
       age:        flaskData.age,
+      quality:    flaskData.quality,
     });
 
   } catch (err) {
     console.error("[scans/breed] Error:", err.message, err?.response?.data);
     if (err.code === "ECONNREFUSED")
       return res.status(503).json({ error: "ML service unavailable. Start the Flask app with: python app.py" });
+    // Flask is up but still loading models – retryable
+    if (err?.response?.status === 503)
+      return res.status(503).json({ error: err.response.data?.error || "ML service is starting up. Please retry shortly." });
+    // Flask quality gate rejected the photo – pass the reason through as a client error
+    if (err?.response?.status === 422 && err.response.data?.quality)
+      return res.status(422).json(err.response.data);
     const msg = err?.response?.data?.error || err.message || "Scan failed. Please try again.";
     return res.status(500).json({ error: msg });
   }
@@ -126,12 +139,19 @@ router.post("/disease", auth, upload.single("image"), async (req, res) => {
     return res.json({
       scan_type:    "disease",
       top_diseases: topDiseases,
+      quality:      flaskData.quality,
     });
 
   } catch (err) {
     console.error("[scans/disease] Error:", err.message, err?.response?.data);
     if (err.code === "ECONNREFUSED")
       return res.status(503).json({ error: "ML service unavailable. Start the Flask app with: python app.py" });
+    // Flask is up but still loading models – retryable
+    if (err?.response?.status === 503)
+      return res.status(503).json({ error: err.response.data?.error || "ML service is starting up. Please retry shortly." });
+    // Flask quality gate rejected the photo – pass the reason through as a client error
+    if (err?.response?.status === 422 && err.response.data?.quality)
+      return res.status(422).json(err.response.data);
     const msg = err?.response?.data?.error || err.message || "Scan failed. Please try again.";
     return res.status(500).json({ error: msg });
   }
@@ -0,0 +1,141 @@
+"""
+bench_executor.py  —  DogScan AI  |  Tail latency with and without the executor lanes
+Run: python bench_executor.py  [--concurrency 1 2 4 8] [--duration 20] [--batch_clients 1]
+                               [--threads breed=2,emotion=1,age=1,disease=1] [--affinity breed=0-1,...]
+
+Replays the app.py inference mix in-process, against the current model version:
+  • `concurrency` interactive clients — single-image breed scans (TTA + emotion
+    + age) and disease scans (BREED_SHARE of them breed), back to back
+  • `batch_clients` background clients — BATCH_IMAGES-image breed batches, as
+    /predict/breed/batch sends them
+once with plain model.predict() calls (TF default pools) and once through
+executor.py (per-model lanes, thread counts, priorities). Each mode runs in a
+fresh process so TF thread-pool settings take effect. Prints and writes p50 /
+p95 / p99 interactive latency and throughput per concurrency level.
+"""
+
+import os, sys, json, time, random, argparse, threading, subprocess
+import numpy as np
+
+BASE_DIR   = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_DIR = os.path.join(BASE_DIR, "frontend", "public", "image", "breed_library_images")
+OUT_FILE   = os.path.join(BASE_DIR, "models", "executor_benchmark.json")
+BREED_SHARE  = 0.7
+BATCH_IMAGES = 8
+SAMPLE_IMAGES = 24
+
+
+def pct(values, q):
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+def load_images(n=SAMPLE_IMAGES):
+    from PIL import Image
+    names = sorted(os.listdir(SAMPLE_DIR))[:n]
+    return [Image.open(os.path.join(SAMPLE_DIR, name)).convert("RGB") for name in names]
+
+def run_level(ms, images, concurrency, batch_clients, duration):
+    import executor
+    from inference import predict_breed_probs, predict_simple
+    stop = threading.Event()
+    latencies, kinds, batch_done = [], [], [0]
+    lock = threading.Lock()
+
+    def interactive(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            img = rng.choice(images)
+            breed = rng.random() < BREED_SHARE
+            started = time.perf_counter()
+            if breed:
+                predict_breed_probs([img], ms.models["breed"], ["full"], ms.serving["breed"]["tta"])
+                predict_simple(img, ms.models["emotion"])
+                predict_simple(img, ms.models["age"])
+            else:
+                predict_simple(img, ms.models["disease"])
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+                kinds.append("breed" if breed else "disease")
+
+    def background(seed):
+        rng = random.Random(seed)
+        with executor.request_priority(executor.BATCH):
+            while not stop.is_set():
+                predict_breed_probs(rng.sample(images, BATCH_IMAGES), ms.models["breed"], ["full"] * BATCH_IMAGES,
+                                    ms.serving["breed"]["tta"])
+                with lock:
+                    batch_done[0] += BATCH_IMAGES
+
+    threads = ([threading.Thread(target=interactive, args=(i,), daemon=True) for i in range(concurrency)] +
+               [threading.Thread(target=background, args=(1000 + i,), daemon=True) for i in range(batch_clients)])
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    by_kind = {k: [l for l, kk in zip(latencies, kinds) if kk == k] for k in ("breed", "disease")}
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / duration, 2),
+        "latency_ms": {"p50": pct(latencies, 50), "p95": pct(latencies, 95), "p99": pct(latencies, 99)},
+        "p99_by_kind_ms": {k: pct(v, 99) for k, v in by_kind.items()},
+        "batch_images_per_s": round(batch_done[0] / duration, 2),
+    }
+
+def run_mode(mode, args):
+    """One process, one mode: load models, warm up, sweep the concurrency levels."""
+    import model_registry, executor
+    ex = None
+    if mode == "scheduled":
+        ex = executor.ModelExecutor(threads=executor.parse_lane_map(args.threads, int),
+                                    affinity=executor.parse_lane_map(args.affinity, executor.parse_cpus))
+        ex.configure_tensorflow()
+    ms = model_registry.load_model_set(model_registry.current_version(args.models_dir), args.models_dir,
+                                       threads=ex.threads if ex else None, runner=ex.pinned if ex else None)
+    if ex:
+        ex.wrap_set(ms)
+    images = load_images()
+    run_level(ms, images, 1, 0, min(3, args.duration))            # warm-up, discarded
+    return [run_level(ms, images, c, args.batch_clients, args.duration) for c in args.concurrency]
+
+def parse_args():
+    p = argparse.ArgumentParser(description="p99 latency with / without the executor scheduler")
+    p.add_argument("--models_dir", default=os.path.join(BASE_DIR, "models"))
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    p.add_argument("--batch_clients", type=int, default=1)
+    p.add_argument("--threads", default="", help='EXECUTOR_THREADS format, e.g. "breed=2,emotion=1"')
+    p.add_argument("--affinity", default="", help='EXECUTOR_AFFINITY format, e.g. "breed=0-1,disease=3"')
+    p.add_argument("--modes", nargs="+", default=["direct", "scheduled"], choices=["direct", "scheduled"])
+    p.add_argument("--out", default=OUT_FILE)
+    p.add_argument("--_mode", default=None, help=argparse.SUPPRESS)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    if args._mode:                                   # child process: print JSON for the parent
+        print(json.dumps(run_mode(args._mode, args)))
+        return
+
+    report = {"cpu_count": os.cpu_count(), "duration_s": args.duration, "batch_clients": args.batch_clients,
+              "batch_images": BATCH_IMAGES, "breed_share": BREED_SHARE, "modes": {}}
+    for mode in args.modes:
+        print(f"=== {mode} ===")
+        out = subprocess.run([sys.executable, __file__, *sys.argv[1:], "--_mode", mode],
+                             cwd=BASE_DIR, capture_output=True, text=True, check=True,
+                             env={**os.environ, "TF_CPP_MIN_LOG_LEVEL": "3"})
+        report["modes"][mode] = json.loads(out.stdout.strip().splitlines()[-1])
+        for r in report["modes"][mode]:
+            print(f"  c={r['concurrency']:<3d} {r['rps']:6.2f} req/s  p50 {r['latency_ms']['p50']:7.1f}  "
+                  f"p95 {r['latency_ms']['p95']:7.1f}  p99 {r['latency_ms']['p99']:7.1f} ms  "
+                  f"batch {r['batch_images_per_s']:.1f} img/s")
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("Report:", args.out)
+
+if __name__ == "__main__":
+    main()
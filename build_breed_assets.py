@@ -0,0 +1,187 @@
+"""
+build_breed_assets.py  —  DogScan AI  |  Breed-library thumbnail / asset build
+Run: python build_breed_assets.py  [--src_dir ...] [--out_dir ...] [--workers 4] [--force]
+
+Turns the full-size originals in frontend/public/image/breed_library_images/
+(one per breed, as extracted by test.py) into:
+  • resized WebP and AVIF thumbnails at THUMB_WIDTHS — never wider than the
+    original; an original narrower than all of them gets one variant at its own width,
+    and a variant no smaller (in bytes) than the original is dropped
+  • a tiny blurred WebP placeholder (LQIP) inlined as a data URI
+and writes two files:
+  frontend/src/assets/breed_library_assets.json   runtime map (size, placeholder, srcset
+                                                  per format), statically imported by
+                                                  frontend/src/utils/breedImage.js
+  frontend/breed_library_build.json               build metadata (sha1, build key, bytes);
+                                                  never imported, so it stays out of the bundles
+
+Builds are incremental: each breed records the sha1 of its original plus the
+build settings in the build file, so only new/changed breeds are re-encoded.
+Encoding runs on a process pool (Pillow encoders are CPU bound).
+"""
+
+import os, io, json, base64, hashlib, argparse, logging
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageFilter, ImageOps, features
+
+log = logging.getLogger(__name__)
+
+BASE_DIR      = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR    = os.path.join(BASE_DIR, "frontend", "public")
+SRC_DIR       = os.path.join(PUBLIC_DIR, "image", "breed_library_images")
+OUT_DIR       = os.path.join(PUBLIC_DIR, "image", "breed_library_thumbs")
+MAPPING_FILE  = os.path.join(BASE_DIR, "frontend", "src", "assets", "breed_library_assets.json")
+BUILD_FILE    = os.path.join(BASE_DIR, "frontend", "breed_library_build.json")
+SRC_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+THUMB_WIDTHS  = (320, 640, 960)
+FORMATS       = {                       # format -> Pillow save kwargs
+    "avif": {"quality": 50, "speed": 6},
+    "webp": {"quality": 78, "method": 6},
+}
+LQIP_WIDTH    = 16
+LQIP_BLUR     = 1
+WORKERS       = max(1, (os.cpu_count() or 2) - 1)
+
+# Any change here invalidates every cached breed
+BUILD_KEY = json.dumps({"widths": THUMB_WIDTHS, "formats": FORMATS, "lqip": [LQIP_WIDTH, LQIP_BLUR],
+                        "upscale": False, "skip_larger": True}, sort_keys=True)
+
+
+def available_formats():
+    """AVIF needs a Pillow build with libavif — skip it (with a warning) otherwise."""
+    fmts = [f for f in FORMATS if features.check(f)]
+    for f in set(FORMATS) - set(fmts):
+        log.warning("Pillow has no %s support — skipping %s thumbnails", f, f)
+    return fmts
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def public_url(path):
+    return "/" + os.path.relpath(path, PUBLIC_DIR).replace(os.sep, "/")
+
+def variant_widths(width):
+    """THUMB_WIDTHS that fit inside the original, or just the original width when none do."""
+    return [w for w in THUMB_WIDTHS if w <= width] or [width]
+
+def build_one(src_path, out_dir, fmts, sha1):
+    """Encode all thumbnails + LQIP for one original. Runs in a worker process."""
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    src_bytes = os.path.getsize(src_path)
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        width, height = img.size
+        sources = {f: [] for f in fmts}
+        for w in variant_widths(width):
+            resized = img if w == width else img.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+            for f in fmts:
+                out_path = os.path.join(out_dir, f"{stem}-{w}.{f}")
+                resized.save(out_path, format=f.upper(), **FORMATS[f])
+                if os.path.getsize(out_path) >= src_bytes:
+                    os.remove(out_path)       # no smaller than the original — <img> falls back to it
+                    continue
+                sources[f].append({"width": w, "url": public_url(out_path), "bytes": os.path.getsize(out_path)})
+
+        lqip = img.resize((LQIP_WIDTH, max(1, round(height * LQIP_WIDTH / width))), Image.BILINEAR)
+        buf = io.BytesIO()
+        lqip.filter(ImageFilter.GaussianBlur(LQIP_BLUR)).save(buf, format="WEBP", quality=30)
+
+    return stem, {
+        "source_sha1": sha1,
+        "build_key":   BUILD_KEY,
+        "width":       width,
+        "height":      height,
+        "placeholder": "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii"),
+        "sources":     sources,
+    }
+
+def runtime_entry(entry):
+    """What the frontend needs for one breed: no hashes, build keys or byte counts."""
+    return {
+        "width":       entry["width"],
+        "height":      entry["height"],
+        "placeholder": entry["placeholder"],
+        "srcset":      {f: ", ".join(f"{s['url']} {s['width']}w" for s in srcs)
+                        for f, srcs in entry["sources"].items() if srcs},
+    }
+
+def load_build(path=BUILD_FILE):
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def outputs_exist(entry):
+    return all(os.path.isfile(os.path.join(PUBLIC_DIR, *s["url"].lstrip("/").split("/")))
+               for srcs in entry.get("sources", {}).values() for s in srcs)
+
+def build_assets(src_dir=SRC_DIR, out_dir=OUT_DIR, mapping_file=MAPPING_FILE, workers=WORKERS, force=False,
+                 build_file=BUILD_FILE):
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(mapping_file), exist_ok=True)
+    fmts     = available_formats()
+    # (older builds kept the full metadata in the runtime map — reuse it once so stale files get cleaned up)
+    previous = load_build(build_file) or {k: v for k, v in load_build(mapping_file).items() if "sources" in v}
+    mapping, todo = {}, []
+
+    for name in sorted(os.listdir(src_dir)):
+        if not name.lower().endswith(SRC_EXTENSIONS):
+            continue
+        src_path = os.path.join(src_dir, name)
+        stem     = os.path.splitext(name)[0]
+        sha1     = file_sha1(src_path)
+        old      = previous.get(stem)
+        if (not force and old and old["source_sha1"] == sha1 and old["build_key"] == BUILD_KEY
+                and sorted(old["sources"]) == sorted(fmts) and outputs_exist(old)):
+            mapping[stem] = old
+        else:
+            todo.append((src_path, sha1))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(build_one, p, out_dir, fmts, sha1) for p, sha1 in todo]
+            for fut in futures:
+                stem, entry = fut.result()
+                mapping[stem] = entry
+                log.info("Built %s", stem)
+
+    # drop thumbnails no longer produced (breed gone, or a width that is no longer built)
+    def urls(entry):
+        return {s["url"] for srcs in (entry or {}).get("sources", {}).values() for s in srcs}
+    for stem, old in previous.items():
+        for url in urls(old) - urls(mapping.get(stem)):
+            stale = os.path.join(PUBLIC_DIR, *url.lstrip("/").split("/"))
+            if os.path.isfile(stale):
+                os.remove(stale)
+
+    mapping = dict(sorted(mapping.items()))
+    with open(build_file, "w", encoding="utf-8") as f:
+        json.dump(mapping, f, indent=1, ensure_ascii=False)
+    with open(mapping_file, "w", encoding="utf-8") as f:
+        json.dump({stem: runtime_entry(e) for stem, e in mapping.items()}, f, separators=(",", ":"), ensure_ascii=False)
+    return mapping, len(todo)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Build breed-library thumbnails, LQIP placeholders and mapping JSON")
+    p.add_argument("--src_dir", default=SRC_DIR)
+    p.add_argument("--out_dir", default=OUT_DIR)
+    p.add_argument("--mapping", default=MAPPING_FILE, help="runtime map imported by the frontend")
+    p.add_argument("--build_file", default=BUILD_FILE, help="build metadata for incremental rebuilds")
+    p.add_argument("--workers", type=int, default=WORKERS)
+    p.add_argument("--force", action="store_true", help="rebuild every breed, ignoring content hashes")
+    return p.parse_args()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args()
+    mapping, rebuilt = build_assets(args.src_dir, args.out_dir, args.mapping, args.workers, args.force, args.build_file)
+    orig = sum(os.path.getsize(os.path.join(args.src_dir, n)) for n in os.listdir(args.src_dir)
+               if n.lower().endswith(SRC_EXTENSIONS))
+    print(f"{len(mapping)} breeds ({rebuilt} rebuilt)  originals: {orig/1e6:.2f} MB")
+    for fmt in FORMATS:
+        total = sum(e["sources"][fmt][0]["bytes"] for e in mapping.values() if e["sources"].get(fmt))
+        print(f"  {fmt} @ smallest width: {total/1e6:.2f} MB")
+    print(f"Runtime map: {os.path.getsize(args.mapping)/1e3:.1f} KB  ({args.mapping})")
@@ -0,0 +1,361 @@
+"""
+compress_models.py  —  DogScan AI  |  Post-training pruning + weight clustering
+Run: python compress_models.py  [--version legacy] [--models breed disease ...]
+                                [--sparsity 0.5] [--clusters 16] [--head_keep 0.5]
+                                [--data breed=dogs --data disease=skin_dataset] [--epochs 2]
+
+For each served model (model_registry.MODEL_FILES) of a registry version:
+  1. structured: drop the weakest units of the Dense head (DENSE_UNITS -> head_keep share),
+     physically shrinking the two head kernels
+  2. magnitude pruning: zero the smallest |w| of every large conv / dense kernel
+  3. weight clustering: snap the remaining weights of each kernel to `clusters` centroids
+  4. optional recovery fine-tune on a class-folder dataset: after every batch each
+     centroid moves to the mean of its (unsnapped, just-updated) weights — i.e. the
+     shared values train on their averaged gradient — and masks / sharing are re-applied
+and exports models/compressed/<version>/<model>.h5 + .tflite, ready for
+`python model_registry.py publish <new_version> --breed models/compressed/<version>/dog_breed_model.h5 ...`.
+
+Size (raw + gzip — zeros and shared values only pay off compressed), load time,
+CPU latency and, when a dataset is given, val accuracy are reported before and
+after in models/compressed/<version>/compression_report.json.
+"""
+
+import os, json, gzip, time, argparse, logging
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+import dataset_manifest
+import model_registry
+from label_registry import LabelRegistry
+from model import letterbox_dataset, cpu_latency_ms, TF_IMAGE_EXTENSIONS, BATCH_SIZE
+
+log = logging.getLogger(__name__)
+
+OUT_DIR          = os.path.join(model_registry.MODELS_DIR, "compressed")
+SPARSITY         = 0.5        # share of weights zeroed per compressed kernel
+CLUSTERS         = 16         # shared values per kernel (4-bit indices)
+CLUSTER_ITERS    = 10         # 1-D k-means (Lloyd) iterations
+HEAD_KEEP        = 0.5        # share of hidden head units kept; 1.0 disables structured pruning
+MIN_HEAD_UNITS   = 32
+MIN_KERNEL_SIZE  = 4096       # smaller kernels (first conv, depthwise 3x3 ...) are left alone
+FINETUNE_EPOCHS  = 2
+FINETUNE_LR      = 1e-5
+
+
+def iter_layers(model):
+    """Every layer, descending into nested models (the MobileNetV2 backbone)."""
+    for layer in model.layers:
+        if isinstance(layer, keras.Model):
+            yield from iter_layers(layer)
+        else:
+            yield layer
+
+def kernel_of(layer):
+    if isinstance(layer, layers.DepthwiseConv2D):
+        return layer.depthwise_kernel
+    if isinstance(layer, (layers.Conv2D, layers.Dense)):
+        return layer.kernel
+    return None
+
+# -----------------------------
+# STRUCTURED: SHRINK THE DENSE HEAD
+# -----------------------------
+def find_head_pair(model):
+    """(hidden Dense, output Dense) when the model ends in Dense -> [Dropout] -> Dense, else None."""
+    top = [l for l in model.layers if not isinstance(l, layers.Dropout)]
+    if len(top) >= 2 and isinstance(top[-1], layers.Dense) and isinstance(top[-2], layers.Dense):
+        return top[-2], top[-1]
+    return None
+
+def shrink_head(model, keep=HEAD_KEEP):
+    """Keep the hidden units with the largest in*out weight norm and rebuild the model around them."""
+    pair = find_head_pair(model)
+    if pair is None or keep >= 1.0:
+        return model, None
+    hidden, output = pair
+    k_in, b_in = hidden.get_weights()
+    k_out, b_out = output.get_weights()
+    n_keep = max(MIN_HEAD_UNITS, int(round(hidden.units * keep)))
+    if n_keep >= hidden.units:
+        return model, None
+    score = np.abs(k_in).sum(axis=0) * np.abs(k_out).sum(axis=1)
+    kept = np.sort(np.argsort(score)[::-1][:n_keep])
+
+    def clone(layer):
+        config = layer.get_config()
+        if layer.name == hidden.name:
+            config["units"] = n_keep
+        return layer.__class__.from_config(config)
+
+    shrunk = keras.models.clone_model(model, clone_function=clone)
+    for layer in shrunk.layers:
+        if layer.name == hidden.name:
+            layer.set_weights([k_in[:, kept], b_in[kept]])
+        elif layer.name == output.name:
+            layer.set_weights([k_out[kept, :], b_out])
+        else:
+            layer.set_weights(model.get_layer(layer.name).get_weights())
+    return shrunk, {"layer": hidden.name, "units_before": hidden.units, "units_after": n_keep}
+
+# -----------------------------
+# MAGNITUDE PRUNING + CLUSTERING
+# -----------------------------
+def magnitude_mask(w, sparsity):
+    if sparsity <= 0:
+        return np.ones_like(w, dtype=bool)
+    threshold = np.quantile(np.abs(w), sparsity)
+    return np.abs(w) > threshold
+
+def kmeans_1d(values, n_clusters, iters=CLUSTER_ITERS):
+    """Linear-init 1-D k-means; 1-D Lloyd updates keep the centroids sorted."""
+    centroids = np.linspace(values.min(), values.max(), n_clusters)
+    for _ in range(iters):
+        assign = np.searchsorted((centroids[1:] + centroids[:-1]) / 2, values)
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.bincount(assign, weights=values, minlength=n_clusters)
+        centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+    return np.sort(centroids)
+
+class CompressedKernel:
+    """Sparsity mask + shared values of one kernel; apply() projects the live weights back onto them.
+
+    Cluster membership is fixed at clustering time. apply(refit=True) first moves
+    every centroid to the mean of its members' live weights — after an optimizer
+    step that is the old centroid plus the members' mean update — then snaps."""
+
+    def __init__(self, layer, variable, sparsity, n_clusters):
+        self.layer = layer.name
+        self.variable = variable
+        w = variable.numpy()
+        self.mask = magnitude_mask(w, sparsity)
+        nz = w[self.mask].astype(np.float64)
+        self.centroids = self.assign = None
+        if n_clusters and nz.size > n_clusters:
+            self.centroids = kmeans_1d(nz, n_clusters)
+            self.assign = np.searchsorted((self.centroids[1:] + self.centroids[:-1]) / 2, nz)
+            self.initial_centroids = self.centroids.copy()
+        self.apply()
+
+    def apply(self, refit=False):
+        w = self.variable.numpy() * self.mask
+        if self.centroids is not None:
+            if refit:
+                live = w[self.mask].astype(np.float64)
+                counts = np.bincount(self.assign, minlength=len(self.centroids))
+                sums = np.bincount(self.assign, weights=live, minlength=len(self.centroids))
+                self.centroids = np.where(counts > 0, sums / np.maximum(counts, 1), self.centroids)
+            w[self.mask] = self.centroids[self.assign]
+        self.variable.assign(w)
+
+    def centroid_shift(self):
+        """Mean |centroid change| since clustering (None when the kernel isn't clustered)."""
+        if self.centroids is None:
+            return None
+        return float(np.abs(self.centroids - self.initial_centroids).mean())
+
+def compress_kernels(model, sparsity=SPARSITY, n_clusters=CLUSTERS):
+    output_layer = model.layers[-1].name     # the classifier keeps full precision
+    kernels = []
+    for layer in iter_layers(model):
+        var = kernel_of(layer)
+        if var is None or layer.name == output_layer or int(np.prod(var.shape)) < MIN_KERNEL_SIZE:
+            continue
+        kernels.append(CompressedKernel(layer, var, sparsity, n_clusters))
+    return kernels
+
+class KeepCompressed(keras.callbacks.Callback):
+    """Fine-tune helper: after each batch, train the centroids on the step and re-apply masks/sharing."""
+
+    def __init__(self, kernels):
+        super().__init__()
+        self.kernels = kernels
+
+    def on_train_batch_end(self, batch, logs=None):
+        for k in self.kernels:
+            k.apply(refit=True)
+
+# -----------------------------
+# FINE-TUNE DATA
+# -----------------------------
+def label_index(kind, version, models_dir):
+    """Folder name -> model output index, from the version's label file (class_name or display name)."""
+    label_file, name_key, fields = model_registry.LABEL_FILES[kind]
+    path = model_registry.resolve_file(version, label_file, models_dir)
+    labels = LabelRegistry.from_file(os.path.dirname(path), os.path.basename(path), kind,
+                                       name_key=name_key, fields=fields)
+    index = {}
+    for i, rec in enumerate(labels.records):
+        for key in ("class_name", "display_name", name_key):
+            if rec.get(key):
+                index[str(rec[key]).lower()] = i
+    return index, len(labels)
+
+def make_finetune_data(data_dir, kind, version, models_dir, img_size):
+    index, num_classes = label_index(kind, version, models_dir)
+    manifest = dataset_manifest.load_manifest(data_dir)
+    entries = [e for e in manifest
+               if e["class_name"].lower() in index and e["path"].lower().endswith(TF_IMAGE_EXTENSIONS)]
+    skipped = {e["class_name"] for e in manifest} - {e["class_name"] for e in entries}
+    if skipped:
+        log.warning("%s: %d folders not in the label file, ignored: %s", kind, len(skipped), sorted(skipped)[:5])
+    splits = {}
+    for split in ("train", "val"):
+        rows = dataset_manifest.split_entries(entries, split)
+        targets = np.eye(num_classes, dtype=np.float32)[[index[e["class_name"].lower()] for e in rows]]
+        splits[split] = letterbox_dataset(data_dir, [e["path"] for e in rows], targets.reshape(-1, num_classes),
+                                          img_size, BATCH_SIZE, training=(split == "train"))
+    return splits["train"], splits["val"]
+
+def finetune(model, kernels, train_ds, val_ds, epochs=FINETUNE_EPOCHS, lr=FINETUNE_LR):
+    for layer in iter_layers(model):
+        layer.trainable = not isinstance(layer, layers.BatchNormalization)   # keep BN statistics, as in train()
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=lr),
+                  loss="categorical_crossentropy", metrics=["accuracy"])
+    model.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=[KeepCompressed(kernels)])
+
+# -----------------------------
+# EXPORT + MEASUREMENT
+# -----------------------------
+def gzip_mb(path):
+    with open(path, "rb") as f:
+        return round(len(gzip.compress(f.read(), 6)) / 1e6, 2)
+
+def sparsity_of(model):
+    total = zeros = 0
+    for layer in iter_layers(model):
+        var = kernel_of(layer)
+        if var is not None:
+            w = var.numpy()
+            total += w.size
+            zeros += int((w == 0).sum())
+    return round(zeros / max(1, total), 4)
+
+def export_tflite(model, path, quantize=False):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.EXPERIMENTAL_SPARSITY]
+    if quantize:
+        converter.optimizations.append(tf.lite.Optimize.DEFAULT)   # + dynamic-range int8 weights
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+
+def tflite_latency(path):
+    interpreter = tf.lite.Interpreter(model_path=path)
+    interpreter.allocate_tensors()
+    inp = interpreter.get_input_details()[0]
+    interpreter.set_tensor(inp["index"], np.zeros(inp["shape"], dtype=inp["dtype"]))
+    return cpu_latency_ms(interpreter.invoke)
+
+def val_accuracy(model, val_ds):
+    if val_ds is None:
+        return None
+    model.compile(loss="categorical_crossentropy", metrics=["accuracy"])
+    return round(float(model.evaluate(val_ds, verbose=0)[1]), 4)
+
+def measure(path, val_ds):
+    started = time.perf_counter()
+    m = keras.models.load_model(path, compile=False)
+    load_s = time.perf_counter() - started
+    x = np.zeros((1, *m.input_shape[1:]), dtype=np.float32)
+    return m, {
+        "file_mb":    round(os.path.getsize(path) / 1e6, 2),
+        "gzip_mb":    gzip_mb(path),
+        "params":     m.count_params(),
+        "sparsity":   sparsity_of(m),
+        "load_s":     round(load_s, 2),
+        "latency_ms": cpu_latency_ms(lambda: m(x, training=False)),
+        "val_accuracy": val_accuracy(m, val_ds),
+    }
+
+def compress_one(kind, version, models_dir, out_dir, args):
+    src = os.path.join(model_registry.version_dir(version, models_dir), model_registry.MODEL_FILES[kind])
+    print(f"=== {kind}: {src} ===")
+    original, before = measure(src, None)
+    train_ds = val_ds = None
+    if kind in args.data:
+        train_ds, val_ds = make_finetune_data(args.data[kind], kind, version, models_dir, original.input_shape[1])
+        before["val_accuracy"] = val_accuracy(original, val_ds)
+
+    compressed, head = shrink_head(original, args.head_keep)
+    kernels = compress_kernels(compressed, args.sparsity, args.clusters)
+    centroid_shift = centroids_trained = None
+    if train_ds is not None and args.epochs > 0:
+        finetune(compressed, kernels, train_ds, val_ds, args.epochs)
+        shifts = [s for s in (k.centroid_shift() for k in kernels) if s is not None]
+        if shifts:
+            centroid_shift = float(np.mean(shifts))
+            # a fine-tune that leaves every shared value in place recovered nothing — flag it, keep the model
+            centroids_trained = max(shifts) > 0
+            if not centroids_trained:
+                log.warning("%s: clustered centroids did not change during fine-tuning", kind)
+
+    dst = os.path.join(out_dir, model_registry.MODEL_FILES[kind])
+    compressed.save(dst, include_optimizer=False)
+    tflite_path = os.path.splitext(dst)[0] + ".tflite"
+    export_tflite(compressed, tflite_path, args.quantize)
+    _, after = measure(dst, val_ds)
+    return {
+        "source":       src,
+        "output":       dst,
+        "head":         head,
+        "kernels_compressed": len(kernels),
+        "finetuned":    train_ds is not None and args.epochs > 0,
+        "mean_centroid_shift": centroid_shift,
+        "centroids_trained":   centroids_trained,
+        "before":       before,
+        "after":        after,
+        "tflite": {
+            "path":       tflite_path,
+            "file_mb":    round(os.path.getsize(tflite_path) / 1e6, 2),
+            "gzip_mb":    gzip_mb(tflite_path),
+            "latency_ms": tflite_latency(tflite_path),
+        },
+    }
+
+# -----------------------------
+# CLI
+# -----------------------------
+def parse_args():
+    p = argparse.ArgumentParser(description="Prune, cluster and export the served models")
+    p.add_argument("--models_dir", default=model_registry.MODELS_DIR)
+    p.add_argument("--version", default=None, help="registry version (default: current)")
+    p.add_argument("--models", nargs="*", default=list(model_registry.MODEL_FILES), choices=list(model_registry.MODEL_FILES))
+    p.add_argument("--out_dir", default=None, help=f"default: {OUT_DIR}/<version>")
+    p.add_argument("--sparsity", type=float, default=SPARSITY)
+    p.add_argument("--clusters", type=int, default=CLUSTERS, help="0 disables clustering")
+    p.add_argument("--head_keep", type=float, default=HEAD_KEEP)
+    p.add_argument("--data", action="append", default=[], metavar="KIND=DIR",
+                   help="class-folder dataset for recovery fine-tune + accuracy, e.g. breed=dogs")
+    p.add_argument("--epochs", type=int, default=FINETUNE_EPOCHS)
+    p.add_argument("--quantize", action="store_true", help="also int8-quantize weights in the .tflite")
+    args = p.parse_args()
+    args.data = dict(d.split("=", 1) for d in args.data)
+    return args
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    args = parse_args()
+    version = args.version or model_registry.current_version(args.models_dir)
+    out_dir = args.out_dir or os.path.join(OUT_DIR, version)
+    os.makedirs(out_dir, exist_ok=True)
+
+    report = {"version": version, "sparsity": args.sparsity, "clusters": args.clusters,
+              "head_keep": args.head_keep, "models": {}}
+    for kind in args.models:
+        report["models"][kind] = compress_one(kind, version, args.models_dir, out_dir, args)
+        keras.backend.clear_session()
+
+    with open(os.path.join(out_dir, "compression_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'model':8s} {'MB':>13s} {'gzip MB':>13s} {'load s':>11s} {'p50 ms':>13s} {'tflite':>7s} {'acc':>13s}")
+    for kind, r in report["models"].items():
+        b, a = r["before"], r["after"]
+        print(f"{kind:8s} {b['file_mb']:6.1f}>{a['file_mb']:6.1f} {b['gzip_mb']:6.1f}>{a['gzip_mb']:6.1f} "
+              f"{b['load_s']:5.1f}>{a['load_s']:5.1f} {b['latency_ms']['p50']:6.1f}>{a['latency_ms']['p50']:6.1f} "
+              f"{r['tflite']['latency_ms']['p50']:7.1f} {b['val_accuracy'] or '-'!s:>6}>{a['val_accuracy'] or '-'!s:<6}")
+    print("Report:", os.path.join(out_dir, "compression_report.json"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+dataset_manifest.py  —  DogScan AI  |  Dataset manifest builder
+Run: python dataset_manifest.py --data_dir dogs  [--val_split 0.2] [--workers 32]
+
+Walks the class-per-folder dataset once (class folders are listed in parallel)
+and writes <data_dir>/manifest.jsonl with one record per image:
+
+  {"path": "husky/001.jpg", "class_name": "husky", "size": 51234, "mtime": 1717.0,
+   "width": 500, "height": 375, "sha1": "…", "split": "train"}
+
+Rebuilds are incremental: files whose size and mtime are unchanged keep their
+previous record, only new/modified files are re-opened and re-hashed.
+The split is derived from the content hash, so it is stable across rebuilds and
+duplicate images can never land in both train and val.
+
+model.py (training + class weights), eval_model.py (calibration) and test.py
+(library image extraction) all read this manifest instead of globbing the tree.
+load_manifest() refreshes it first (incremental: one scandir + stat per file
+when nothing changed), so added / removed images are never trained on stale.
+"""
+
+import os, json, hashlib, argparse, logging
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+DATA_DIR         = "dogs"
+MANIFEST_FILE    = "manifest.jsonl"
+VAL_SPLIT        = 0.2
+WORKERS          = 32            # I/O bound — threads, not processes
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")
+HASH_CHUNK       = 1 << 20
+
+
+def manifest_path_for(data_dir, manifest_path=None):
+    return manifest_path or os.path.join(data_dir, MANIFEST_FILE)
+
+def split_for_hash(sha1, val_split=VAL_SPLIT):
+    """Deterministic train/val assignment from the content hash."""
+    return "val" if int(sha1[:8], 16) / 0xFFFFFFFF < val_split else "train"
+
+def _list_class_dir(data_dir, class_name):
+    """One scandir per class folder — returns (rel_path, size, mtime) tuples."""
+    out = []
+    with os.scandir(os.path.join(data_dir, class_name)) as it:
+        for e in it:
+            if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS):
+                st = e.stat()
+                out.append((f"{class_name}/{e.name}", st.st_size, st.st_mtime))
+    return out
+
+def _scan_file(data_dir, rel_path, size, mtime):
+    """Hash + read image header for a single file."""
+    full = os.path.join(data_dir, rel_path)
+    h = hashlib.sha1()
+    with open(full, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    try:
+        with Image.open(full) as img:
+            width, height = img.size
+    except Exception:
+        width, height = 0, 0   # unreadable — kept so it is not rescanned every time
+    return {
+        "path":       rel_path,
+        "class_name": rel_path.split("/", 1)[0],
+        "size":       size,
+        "mtime":      mtime,
+        "width":      width,
+        "height":     height,
+        "sha1":       h.hexdigest(),
+    }
+
+def read_manifest(path):
+    if not os.path.isfile(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def write_manifest(entries, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+def build_manifest(data_dir=DATA_DIR, manifest_path=None, val_split=VAL_SPLIT, workers=WORKERS):
+    """Scan data_dir (incrementally) and write the manifest. Returns the entries."""
+    path     = manifest_path_for(data_dir, manifest_path)
+    previous = {e["path"]: e for e in read_manifest(path)}
+    classes  = sorted(e.name for e in os.scandir(data_dir) if e.is_dir())
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        listed = [f for files in pool.map(lambda c: _list_class_dir(data_dir, c), classes) for f in files]
+
+        entries, stale = [], []
+        for rel_path, size, mtime in listed:
+            old = previous.get(rel_path)
+            if old and old["size"] == size and old["mtime"] == mtime:
+                entries.append(old)
+            else:
+                stale.append((rel_path, size, mtime))
+        entries.extend(pool.map(lambda t: _scan_file(data_dir, *t), stale))
+
+    for e in entries:
+        e["split"] = split_for_hash(e["sha1"], val_split)
+    entries.sort(key=lambda e: e["path"])
+    try:
+        write_manifest(entries, path)
+    except OSError as e:          # read-only dataset mount — still return the fresh listing
+        log.warning("Could not write manifest %s: %s", path, e)
+    log.info("Manifest %s: %d images, %d classes, %d rescanned, %d removed",
+             path, len(entries), len(classes), len(stale), len(set(previous) - {e["path"] for e in entries}))
+    return entries
+
+def load_manifest(data_dir=DATA_DIR, manifest_path=None, val_split=VAL_SPLIT, refresh=True):
+    """Manifest entries, brought up to date with data_dir first (refresh=False: read the file as-is,
+    building it only on first use)."""
+    if refresh and os.path.isdir(data_dir):
+        return build_manifest(data_dir, manifest_path, val_split)
+    entries = read_manifest(manifest_path_for(data_dir, manifest_path))
+    return entries if entries else build_manifest(data_dir, manifest_path, val_split)
+
+def class_names(entries):
+    return sorted({e["class_name"] for e in entries})
+
+def split_entries(entries, split=None):
+    return [e for e in entries if split is None or e["split"] == split]
+
+def class_counts(entries, names=None):
+    names  = names if names is not None else class_names(entries)
+    counts = dict.fromkeys(names, 0)
+    for e in entries:
+        if e["class_name"] in counts:
+            counts[e["class_name"]] += 1
+    return counts
+
+def entry_path(data_dir, entry):
+    return os.path.join(data_dir, *entry["path"].split("/"))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Build / refresh the dataset manifest")
+    p.add_argument("--data_dir", default=DATA_DIR)
+    p.add_argument("--manifest", default=None, help=f"defaults to <data_dir>/{MANIFEST_FILE}")
+    p.add_argument("--val_split", type=float, default=VAL_SPLIT)
+    p.add_argument("--workers", type=int, default=WORKERS)
+    return p.parse_args()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args()
+    entries = build_manifest(args.data_dir, args.manifest, args.val_split, args.workers)
+    counts  = {s: len(split_entries(entries, s)) for s in ("train", "val")}
+    print(f"{len(entries)} images in {len(class_names(entries))} classes  (train {counts['train']}, val {counts['val']})")
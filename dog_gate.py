@@ -0,0 +1,74 @@
+"""
+dog_gate.py  —  DogScan AI  |  "Is there a dog?" pre-filter
+
+ImageNet MobileNetV2 (the same network main.py uses) at a low input
+resolution. ImageNet classes 151–268 are the dog breeds, so their summed
+probability is a cheap dog-presence score. One pass at 128 px costs a small
+fraction of the breed pipeline (10 TTA passes + emotion + age at 224 px), so
+cats, people and landscapes exit before any of it runs.
+
+Config (env):
+  DOG_GATE             "on" / "off"                                (default on)
+  DOG_GATE_MODEL_PATH  distilled / pre-saved gate model (.h5); default is
+                       MobileNetV2(weights="imagenet") at DOG_GATE_SIZE
+  DOG_GATE_SIZE        96 / 128 / 160 / 192 / 224                  (default 128)
+  DOG_GATE_THRESHOLD   minimum summed dog probability              (default 0.15)
+
+Without DOG_GATE_MODEL_PATH the ImageNet weights are downloaded (or taken from
+the Keras cache) at startup. The gate is optional: app.py serves ungated breed
+scans and reports the failure in /health when it can't load. Offline hosts
+should point DOG_GATE_MODEL_PATH at a saved copy.
+"""
+
+import os, logging
+import numpy as np
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+DOG_CLASS_FIRST = 151         # ImageNet-1k "Chihuahua"
+DOG_CLASS_LAST  = 268         # ImageNet-1k "Mexican hairless"
+DOG_GATE_SIZE      = 128
+DOG_GATE_THRESHOLD = 0.15
+
+
+class DogGate:
+    def __init__(self, model, threshold=DOG_GATE_THRESHOLD):
+        self.model     = model
+        self.size      = model.input_shape[1]
+        self.threshold = threshold
+
+    @classmethod
+    def from_env(cls):
+        if os.environ.get("DOG_GATE", "on").lower() == "off":
+            return None
+        threshold = float(os.environ.get("DOG_GATE_THRESHOLD", DOG_GATE_THRESHOLD))
+        path = os.environ.get("DOG_GATE_MODEL_PATH")
+        if path:
+            from tensorflow.keras.models import load_model
+            model = load_model(path)
+        else:
+            from tensorflow.keras.applications import MobileNetV2
+            size = int(os.environ.get("DOG_GATE_SIZE", DOG_GATE_SIZE))
+            model = MobileNetV2(weights="imagenet", input_shape=(size, size, 3))
+        model.predict(np.zeros((1, *model.input_shape[1:]), dtype=np.float32), verbose=0)
+        log.info("Dog gate ready (%dpx, threshold %.2f)", model.input_shape[1], threshold)
+        return cls(model, threshold)
+
+    def preprocess(self, pil_imgs):
+        # plain resize (ImageNet-style), scaled to [-1, 1] like mobilenet_v2.preprocess_input
+        batch = np.stack([np.asarray(img.convert("RGB").resize((self.size, self.size), Image.BILINEAR,
+                                                               reducing_gap=2.0), dtype=np.float32)
+                          for img in pil_imgs], axis=0)
+        return batch / 127.5 - 1.0
+
+    def check_batch(self, pil_imgs):
+        probs = self.model.predict(self.preprocess(pil_imgs), verbose=0)
+        dog_prob = probs[:, DOG_CLASS_FIRST:DOG_CLASS_LAST + 1].sum(axis=1)
+        top1 = probs.argmax(axis=1)
+        is_dog = (dog_prob >= self.threshold) | ((top1 >= DOG_CLASS_FIRST) & (top1 <= DOG_CLASS_LAST))
+        return [{"is_dog": bool(d), "dog_probability": round(float(p), 4), "imagenet_top1": int(t)}
+                for d, p, t in zip(is_dog, dog_prob, top1)]
+
+    def check(self, pil_img):
+        return self.check_batch([pil_img])[0]
@@ -0,0 +1,197 @@
+"""
+executor.py  —  DogScan AI  |  Per-model execution lanes with a priority scheduler
+
+By default every request thread calls model.predict() directly, and all four
+models share TensorFlow's global thread pools: a 16-image breed batch (160 TTA
+variants) and a disease request then fight for the same cores. With the
+executor on, each model gets a lane:
+  • one dedicated inference thread per model — a model never runs twice at once
+  • an intra-op thread count per model (TFLite interpreters take it per model;
+    Keras models share one TF pool sized to the largest lane)
+  • an optional CPU affinity mask per lane (Linux, per-thread; best effort):
+    the lane thread itself, and for TFLite models the interpreter worker
+    threads — models are built and warmed up on a thread pinned to the lane's
+    CPUs (ModelExecutor.pinned, passed to load_model_set as `runner`), so the
+    pools they create inherit the mask. Keras / SavedModel ops run on TF's one
+    shared pool, which no per-lane mask reaches
+  • a priority queue per lane; large predicts are split into EXECUTOR_CHUNK-row
+    chunks, so a single-image request waits for at most one chunk of a batch job
+
+Models are wrapped in ScheduledModel, which keeps the predict() / input_shape /
+output_shape surface that inference.py uses. Priority comes from the calling
+context: `with request_priority(BATCH): ...`.
+
+Config (env):
+  EXECUTOR           "on" / "off"                                 (default off)
+  EXECUTOR_THREADS   intra-op threads per lane  "breed=2,emotion=1,age=1,disease=1"
+  EXECUTOR_AFFINITY  CPU list per lane          "breed=0-1,emotion=2,age=2,disease=3"
+  EXECUTOR_CHUNK     rows per scheduled predict chunk             (default 16)
+"""
+
+import os, time, queue, logging, itertools, threading, contextlib, contextvars
+from concurrent.futures import Future
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 0          # single-image scans
+BATCH       = 10         # batch / stream endpoints, offline jobs
+CHUNK_ROWS  = 16
+DEFAULT_THREADS = {"breed": 2, "emotion": 1, "age": 1, "disease": 1}
+WAIT_WINDOW = 2000       # queue-wait samples kept per lane for status()
+
+_priority = contextvars.ContextVar("dogscan_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def request_priority(priority):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def parse_lane_map(spec, cast):
+    """"breed=2,emotion=1" -> {"breed": 2, "emotion": 1}."""
+    out = {}
+    for item in filter(None, (s.strip() for s in (spec or "").split(","))):
+        kind, _, value = item.partition("=")
+        out[kind.strip()] = cast(value.strip())
+    return out
+
+def parse_cpus(spec):
+    """"0-1+3" -> {0, 1, 3} ("+" joins ranges, since "," separates lanes)."""
+    cpus = set()
+    for part in spec.split("+"):
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+class Lane:
+    """One model's dedicated inference thread + priority queue."""
+
+    def __init__(self, name, cpus=None):
+        self.name  = name
+        self.cpus  = cpus
+        self.queue = queue.PriorityQueue()
+        self.waits = []
+        self.done  = 0
+        self._seq  = itertools.count()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name=f"lane-{name}", daemon=True).start()
+
+    def submit(self, priority, fn):
+        fut = Future()
+        self.queue.put((priority, next(self._seq), time.perf_counter(), fn, fut))
+        return fut
+
+    def _run(self):
+        if self.cpus:
+            try:
+                os.sched_setaffinity(threading.get_native_id(), self.cpus)
+            except (AttributeError, OSError) as e:
+                log.warning("Lane %s: CPU affinity %s not applied (%s)", self.name, sorted(self.cpus), e)
+        while True:
+            _, _, queued_at, fn, fut = self.queue.get()
+            wait_ms = (time.perf_counter() - queued_at) * 1000
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn())
+            except BaseException as e:
+                fut.set_exception(e)
+            with self._lock:
+                self.done += 1
+                self.waits.append(wait_ms)
+                del self.waits[:-WAIT_WINDOW]
+
+    def status(self):
+        with self._lock:
+            waits = list(self.waits)
+            done = self.done
+        return {
+            "queued":  self.queue.qsize(),
+            "done":    done,
+            "cpus":    sorted(self.cpus) if self.cpus else None,
+            "wait_ms": {q: round(float(np.percentile(waits, q)), 2) if waits else None for q in (50, 99)},
+        }
+
+class ScheduledModel:
+    """Keras-like model whose predict() runs on its lane, in priority order, chunk by chunk."""
+
+    def __init__(self, model, lane, chunk_rows=CHUNK_ROWS):
+        self.wrapped      = model
+        self.lane         = lane
+        self.chunk_rows   = chunk_rows
+        self.input_shape  = model.input_shape
+        self.output_shape = model.output_shape
+
+    def predict(self, batch, verbose=0):
+        priority = _priority.get()
+        futures = [self.lane.submit(priority, lambda b=batch[i:i + self.chunk_rows]: self.wrapped.predict(b, verbose=0))
+                   for i in range(0, len(batch), self.chunk_rows)]
+        return np.concatenate([f.result() for f in futures], axis=0)
+
+class ModelExecutor:
+    def __init__(self, threads=None, affinity=None, chunk_rows=CHUNK_ROWS):
+        self.threads    = {**DEFAULT_THREADS, **(threads or {})}
+        self.affinity   = affinity or {}
+        self.chunk_rows = chunk_rows
+        self.lanes      = {}
+
+    @classmethod
+    def from_env(cls):
+        if os.environ.get("EXECUTOR", "off").lower() != "on":
+            return None
+        return cls(
+            threads=parse_lane_map(os.environ.get("EXECUTOR_THREADS"), int),
+            affinity=parse_lane_map(os.environ.get("EXECUTOR_AFFINITY"), parse_cpus),
+            chunk_rows=int(os.environ.get("EXECUTOR_CHUNK", CHUNK_ROWS)),
+        )
+
+    def configure_tensorflow(self):
+        """Size TF's shared pools for Keras models; must run before the first TF op."""
+        import tensorflow as tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(max(self.threads.values()))
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError as e:
+            log.warning("TF thread pools already initialized, keeping defaults: %s", e)
+
+    def lane(self, name):
+        if name not in self.lanes:
+            self.lanes[name] = Lane(name, self.affinity.get(name))
+        return self.lanes[name]
+
+    def pinned(self, kind, fn):
+        """Run fn() with the calling thread pinned to `kind`'s lane CPUs, then restore its mask.
+        load_model_set builds and warms each model this way: threads that fn creates (TFLite
+        interpreter pools, incl. the bucket interpreters warm_up allocates) inherit the mask."""
+        cpus = self.affinity.get(kind)
+        if not cpus:
+            return fn()
+        tid = threading.get_native_id()
+        try:
+            previous = os.sched_getaffinity(tid)
+            os.sched_setaffinity(tid, cpus)
+        except (AttributeError, OSError) as e:
+            log.warning("Lane %s: CPU affinity %s not applied while loading (%s)", kind, sorted(cpus), e)
+            return fn()
+        try:
+            return fn()
+        finally:
+            os.sched_setaffinity(tid, previous)
+
+    def wrap_set(self, model_set):
+        """Route every model of a ModelSet through its lane (lanes outlive hot swaps)."""
+        for kind, fmt in model_set.formats.items():
+            if self.affinity.get(kind) and fmt != "tflite":
+                log.warning("Lane %s: %s model runs on TF's shared thread pool — EXECUTOR_AFFINITY "
+                            "only pins its lane thread", kind, fmt)
+        model_set.models = {kind: ScheduledModel(m, self.lane(kind), self.chunk_rows)
+                            for kind, m in model_set.models.items()}
+        return model_set
+
+    def status(self):
+        return {"threads": self.threads, "chunk_rows": self.chunk_rows,
+                "lanes": {name: lane.status() for name, lane in self.lanes.items()}}
@@ -20,7 +20,7 @@ import {
   ZoomIn,
 } from "lucide-react";
 import TopNav from "../components/ui/TopNav";
-import { buildBreedImagePath } from "../utils/breedImage";
+import { buildBreedImagePath, buildBreedImageSources } from "../utils/breedImage";
 
 const DogLibrary = () => {
   const navigate = useNavigate();
@@ -280,6 +280,7 @@ const DogLibrary = () => {
       id: jsonBreed.breed_id,
       name: jsonBreed.display_name,
       image: buildBreedImagePath(jsonBreed.breed_id, jsonBreed.class_name),
+      thumbnail: buildBreedImageSources(jsonBreed.breed_id, jsonBreed.class_name),
       size: jsonBreed.size,
       temperament: jsonBreed.temperament,
       physicalTraits: {
@@ -497,13 +498,30 @@ const DogLibrary = () => {
                     className="bg-white rounded-xl shadow-sm hover:shadow-md transition-shadow overflow-hidden"
                   >
                     {/* Image with View Button */}
-                    <div className="relative h-48 bg-gray-200 group">
-                      <img
-                        src={breed.image}
-                        alt={breed.name}
-                        className="w-full h-full object-cover"
-                        onClick={() => openImageViewer(breed.image, breed.name)}
-                      />
+                    <div
+                      className="relative h-48 bg-gray-200 bg-cover bg-center group"
+                      style={breed.thumbnail.placeholder ? { backgroundImage: `url(${breed.thumbnail.placeholder})` } : undefined}
+                    >
+                      <picture>
+                        {breed.thumbnail.sources.map((source) => (
+                          <source
+                            key={source.type}
+                            type={source.type}
+                            srcSet={source.srcSet}
+                            sizes="(min-width: 768px) 50vw, 100vw"
+                          />
+                        ))}
+                        <img
+                          src={breed.thumbnail.src}
+                          alt={breed.name}
+                          width={breed.thumbnail.width}
+                          height={breed.thumbnail.height}
+                          loading="lazy"
+                          decoding="async"
+                          className="w-full h-full object-cover"
+                          onClick={() => openImageViewer(breed.image, breed.name)}
+                        />
+                      </picture>
 
                       <button
                         onClick={() => openImageViewer(breed.image, breed.name)}
@@ -1,8 +1,36 @@
-export function buildBreedImagePath(breedId, className) {
+import breedAssets from "../assets/breed_library_assets.json";
+
+function breedImageKey(breedId, className) {
   const id = String(breedId ?? "").padStart(3, "0");
   const normalizedClass = String(className ?? "")
     .trim()
     .replace(/\s+/g, "_")
     .replace(/-/g, "_");
-  return `/image/breed_library_images/${id}_${normalizedClass}.jpg`;
+  return `${id}_${normalizedClass}`;
+}
+
+export function buildBreedImagePath(breedId, className) {
+  return `/image/breed_library_images/${breedImageKey(breedId, className)}.jpg`;
+}
+
+/**
+ * Responsive sources for a breed thumbnail, generated by build_breed_assets.py.
+ * Falls back to the full-size original when a breed has no built assets yet.
+ */
+export function buildBreedImageSources(breedId, className) {
+  const fallback = buildBreedImagePath(breedId, className);
+  const asset = breedAssets[breedImageKey(breedId, className)];
+  if (!asset) return { src: fallback, sources: [], placeholder: null };
+
+  const sources = ["avif", "webp"]
+    .filter((fmt) => asset.srcset[fmt])
+    .map((fmt) => ({ type: `image/${fmt}`, srcSet: asset.srcset[fmt] }));
+
+  return {
+    src: fallback,
+    sources,
+    placeholder: asset.placeholder,
+    width: asset.width,
+    height: asset.height,
+  };
 }
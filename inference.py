@@ -0,0 +1,79 @@
+"""
+inference.py  —  DogScan AI  |  Preprocessing + TTA inference core
+
+Side-effect free (no model loading, no Flask) so app.py, model.py and offline
+jobs share exactly the same letterbox preprocessing and TTA averaging.
+"""
+
+import io, base64
+import numpy as np
+from PIL import Image, ImageOps
+
+# TTA config — mirrors your test script exactly
+TTA_ROTATIONS  = (-15, -7, 0, 7, 15)
+TTA_HFLIP      = True
+TTA_BATCH_SIZE = 8
+
+def preprocess_pil(img, target_size):
+    """Aspect-ratio preserving resize + white padding — same as your test script."""
+    img = img.convert("RGB")
+    img.thumbnail(target_size, Image.LANCZOS)
+    padded = Image.new("RGB", target_size, (255, 255, 255))
+    left = (target_size[0] - img.width)  // 2
+    top  = (target_size[1] - img.height) // 2
+    padded.paste(img, (left, top))
+    return np.asarray(padded).astype("float32") / 255.0
+
+def decode_image(b64_string):
+    if "," in b64_string:
+        b64_string = b64_string.split(",", 1)[1]
+    return Image.open(io.BytesIO(base64.b64decode(b64_string))).convert("RGB")
+
+def tta_variants(pil_img, target_size):
+    variants = []
+    for angle in TTA_ROTATIONS:
+        rotated = pil_img.rotate(angle, resample=Image.BILINEAR, expand=False)
+        variants.append(preprocess_pil(rotated, target_size))
+        if TTA_HFLIP:
+            variants.append(preprocess_pil(ImageOps.mirror(rotated), target_size))
+    return variants
+
+def predict_with_tta_batch(pil_imgs, model):
+    """Rotations + hflip variants for N images, batch predict, average per image -> (N, C)."""
+    input_shape = model.input_shape
+    target_size = (input_shape[2], input_shape[1])
+    variants = [v for img in pil_imgs for v in tta_variants(img, target_size)]
+    batch_size = TTA_BATCH_SIZE * max(1, len(pil_imgs))
+    preds = []
+    for i in range(0, len(variants), batch_size):
+        batch = np.stack(variants[i : i + batch_size], axis=0)
+        preds.append(model.predict(batch, verbose=0))
+    preds = np.concatenate(preds, axis=0)
+    return preds.reshape(len(pil_imgs), -1, preds.shape[-1]).mean(axis=1)
+
+def predict_with_tta(pil_img, model):
+    """Rotations + hflip variants, batch predict, average — same as your test script."""
+    return predict_with_tta_batch([pil_img], model)[0]
+
+def predict_simple_batch(pil_imgs, model):
+    """Single-pass predict for N images -> (N, C)."""
+    input_shape = model.input_shape
+    target_size = (input_shape[2], input_shape[1])
+    batch = np.stack([preprocess_pil(img, target_size) for img in pil_imgs], axis=0)
+    return model.predict(batch, verbose=0)
+
+def predict_simple(pil_img, model):
+    """Single-pass predict — used for emotion and age."""
+    return predict_simple_batch([pil_img], model)[0]
+
+def predict_breed_probs(pil_imgs, model, actions, tta=True):
+    """TTA for quality action "full", a single pass for "reduced" -> (N, C).
+    tta=False (single-pass models, e.g. the distilled student) runs one pass for all."""
+    full    = [i for i, a in enumerate(actions) if a == "full" and tta]
+    reduced = [i for i, a in enumerate(actions) if not (a == "full" and tta)]
+    probs = np.zeros((len(pil_imgs), model.output_shape[-1]), dtype=np.float32)
+    if full:
+        probs[full] = predict_with_tta_batch([pil_imgs[i] for i in full], model)
+    if reduced:
+        probs[reduced] = predict_simple_batch([pil_imgs[i] for i in reduced], model)
+    return probs
@@ -0,0 +1,120 @@
+"""
+label_registry.py  —  DogScan AI  |  Label lookup tables
+
+Label JSON files come in several shapes (dict of strings, dict of dicts, list of
+dicts). They are normalized once at startup into a LabelRegistry: a dense
+class_index -> record tuple plus a prebuilt response fragment per class, so
+post-processing is a plain tuple index per top-k entry instead of a scan.
+"""
+
+import os, json
+
+BREED_FIELDS   = {"class_index": None, "class_name": "", "display_name": "", "breed_id": None}
+DISEASE_FIELDS = {"class_index": None, "class_name": "", "display_name": "",
+                  "description": "", "treatment": "", "severity": ""}
+
+
+def load_json(models_dir, filename):
+    with open(os.path.join(models_dir, filename), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def normalize_labels(raw, name_key="name"):
+    """Convert labels from dict/list/string variants to a uniform list of dicts."""
+    if isinstance(raw, dict):
+        items = sorted(raw.items(), key=lambda x: int(x[0]) if str(x[0]).isdigit() else 0)
+        out = []
+        for i, (k, v) in enumerate(items):
+            if isinstance(v, dict):
+                out.append({
+                    "class_index": int(v.get("class_index", i)),
+                    "class_name": str(v.get("class_name", k)),
+                    "display_name": str(v.get("display_name", v.get(name_key, k))),
+                    **v,
+                })
+            else:
+                out.append({
+                    "class_index": i,
+                    "class_name": str(v),
+                    "display_name": str(v),
+                })
+        return out
+
+    if isinstance(raw, list):
+        out = []
+        for i, item in enumerate(raw):
+            if isinstance(item, dict):
+                cls_name = item.get("class_name", item.get(name_key, item.get("display_name", f"class_{i}")))
+                display = item.get("display_name", item.get(name_key, cls_name))
+                out.append({
+                    "class_index": int(item.get("class_index", i)),
+                    "class_name": str(cls_name),
+                    "display_name": str(display),
+                    **item,
+                })
+            else:
+                out.append({
+                    "class_index": i,
+                    "class_name": str(item),
+                    "display_name": str(item),
+                })
+        return out
+
+    return []
+
+
+class LabelRegistry:
+    """Dense class_index -> label record table with prebuilt response fragments.
+
+    `fields` maps response keys to their defaults; when omitted the fragment is
+    the whole record. Fragments are shared — merge them into a new dict
+    (``{**reg.fragment(i), "confidence": ...}``), never mutate them.
+    """
+
+    def __init__(self, labels, name, fields=None):
+        self.name = name
+        by_index = {}
+        for i, item in enumerate(labels):
+            try:
+                by_index[int(item.get("class_index", i))] = item
+            except (TypeError, ValueError):
+                continue
+        size = max(by_index) + 1 if by_index else 0
+        self.records   = tuple(by_index.get(i, {}) for i in range(size))
+        self.fragments = tuple(self._fragment(i, rec, fields) for i, rec in enumerate(self.records))
+
+    @staticmethod
+    def _fragment(idx, rec, fields):
+        if not rec:
+            return {}
+        if fields is None:
+            return dict(rec)
+        frag = {k: rec.get(k, default) for k, default in fields.items()}
+        frag["class_index"] = idx
+        if "display_name" in frag and not frag["display_name"]:
+            frag["display_name"] = frag.get("class_name", "")
+        return frag
+
+    @classmethod
+    def from_file(cls, models_dir, filename, name, name_key="name", fields=None):
+        return cls(normalize_labels(load_json(models_dir, filename), name_key=name_key), name, fields)
+
+    def __len__(self):
+        return len(self.records)
+
+    def record(self, idx):
+        idx = int(idx)
+        return self.records[idx] if 0 <= idx < len(self.records) else {}
+
+    def fragment(self, idx):
+        idx = int(idx)
+        return self.fragments[idx] if 0 <= idx < len(self.fragments) else {}
+
+    def validate(self, num_outputs):
+        """Fail fast when the label file does not match the model head."""
+        missing = [i for i, rec in enumerate(self.records) if not rec]
+        if len(self.records) != num_outputs or missing:
+            raise ValueError(
+                f"{self.name} labels do not match model: {len(self.records)} labels "
+                f"(missing indices {missing[:5]}) for {num_outputs} model outputs"
+            )
+        return self
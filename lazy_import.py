@@ -0,0 +1,38 @@
+"""
+lazy_import.py  —  DogScan AI  |  Deferred heavy imports
+
+`tf = lazy_module("tensorflow")` binds a stand-in that imports TensorFlow on the
+first attribute access, so scripts can keep module-level `tf.` / `keras.` /
+`layers.` names while `--help`, argument errors and TF-free code paths never
+import TensorFlow.
+"""
+
+import types, importlib
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name, attr_path=""):
+        super().__init__(f"{name}.{attr_path}" if attr_path else name)
+        self._lazy_target = (name, attr_path)
+        self._lazy_module = None
+
+    def _load(self):
+        if self._lazy_module is None:
+            name, attr_path = self._lazy_target
+            module = importlib.import_module(name)
+            for attr in filter(None, attr_path.split(".")):
+                module = getattr(module, attr)       # e.g. tensorflow -> keras -> layers
+            self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, attr):
+        if attr.startswith("_lazy_"):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_module(name, attr_path=""):
+    """Module (or attribute chain of a module, e.g. ("tensorflow", "keras.layers")) imported on first use."""
+    return LazyModule(name, attr_path)
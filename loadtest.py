@@ -0,0 +1,372 @@
+"""
+loadtest.py  —  DogScan AI  |  Load test of the scan path, Flask direct or via a gateway stand-in
+Run: python loadtest.py  [--target flask|gateway] [--flask_url http://localhost:5001]
+                         [--rates 1 2 4 8 16] [--step_seconds 30] [--pattern poisson|uniform|burst]
+                         [--breed_share 0.7] [--photo_dir phone_photos/ | --sizes 640:0.2,1280:0.3,3024:0.4,4032:0.1]
+
+Replays a request mix at increasing offered rates (open loop: requests are
+sent on their arrival schedule whether or not earlier ones have returned, and
+latency counts from the scheduled arrival, so queueing is not hidden):
+  • breed / disease ratio          --breed_share
+  • photos                         --photo_dir: real (phone) photos sent byte-for-byte,
+                                   in the directory's own size mix — preferred; or
+                                   --sizes "long_side:weight,...": synthetic JPEGs made by
+                                   resizing the breed library images, with sensor-like
+                                   grain, at phone-camera quality (JPEG_QUALITY) — an
+                                   approximation of real file sizes, not a substitute
+  • arrival pattern                poisson, uniform, or burst (poisson with the rate
+                                   multiplied by --burst_factor for --burst_seconds
+                                   every --burst_every seconds)
+
+--target flask    POSTs {"image": <data URL>} to FLASK_URL/predict/<kind>
+--target gateway  starts a local stand-in for backend/routes/scans.js (no
+                  MySQL, no auth): it takes the raw image bytes, base64-encodes
+                  them into a data URL, calls Flask with the same 30 s timeout as
+                  axios, sleeps --db_ms per DB round trip (breed lookups run in
+                  parallel, then the scan-history insert) and maps errors the way
+                  the Express route does.
+
+Per step it reports throughput, p50 / p95 / p99 / max latency, error and
+timeout rates, and the actual image / on-the-wire request bytes next to the
+latencies (overall and per photo size); the saturation point is the first rate where achieved
+throughput falls below SATURATION_SHARE of offered, p99 exceeds --slo_ms, or
+errors + timeouts exceed --max_error_rate. Writes JSON to --out.
+"""
+
+import io, os, json, time, random, base64, argparse, threading
+import urllib.request, urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from PIL import Image
+
+BASE_DIR   = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_DIR = os.path.join(BASE_DIR, "frontend", "public", "image", "breed_library_images")
+OUT_FILE   = os.path.join(BASE_DIR, "models", "loadtest_report.json")
+FLASK_URL  = os.environ.get("FLASK_URL", "http://localhost:5001")
+JPEG_QUALITY      = 92        # typical phone-camera setting
+SENSOR_NOISE      = 6.0       # grain (std, 0-255) — upscaled library images are unrealistically smooth
+PHOTO_EXTENSIONS  = (".jpg", ".jpeg")
+IMAGES_PER_SIZE   = 8
+GATEWAY_TIMEOUT   = 30        # axios timeout in scans.js
+UPLOAD_LIMIT      = 10 * 1024 * 1024   # multer fileSize limit in scans.js
+SATURATION_SHARE  = 0.9
+
+
+# -----------------------------
+# Request mix
+# -----------------------------
+def parse_sizes(spec):
+    """"640:0.2,1280:0.8" -> ([640, 1280], [0.2, 0.8])."""
+    sizes, weights = [], []
+    for item in spec.split(","):
+        side, _, weight = item.partition(":")
+        sizes.append(int(side))
+        weights.append(float(weight or 1))
+    return sizes, weights
+
+def make_payloads(sizes, per_size=IMAGES_PER_SIZE, seed=0):
+    """{long_side: [jpeg bytes]} from library images, resized so the long side matches."""
+    rng = random.Random(seed)
+    noise = np.random.default_rng(seed)
+    names = sorted(os.listdir(SAMPLE_DIR))
+    payloads = {}
+    for side in sizes:
+        payloads[side] = []
+        for name in rng.sample(names, min(per_size, len(names))):
+            img = Image.open(os.path.join(SAMPLE_DIR, name)).convert("RGB")
+            scale = side / max(img.size)
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BICUBIC)
+            arr = np.asarray(img, dtype=np.float32) + noise.normal(0, SENSOR_NOISE, (img.height, img.width, 1))
+            buf = io.BytesIO()
+            Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(buf, "JPEG", quality=JPEG_QUALITY)
+            payloads[side].append(buf.getvalue())
+    return payloads
+
+def load_photos(photo_dir):
+    """{long_side: [file bytes]} of real photos, unmodified; the weights are the directory's own mix."""
+    payloads = {}
+    for name in sorted(os.listdir(photo_dir)):
+        if not name.lower().endswith(PHOTO_EXTENSIONS):
+            continue
+        path = os.path.join(photo_dir, name)
+        with Image.open(path) as img:
+            side = max(img.size)
+        with open(path, "rb") as f:
+            payloads.setdefault(side, []).append(f.read())
+    if not payloads:
+        raise SystemExit(f"No JPEG photos in {photo_dir}")
+    sizes = sorted(payloads)
+    return payloads, sizes, [len(payloads[s]) for s in sizes]
+
+def byte_stats(values):
+    return {"mean": int(np.mean(values)), "p50": int(np.percentile(values, 50)), "max": int(max(values))} if values else None
+
+def arrivals(rate, seconds, pattern, rng, burst_every=10, burst_seconds=2, burst_factor=4):
+    """Arrival offsets (s) within one step."""
+    if pattern == "uniform":
+        return [i / rate for i in range(int(rate * seconds))]
+    out, t = [], 0.0
+    while True:
+        in_burst = pattern == "burst" and (t % burst_every) < burst_seconds
+        t += rng.expovariate(rate * (burst_factor if in_burst else 1))
+        if t >= seconds:
+            return out
+        out.append(t)
+
+def to_data_url(jpeg):
+    return "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()
+
+
+# -----------------------------
+# Gateway stand-in (backend/routes/scans.js without MySQL)
+# -----------------------------
+def post_json(url, body, timeout):
+    """(status, json) — HTTP errors are returned; URLError / timeouts raised."""
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), method="POST",
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        try:
+            return e.code, json.loads(e.read() or b"null")
+        except ValueError:
+            return e.code, None
+
+def is_timeout(e):
+    return isinstance(e, TimeoutError) or "timed out" in str(getattr(e, "reason", e))
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    flask_url = FLASK_URL
+    db_ms = 5.0
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def db_round_trip(self):
+        time.sleep(self.db_ms / 1000 * random.uniform(0.5, 1.5))
+
+    def do_POST(self):
+        kind = self.path.rstrip("/").rsplit("/", 1)[-1]
+        if kind not in ("breed", "disease"):
+            return self.reply(404, {"error": "Not found"})
+        size = int(self.headers.get("Content-Length", 0))
+        if size == 0:
+            return self.reply(400, {"error": "No image uploaded"})
+        if size > UPLOAD_LIMIT:
+            return self.reply(413, {"error": "File too large"})
+        mimetype = self.headers.get("Content-Type", "image/jpeg")
+        image = f"data:{mimetype};base64," + base64.b64encode(self.rfile.read(size)).decode()
+        try:
+            status, data = post_json(f"{self.flask_url}/predict/{kind}", {"image": image}, GATEWAY_TIMEOUT)
+        except (urllib.error.URLError, OSError) as e:
+            if isinstance(getattr(e, "reason", None), ConnectionRefusedError) or isinstance(e, ConnectionRefusedError):
+                return self.reply(503, {"error": "ML service unavailable. Start the Flask app with: python app.py"})
+            return self.reply(500, {"error": "timeout of 30000ms exceeded" if is_timeout(e) else str(e)})
+        if status == 503:
+            return self.reply(503, {"error": (data or {}).get("error") or "ML service is starting up. Please retry shortly."})
+        if status == 422 and (data or {}).get("quality"):
+            return self.reply(422, data)
+        if status != 200:
+            return self.reply(500, {"error": (data or {}).get("error") or f"Request failed with status code {status}"})
+        if data.get("error"):
+            return self.reply(502, {"error": data["error"]})
+        if kind == "breed":
+            if data.get("result_type") == "no_dog":
+                return self.reply(422, {"error": "No dog detected in this photo.", "result_type": "no_dog"})
+            if any(b.get("breed_id") for b in data.get("top_breeds", [])):
+                self.db_round_trip()          # Promise.all over getBreedFromDB
+        self.db_round_trip()                  # saveScan
+        return self.reply(200, data)
+
+def start_gateway(flask_url, db_ms, port=0):
+    handler = type("Gateway", (GatewayHandler,), {"flask_url": flask_url, "db_ms": db_ms})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# -----------------------------
+# Load generation
+# -----------------------------
+def send(target, base_url, kind, jpeg, timeout):
+    """-> outcome: "ok", "rejected" (422 quality / no dog), "error" or "timeout"."""
+    if target == "gateway":
+        req = urllib.request.Request(f"{base_url}/api/scans/{kind}", data=jpeg, method="POST",
+                                     headers={"Content-Type": "image/jpeg"})
+    else:
+        req = urllib.request.Request(f"{base_url}/predict/{kind}", method="POST",
+                                     data=json.dumps({"image": to_data_url(jpeg)}).encode(),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = json.loads(resp.read() or b"null")
+            return "rejected" if (body or {}).get("result_type") == "no_dog" else "ok"
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        if e.code == 500 and b"timeout of" in body:
+            return "timeout"                          # gateway's axios timeout
+        return "rejected" if e.code == 422 else "error"
+    except (urllib.error.URLError, OSError) as e:
+        return "timeout" if is_timeout(e) else "error"
+
+def run_step(rate, args, base_url, payloads, sizes, weights, rng, pool):
+    schedule = arrivals(rate, args.step_seconds, args.pattern, rng,
+                        args.burst_every, args.burst_seconds, args.burst_factor)
+    records, lock = [], threading.Lock()
+
+    def one(scheduled_at, kind, side, jpeg):
+        outcome = send(args.target, base_url, kind, jpeg, args.timeout)
+        done = time.perf_counter()
+        # on the wire: raw upload to the gateway, base64 data URL in JSON straight to Flask
+        wire = len(jpeg) if args.target == "gateway" else len(to_data_url(jpeg)) + len('{"image": ""}')
+        with lock:
+            records.append({"kind": kind, "size": side, "outcome": outcome, "bytes": len(jpeg), "wire_bytes": wire,
+                            "latency_ms": (done - scheduled_at) * 1000, "done": done})
+
+    started = time.perf_counter()
+    futures = []
+    for offset in schedule:
+        kind = "breed" if rng.random() < args.breed_share else "disease"
+        side = rng.choices(sizes, weights)[0]
+        scheduled_at = started + offset
+        time.sleep(max(0.0, scheduled_at - time.perf_counter()))
+        futures.append(pool.submit(one, scheduled_at, kind, side, rng.choice(payloads[side])))
+    for f in futures:
+        f.result()
+    return summarize(rate, records, started, args)
+
+def pct(values, q):
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+def summarize(rate, records, started, args):
+    n = len(records)
+    counts = {o: sum(r["outcome"] == o for r in records) for o in ("ok", "rejected", "error", "timeout")}
+    answered = [r["latency_ms"] for r in records if r["outcome"] in ("ok", "rejected")]
+    elapsed = max(args.step_seconds, max((r["done"] for r in records), default=started) - started)
+    achieved = (counts["ok"] + counts["rejected"]) / elapsed
+    step = {
+        "offered_rps":  rate,
+        "requests":     n,
+        "arrival_rps":  round(n / args.step_seconds, 2),     # above offered_rps with --pattern burst
+        "achieved_rps": round(achieved, 2),
+        "outcomes":     counts,
+        "error_rate":   round(counts["error"] / n, 4) if n else 0.0,
+        "timeout_rate": round(counts["timeout"] / n, 4) if n else 0.0,
+        "latency_ms":   {"p50": pct(answered, 50), "p95": pct(answered, 95), "p99": pct(answered, 99),
+                         "max": round(max(answered), 1) if answered else None},
+        "p95_by_kind_ms": {k: pct([r["latency_ms"] for r in records if r["kind"] == k and r["outcome"] in ("ok", "rejected")], 95)
+                           for k in ("breed", "disease")},
+        "request_bytes": {"image": byte_stats([r["bytes"] for r in records]),
+                          "wire":  byte_stats([r["wire_bytes"] for r in records])},
+        "by_size": {str(s): {"requests": sum(r["size"] == s for r in records),
+                             "mean_image_bytes": int(np.mean([r["bytes"] for r in records if r["size"] == s])),
+                             "p95_ms": pct([r["latency_ms"] for r in records if r["size"] == s and r["outcome"] in ("ok", "rejected")], 95)}
+                    for s in sorted({r["size"] for r in records})},
+    }
+    step["saturated"] = saturation_reason(step, args)
+    return step
+
+def saturation_reason(step, args):
+    offered = step["arrival_rps"]
+    if step["error_rate"] + step["timeout_rate"] > args.max_error_rate:
+        return "errors"
+    if step["latency_ms"]["p99"] is not None and step["latency_ms"]["p99"] > args.slo_ms:
+        return "p99_over_slo"
+    if offered and step["achieved_rps"] < SATURATION_SHARE * offered:
+        return "throughput"
+    return None
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Load test the scan path against Flask or a local Node gateway stand-in")
+    p.add_argument("--target", choices=["flask", "gateway"], default="flask")
+    p.add_argument("--flask_url", default=FLASK_URL)
+    p.add_argument("--gateway_port", type=int, default=0, help="0 = any free port")
+    p.add_argument("--db_ms", type=float, default=5.0, help="simulated MySQL round trip (gateway only)")
+    p.add_argument("--rates", type=float, nargs="+", default=[1, 2, 4, 8, 16], help="offered requests/s per step")
+    p.add_argument("--step_seconds", type=float, default=30)
+    p.add_argument("--pattern", choices=["poisson", "uniform", "burst"], default="poisson")
+    p.add_argument("--burst_every", type=float, default=10)
+    p.add_argument("--burst_seconds", type=float, default=2)
+    p.add_argument("--burst_factor", type=float, default=4)
+    p.add_argument("--breed_share", type=float, default=0.7)
+    p.add_argument("--photo_dir", default=None, help="real JPEG photos to send as-is (overrides --sizes)")
+    p.add_argument("--sizes", default="640:0.2,1280:0.3,3024:0.4,4032:0.1", help="synthetic photos: long_side:weight,...")
+    p.add_argument("--max_inflight", type=int, default=128, help="client connections; beyond it requests queue client-side")
+    p.add_argument("--timeout", type=float, default=35, help="client timeout (s)")
+    p.add_argument("--slo_ms", type=float, default=3000)
+    p.add_argument("--max_error_rate", type=float, default=0.01)
+    p.add_argument("--continue_after_saturation", action="store_true")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=OUT_FILE)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    if args.photo_dir:
+        payloads, sizes, weights = load_photos(args.photo_dir)
+    else:
+        sizes, weights = parse_sizes(args.sizes)
+        payloads = make_payloads(sizes, seed=args.seed)
+    print("Payloads:", ", ".join(f"{s}px {np.mean([len(p) for p in payloads[s]]) / 1e6:.2f} MB" for s in sizes))
+
+    gateway = None
+    base_url = args.flask_url
+    if args.target == "gateway":
+        gateway, base_url = start_gateway(args.flask_url, args.db_ms, args.gateway_port)
+        print(f"Gateway stand-in on {base_url} -> {args.flask_url}")
+
+    steps = []
+    try:
+        with ThreadPoolExecutor(max_workers=args.max_inflight) as pool:
+            for rate in args.rates:
+                step = run_step(rate, args, base_url, payloads, sizes, weights, rng, pool)
+                steps.append(step)
+                lat = step["latency_ms"]
+                wire = step["request_bytes"]["wire"]
+                print(f"{rate:7.2f} req/s offered  {step['achieved_rps']:7.2f} achieved  "
+                      f"p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']} ms  "
+                      f"mean request {wire['mean'] / 1e6 if wire else 0:.2f} MB  "
+                      f"err {step['error_rate']:.2%}  timeout {step['timeout_rate']:.2%}"
+                      + (f"  SATURATED ({step['saturated']})" if step["saturated"] else ""))
+                if step["saturated"] and not args.continue_after_saturation:
+                    break
+    finally:
+        if gateway:
+            gateway.shutdown()
+
+    saturated = next((s for s in steps if s["saturated"]), None)
+    sustained = [s["offered_rps"] for s in steps if not s["saturated"]]
+    report = {
+        "target": args.target,
+        "flask_url": args.flask_url,
+        "config": {k: getattr(args, k) for k in ("pattern", "step_seconds", "breed_share", "photo_dir", "sizes", "db_ms",
+                                                  "timeout", "slo_ms", "max_error_rate", "max_inflight", "seed")},
+        "payloads": {"source": "photo_dir" if args.photo_dir else "synthetic",
+                     "jpeg_quality": None if args.photo_dir else JPEG_QUALITY,
+                     "bytes_by_size": {str(s): {"count": len(payloads[s]), **byte_stats([len(p) for p in payloads[s]])}
+                                       for s in sizes}},
+        "steps": steps,
+        "saturation": {"rps": saturated["offered_rps"], "reason": saturated["saturated"]} if saturated else None,
+        "max_sustained_rps": max(sustained) if sustained else None,
+    }
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("Max sustained:", report["max_sustained_rps"], "req/s   Saturation:", report["saturation"])
+    print("Report:", args.out)
+
+if __name__ == "__main__":
+    main()
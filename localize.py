@@ -0,0 +1,133 @@
+"""
+localize.py  —  DogScan AI  |  Dog-region crop from the breed model's own activations
+
+Grad-CAM on the last conv feature map of the served breed model (no extra
+detector): one forward + backward pass at 224 px gives a heat map for the
+top-1 breed; its thresholded bounding box, plus a margin, is mapped back
+through the letterbox to the original photo and cropped. The crop then feeds
+breed TTA, emotion, age and disease, so a small dog is no longer a few pixels
+in a mostly white / background 224×224 input.
+
+The crop is skipped (original photo used) when the region already covers most
+of the frame, is implausibly small, or the heat map is flat. Needs a Keras
+breed model — with TFLite / SavedModel serving formats there are no
+gradients, and localize_image() returns the photo unchanged.
+
+Config (env, read by app.py):
+  LOCALIZE   "on" / "off"   (default off)
+"""
+
+import weakref, logging
+import numpy as np
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+CAM_THRESHOLD   = 0.35      # share of the heat-map maximum that counts as "dog"
+CROP_MARGIN     = 0.15      # box grows by this share of its size on each side
+MAX_AREA_SHARE  = 0.80      # region covers more than this of the photo -> no crop
+MIN_CROP_SIDE   = 64        # px in the original photo; smaller boxes are noise
+MIN_CAM_PEAK    = 1e-6
+
+_localizers = weakref.WeakKeyDictionary()      # breed model -> Localizer (rebuilt after a hot swap)
+
+
+class Localizer:
+    def __init__(self, model):
+        import tensorflow as tf
+        self.tf = tf
+        self.size = (model.input_shape[2], model.input_shape[1])
+        nested = [l for l in model.layers if isinstance(l, tf.keras.Model)]
+        if nested:
+            # model.py layout: Input -> MobileNetV2 sub-model -> GAP -> BN -> Dense -> Dropout -> Dense
+            backbone = nested[-1]
+            head = model.layers[model.layers.index(backbone) + 1:]
+            def forward(x):
+                feats = backbone(x, training=False)
+                out = feats
+                for layer in head:
+                    out = layer(out, training=False)
+                return feats, out
+        else:
+            last_conv = [l for l in model.layers if len(l.output.shape) == 4][-1]
+            grad_model = tf.keras.Model(model.inputs, [last_conv.output, model.output])
+            def forward(x):
+                return grad_model(x, training=False)
+
+        @tf.function(reduce_retracing=True)
+        def cam(x):
+            with tf.GradientTape() as tape:
+                feats, probs = forward(x)
+                score = tf.reduce_max(probs, axis=1)        # top-1 class of each image
+            grads = tape.gradient(score, feats)
+            weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+            return tf.nn.relu(tf.reduce_sum(weights * feats, axis=-1))
+        self._cam = cam
+
+    def heatmaps(self, batch):
+        """(N, h, w) Grad-CAM maps for a batch of preprocessed [0, 1] inputs."""
+        return self._cam(self.tf.constant(batch, dtype=self.tf.float32)).numpy()
+
+def localizer_for(model):
+    """Cached Localizer for a Keras breed model, or None when the model can't give gradients."""
+    if model in _localizers:
+        return _localizers[model]
+    try:
+        loc = Localizer(model)
+    except Exception as e:
+        log.warning("Dog localization unavailable for this breed model: %s", e)
+        loc = None
+    _localizers[model] = loc
+    return loc
+
+def letterbox_geometry(img_size, target_size):
+    """Scale + padding offsets used by inference.preprocess_pil (thumbnail never upscales)."""
+    w, h = img_size
+    scale = min(1.0, target_size[0] / w, target_size[1] / h)
+    nw, nh = max(1, round(w * scale)), max(1, round(h * scale))
+    return scale, (target_size[0] - nw) // 2, (target_size[1] - nh) // 2
+
+def heatmap_box(cam, img_size, target_size, threshold=CAM_THRESHOLD, margin=CROP_MARGIN):
+    """Bounding box (l, t, r, b) in original-photo pixels of the hot region, or None."""
+    if cam.max() <= MIN_CAM_PEAK:
+        return None
+    heat = np.asarray(Image.fromarray((cam / cam.max()).astype(np.float32), mode="F")
+                      .resize(target_size, Image.BILINEAR))
+    ys, xs = np.nonzero(heat >= threshold)
+    if not len(xs):
+        return None
+    scale, left, top = letterbox_geometry(img_size, target_size)
+    l, r = (xs.min() - left) / scale, (xs.max() + 1 - left) / scale
+    t, b = (ys.min() - top) / scale, (ys.max() + 1 - top) / scale
+    mw, mh = (r - l) * margin, (b - t) * margin
+    w, h = img_size
+    return (int(max(0, l - mw)), int(max(0, t - mh)), int(min(w, r + mw)), int(min(h, b + mh)))
+
+def crop_decision(box, img_size):
+    if box is None:
+        return False, "flat_heatmap"
+    l, t, r, b = box
+    if min(r - l, b - t) < MIN_CROP_SIDE:
+        return False, "region_too_small"
+    if (r - l) * (b - t) > MAX_AREA_SHARE * img_size[0] * img_size[1]:
+        return False, "region_fills_frame"
+    return True, "cropped"
+
+def localize_images(pil_imgs, model):
+    """[(image_for_models, info)] — cropped to the dog where that helps, else the original."""
+    loc = localizer_for(model)
+    if loc is None:
+        return [(img, {"applied": False, "reason": "unsupported_model"}) for img in pil_imgs]
+    from inference import preprocess_pil
+    cams = loc.heatmaps(np.stack([preprocess_pil(img, loc.size) for img in pil_imgs], axis=0))
+    out = []
+    for img, cam in zip(pil_imgs, cams):
+        box = heatmap_box(cam, img.size, loc.size)
+        applied, reason = crop_decision(box, img.size)
+        info = {"applied": applied, "reason": reason, "box": list(box) if box else None,
+                "area_share": round((box[2] - box[0]) * (box[3] - box[1]) / (img.width * img.height), 3) if box else None}
+        out.append((img.crop(box) if applied else img, info))
+    return out
+
+def localize_image(pil_img, model):
+    return localize_images([pil_img], model)[0]
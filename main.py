@@ -3,20 +3,21 @@ from fastapi.responses import HTMLResponse
 from PIL import Image
 import io
 import numpy as np
-import tensorflow as tf
 import json
+from functools import lru_cache
 
-from tensorflow.keras.applications.mobilenet_v2 import (
-    MobileNetV2,
-    preprocess_input,
-    decode_predictions
-)
+from lazy_import import lazy_module
+
+tf = lazy_module("tensorflow")
+mobilenet_v2 = lazy_module("tensorflow", "keras.applications.mobilenet_v2")
 
 
 app = FastAPI()
 
-#pre-trained model daw
-model = MobileNetV2(weights = "imagenet")
+#pre-trained model daw — built on the first request, not at import
+@lru_cache(maxsize=1)
+def get_model():
+    return mobilenet_v2.MobileNetV2(weights = "imagenet")
 
 @app.get("/", response_class=HTMLResponse)
 def home():
@@ -41,9 +42,9 @@ async def predict(file: UploadFile = File(...)):
 
     array = np.array(image)
     array = np.expand_dims(array, axis=0)
-    array = preprocess_input(array)
-    predictions = model.predict(array)
-    decoded = decode_predictions(predictions, top=5)[0]
+    array = mobilenet_v2.preprocess_input(array)
+    predictions = get_model().predict(array)
+    decoded = mobilenet_v2.decode_predictions(predictions, top=5)[0]
     
     result = "<h2>Predictions</h2><ul>"
     for _, name, confidence in decoded:
@@ -0,0 +1,125 @@
+"""
+measure_cold_start.py  —  DogScan AI  |  Cold-start timing of the Flask model API
+Run: python measure_cold_start.py  [--formats h5 tflite savedmodel] [--runs 3] [--image dog.jpg]
+
+Starts a fresh `python app.py` per run (MODEL_FORMAT set per format) and records,
+from process spawn:
+  live_s              /health/live answers (module imported, no TensorFlow yet)
+  ready_s             /health/ready is 200 (all models loaded + warmed up)
+  first_prediction_s  first 200 from /predict/breed
+plus the server's own per-model load / warm-up breakdown. Also times
+`python model.py --help`. Writes the medians per format as JSON.
+
+Pre-convert the models first for the non-h5 formats: python model_registry.py convert
+"""
+
+import os, sys, json, time, base64, argparse, statistics, subprocess
+import urllib.request, urllib.error
+
+BASE_DIR   = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_DIR = os.path.join(BASE_DIR, "frontend", "public", "image", "breed_library_images")
+OUT_FILE   = os.path.join(BASE_DIR, "models", "cold_start_report.json")
+POLL_SECONDS = 0.05
+
+
+def http(method, url, body=None, timeout=60):
+    """(status, json) — HTTP errors are returned, connection errors raised."""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+
+def wait_for(check, started, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            result = check()
+            if result:
+                return round(time.perf_counter() - started, 3), result
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(POLL_SECONDS)
+    raise TimeoutError("server did not get there before --timeout")
+
+def one_run(fmt, port, image_b64, timeout):
+    base = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "MODEL_FORMAT": fmt, "PORT": str(port), "MODEL_POLL_SECONDS": "3600"}
+    started = time.perf_counter()
+    deadline = started + timeout
+    proc = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "app.py")], cwd=BASE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        live_s, _ = wait_for(lambda: http("GET", base + "/health/live")[0] == 200, started, deadline)
+
+        def ready():
+            status, body = http("GET", base + "/health/ready")
+            if body and body.get("phase") == "failed":
+                raise RuntimeError(f"startup failed: {body.get('error')}")
+            return body if status == 200 else None
+        ready_s, ready_body = wait_for(ready, started, deadline)
+
+        def predicted():
+            t0 = time.perf_counter()
+            status, _ = http("POST", base + "/predict/breed", {"image": image_b64}, timeout=timeout)
+            return round((time.perf_counter() - t0) * 1000, 1) if status == 200 else None
+        first_s, first_ms = wait_for(predicted, started, deadline)
+        return {"live_s": live_s, "ready_s": ready_s, "first_prediction_s": first_s,
+                "first_request_ms": first_ms, "server": {"timings": ready_body["timings"], "models": ready_body["models"]}}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+def time_help():
+    started = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(BASE_DIR, "model.py"), "--help"], cwd=BASE_DIR,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return round(time.perf_counter() - started, 3)
+
+def median_of(runs, key):
+    return round(statistics.median(r[key] for r in runs), 3)
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Measure cold start to first successful prediction")
+    p.add_argument("--formats", nargs="+", default=["h5", "tflite", "savedmodel"], choices=["h5", "tflite", "savedmodel", "auto"])
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--image", default=None, help=f"default: first image in {SAMPLE_DIR}")
+    p.add_argument("--port", type=int, default=5091)
+    p.add_argument("--timeout", type=float, default=300)
+    p.add_argument("--out", default=OUT_FILE)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    image = args.image or os.path.join(SAMPLE_DIR, sorted(os.listdir(SAMPLE_DIR))[0])
+    with open(image, "rb") as f:
+        image_b64 = base64.b64encode(f.read()).decode()
+
+    report = {"image": image, "runs_per_format": args.runs, "model_py_help_s": time_help(), "formats": {}}
+    for fmt in args.formats:
+        runs = []
+        for i in range(args.runs):
+            try:
+                runs.append(one_run(fmt, args.port, image_b64, args.timeout))
+                print(f"{fmt:10s} run {i + 1}: live {runs[-1]['live_s']:.2f}s  ready {runs[-1]['ready_s']:.2f}s  "
+                      f"first prediction {runs[-1]['first_prediction_s']:.2f}s")
+            except (RuntimeError, TimeoutError) as e:
+                print(f"{fmt:10s} run {i + 1}: {e}")
+                break
+        report["formats"][fmt] = {
+            "runs": runs,
+            **({k: median_of(runs, k) for k in ("live_s", "ready_s", "first_prediction_s")} if runs else {"error": "no successful run"}),
+        }
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nmodel.py --help: {report['model_py_help_s']:.2f}s")
+    for fmt, r in report["formats"].items():
+        if "error" not in r:
+            print(f"{fmt:10s} median  live {r['live_s']:.2f}s  ready {r['ready_s']:.2f}s  first prediction {r['first_prediction_s']:.2f}s")
+    print("Report:", args.out)
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,12 @@ Usage:
     # Train
     python mobilenet_dog_train.py --mode train --data_dir ./dogs
 
+    # Distill the served breed model into a small single-pass student
+    python mobilenet_dog_train.py --mode distill --data_dir ./dogs [--student_size 160 --student_alpha 0.5]
+
+    # Add new breed folders to the served model (head-only, cached embeddings + replay)
+    python mobilenet_dog_train.py --mode add_classes --data_dir ./dogs --model_dir ./added_breeds
+
     # Predict one image (shows top-k)
     python mobilenet_dog_train.py --mode predict --image_path path/to/image.jpg --model_path ./saved_model
 
@@ -31,15 +37,21 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'   # '2' hides INFO; set to '3' to hide WARNING too
 
 import json
+import time
 import argparse
 from pathlib import Path
 import math
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+from lazy_import import lazy_module
+
+# TensorFlow loads on first use, so --help / argument errors don't import it
+tf = lazy_module("tensorflow")
+keras = lazy_module("tensorflow", "keras")
+layers = lazy_module("tensorflow", "keras.layers")
+
+import dataset_manifest
+import inference
+from label_registry import normalize_labels
 
 # -----------------------------
 # CONFIG / HYPERPARAMS (edit these)
@@ -48,7 +60,8 @@ DATA_DIR = "dogs"                      # default dataset folder
 IMG_SIZE = 224
 BATCH_SIZE = 16                        # reduce to 8 if you run out of RAM/CPU
 SEED = 42
-AUTOTUNE = tf.data.AUTOTUNE
+VAL_SPLIT = 0.2                        # only used when the manifest is first built
+AUTOTUNE = -1                          # tf.data.AUTOTUNE (literal, so importing this module stays TF-free)
 
 EPOCHS_HEAD = 20                       # train classifier head
 EPOCHS_FINE = 30                       # fine-tune some top layers
@@ -65,16 +78,16 @@ BREED_TRAITS_JSON = "breed_traits.json"
 # -----------------------------
 # UTILITIES
 # -----------------------------
-def compute_class_weights(directory):
+def compute_class_weights(directory, entries=None, class_names=None):
     """
-    Compute class weights from directory structure (useful for imbalance).
+    Compute class weights from the dataset manifest (useful for imbalance).
+    `entries` defaults to the training split of <directory>/manifest.jsonl.
     Returns dict mapping class_index -> weight.
     """
-    class_counts = {}
-    classes = sorted([d.name for d in Path(directory).iterdir() if d.is_dir()])
-    for i, cls in enumerate(classes):
-        cnt = len(list((Path(directory) / cls).glob("*")))
-        class_counts[i] = max(1, cnt)
+    if entries is None:
+        entries = dataset_manifest.split_entries(dataset_manifest.load_manifest(directory), "train")
+    counts = dataset_manifest.class_counts(entries, class_names)
+    class_counts = {i: max(1, cnt) for i, cnt in enumerate(counts.values())}
     # compute weights: inverse proportional to frequency
     total = sum(class_counts.values())
     class_weight = {i: total / (len(class_counts) * count) for i, count in class_counts.items()}
@@ -97,27 +110,50 @@ def load_breed_traits(path=BREED_TRAITS_JSON):
 # -----------------------------
 # DATA LOADING + PREPROCESSING
 # -----------------------------
-def make_datasets(data_dir, img_size=IMG_SIZE, batch_size=BATCH_SIZE, seed=SEED, val_split=0.2):
-    train_ds = tf.keras.utils.image_dataset_from_directory(
-        data_dir,
-        validation_split=val_split,
-        subset="training",
-        seed=seed,
-        image_size=(img_size, img_size),
-        batch_size=batch_size
-    )
-    val_ds = tf.keras.utils.image_dataset_from_directory(
-        data_dir,
-        validation_split=val_split,
-        subset="validation",
-        seed=seed,
-        image_size=(img_size, img_size),
-        batch_size=batch_size
-    )
-    class_names = train_ds.class_names
+# image_dataset_from_directory only decodes these
+TF_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+
+def manifest_rows(entries, split, class_names):
+    """Manifest entries of one split that the dataset will actually load."""
+    known = set(class_names)
+    return [e for e in dataset_manifest.split_entries(entries, split)
+            if e["class_name"] in known and e["path"].lower().endswith(TF_IMAGE_EXTENSIONS)]
+
+def manifest_split(rows, class_names):
+    """(paths, labels) for manifest rows, labels indexed by class_names."""
+    index = {name: i for i, name in enumerate(class_names)}
+    return [e["path"] for e in rows], [index[e["class_name"]] for e in rows]
+
+def manifest_dataset(data_dir, paths, labels, img_size, batch_size, shuffle=False, seed=SEED):
+    """Equivalent of image_dataset_from_directory for an explicit list of manifest paths."""
+    full_paths = [dataset_manifest.entry_path(data_dir, {"path": p}) for p in paths]
+    ds = tf.data.Dataset.from_tensor_slices((full_paths, labels))
+    if shuffle:
+        ds = ds.shuffle(len(full_paths), seed=seed)
+
+    def load(path, label):
+        img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        img = tf.image.resize(img, (img_size, img_size))
+        return img, label
+
+    return ds.map(load, num_parallel_calls=AUTOTUNE).batch(batch_size)
+
+def make_datasets(data_dir, img_size=IMG_SIZE, batch_size=BATCH_SIZE, seed=SEED, val_split=VAL_SPLIT, class_names=None):
+    # train/val split comes from the manifest (content-hash based, see dataset_manifest.py)
+    entries = dataset_manifest.load_manifest(data_dir, val_split=val_split)
+    if not entries:
+        raise SystemExit(f"No images found under {data_dir}")
+    class_names = class_names or dataset_manifest.class_names(entries)
+    train_entries = manifest_rows(entries, "train", class_names)
+    train_paths, train_labels = manifest_split(train_entries, class_names)
+    val_paths, val_labels = manifest_split(manifest_rows(entries, "val", class_names), class_names)
+    print(f"Manifest: {len(train_paths)} train / {len(val_paths)} val images")
+
+    train_ds = manifest_dataset(data_dir, train_paths, train_labels, img_size, batch_size, shuffle=True, seed=seed)
+    val_ds = manifest_dataset(data_dir, val_paths, val_labels, img_size, batch_size)
     # apply MobileNetV2 preprocess_input (this handles scaling correctly for pretrained weights)
-    train_ds = train_ds.map(lambda x, y: (preprocess_input(tf.cast(x, tf.float32)), y), num_parallel_calls=AUTOTUNE)
-    val_ds = val_ds.map(lambda x, y: (preprocess_input(tf.cast(x, tf.float32)), y), num_parallel_calls=AUTOTUNE)
+    train_ds = train_ds.map(lambda x, y: (keras.applications.mobilenet_v2.preprocess_input(tf.cast(x, tf.float32)), y), num_parallel_calls=AUTOTUNE)
+    val_ds = val_ds.map(lambda x, y: (keras.applications.mobilenet_v2.preprocess_input(tf.cast(x, tf.float32)), y), num_parallel_calls=AUTOTUNE)
 
     # data augmentation (light, on-the-fly)
     data_augmentation = keras.Sequential([
@@ -133,13 +169,14 @@ def make_datasets(data_dir, img_size=IMG_SIZE, batch_size=BATCH_SIZE, seed=SEED,
     train_ds = train_ds.cache().shuffle(1000).prefetch(AUTOTUNE)
     val_ds = val_ds.cache().prefetch(AUTOTUNE)
 
-    return train_ds, val_ds, class_names
+    # train_entries: the exact split the dataset uses, for class weights (no second manifest scan)
+    return train_ds, val_ds, class_names, train_entries
 
 # -----------------------------
 # MODEL BUILDING
 # -----------------------------
 def build_model(num_classes, img_size=IMG_SIZE, dense_units=DENSE_UNITS, dropout_rate=DROPOUT_RATE):
-    base_model = MobileNetV2(
+    base_model = keras.applications.MobileNetV2(
         input_shape=(img_size, img_size, 3),
         include_top=False,
         weights="imagenet"
@@ -162,13 +199,13 @@ def build_model(num_classes, img_size=IMG_SIZE, dense_units=DENSE_UNITS, dropout
 # -----------------------------
 def train(data_dir=DATA_DIR, model_dir=MODEL_DIR):
     # Prepare data
-    train_ds, val_ds, class_names = make_datasets(data_dir)
+    train_ds, val_ds, class_names, train_entries = make_datasets(data_dir)
     num_classes = len(class_names)
     print("Detected classes:", num_classes, class_names)
     save_class_names(class_names)
 
     # Compute class weights (helpful if imbalance)
-    class_weights = compute_class_weights(data_dir)
+    class_weights = compute_class_weights(data_dir, entries=train_entries, class_names=class_names)
     print("Class weights (sample):", {k: round(v, 3) for k, v in list(class_weights.items())[:5]})
 
     # Build model
@@ -247,6 +284,351 @@ def train(data_dir=DATA_DIR, model_dir=MODEL_DIR):
 
     return model, class_names
 
+# -----------------------------
+# DISTILLATION (teacher TTA soft labels -> small student)
+# -----------------------------
+TEACHER_MODEL_PATH = os.path.join("models", "trained_model", "dog_breed_model.h5")
+TEACHER_LABELS_JSON = os.path.join("models", "class_labels.json")
+STUDENT_IMG_SIZE = 160
+STUDENT_ALPHA = 0.5                    # MobileNetV2 width multiplier
+STUDENT_DENSE_UNITS = 128
+EPOCHS_DISTILL = 30
+LEARNRATE_DISTILL = 1e-3
+SOFT_LABEL_WEIGHT = 0.8                # target = w * teacher_probs + (1 - w) * one_hot(true class)
+SOFT_LABELS_CACHE = "teacher_soft_labels.npz"
+TEACHER_CHUNK = 8                      # images per teacher TTA call (x10 variants)
+LATENCY_RUNS = 50
+
+def teacher_soft_labels(teacher, teacher_path, data_dir, entries, cache_path):
+    """
+    TTA-averaged teacher probabilities for every manifest entry, cached on disk
+    keyed by content hash. Only images missing from the cache go through the teacher.
+    """
+    cache_key = f"{os.path.getmtime(teacher_path)}|{inference.TTA_ROTATIONS}|{inference.TTA_HFLIP}"
+    cached = {}
+    if os.path.isfile(cache_path):
+        npz = np.load(cache_path, allow_pickle=False)
+        if str(npz["cache_key"]) == cache_key:
+            cached = dict(zip(npz["sha1"].tolist(), npz["probs"]))
+        else:
+            print("Teacher changed since the soft labels were cached — recomputing")
+
+    todo = [e for e in entries if e["sha1"] not in cached]
+    print(f"Soft labels: {len(entries) - len(todo)} cached, {len(todo)} to compute")
+    from PIL import Image
+    for i in range(0, len(todo), TEACHER_CHUNK):
+        chunk = todo[i:i + TEACHER_CHUNK]
+        pils = [Image.open(dataset_manifest.entry_path(data_dir, e)).convert("RGB") for e in chunk]
+        for e, probs in zip(chunk, inference.predict_with_tta_batch(pils, teacher)):
+            cached[e["sha1"]] = probs.astype(np.float32)
+        if (i // TEACHER_CHUNK) % 50 == 0:
+            print(f"  teacher TTA {min(i + TEACHER_CHUNK, len(todo))}/{len(todo)}")
+
+    if todo:
+        np.savez(cache_path, sha1=np.array(list(cached)), probs=np.stack(list(cached.values())), cache_key=cache_key)
+    return np.stack([cached[e["sha1"]] for e in entries])
+
+def letterbox_dataset(data_dir, paths, targets, img_size, batch_size, training=False, seed=SEED):
+    """Same input as serving (inference.preprocess_pil): aspect-preserving resize, white padding, [0, 1]."""
+    full_paths = [dataset_manifest.entry_path(data_dir, {"path": p}) for p in paths]
+    ds = tf.data.Dataset.from_tensor_slices((full_paths, targets))
+    if training:
+        ds = ds.shuffle(len(full_paths), seed=seed)
+
+    def load(path, target):
+        img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        img = tf.image.resize(tf.cast(img, tf.float32) / 255.0, (img_size, img_size), preserve_aspect_ratio=True)
+        # pad with white: shift to [-1, 0], zero-pad, shift back
+        img = tf.image.resize_with_crop_or_pad(img - 1.0, img_size, img_size) + 1.0
+        return img, target
+
+    ds = ds.map(load, num_parallel_calls=AUTOTUNE).batch(batch_size)
+    if training:
+        augment = keras.Sequential([layers.RandomFlip("horizontal"), layers.RandomRotation(0.04, fill_mode="constant", fill_value=1.0)])
+        ds = ds.map(lambda x, y: (augment(x, training=True), y), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
+
+def build_student(num_classes, img_size=STUDENT_IMG_SIZE, alpha=STUDENT_ALPHA, dense_units=STUDENT_DENSE_UNITS):
+    """Drop-in for the served breed model: takes [0, 1] letterboxed RGB, outputs softmax over the same classes."""
+    base_model = keras.applications.MobileNetV2(input_shape=(img_size, img_size, 3), alpha=alpha, include_top=False, weights="imagenet")
+    inputs = keras.Input(shape=(img_size, img_size, 3))
+    x = layers.Rescaling(2.0, offset=-1.0, name="to_mobilenet_range")(inputs)   # [0, 1] -> [-1, 1]
+    x = base_model(x)
+    x = layers.GlobalAveragePooling2D(name="gap")(x)
+    x = layers.Dense(dense_units, activation="relu")(x)
+    x = layers.Dropout(DROPOUT_RATE)(x)
+    outputs = layers.Dense(num_classes, activation="softmax")(x)
+    return keras.Model(inputs, outputs, name="breed_student")
+
+def cpu_latency_ms(fn, runs=LATENCY_RUNS):
+    fn()   # warm-up
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"p50": round(float(np.percentile(times, 50)), 2), "p95": round(float(np.percentile(times, 95)), 2)}
+
+def distill(data_dir=DATA_DIR, model_dir=MODEL_DIR, teacher_path=TEACHER_MODEL_PATH,
+            img_size=STUDENT_IMG_SIZE, alpha=STUDENT_ALPHA):
+    os.makedirs(model_dir, exist_ok=True)
+    teacher = tf.keras.models.load_model(teacher_path)
+    num_classes = teacher.output_shape[-1]
+
+    # hard labels in the teacher's class order (models/class_labels.json), not folder order
+    with open(TEACHER_LABELS_JSON, "r", encoding="utf-8") as f:
+        teacher_index = {c["class_name"]: int(c["class_index"]) for c in json.load(f)}
+    entries = [e for e in dataset_manifest.load_manifest(data_dir)
+               if e["path"].lower().endswith(TF_IMAGE_EXTENSIONS)]
+    soft = teacher_soft_labels(teacher, teacher_path, data_dir, entries, os.path.join(model_dir, SOFT_LABELS_CACHE))
+    hard = np.array([teacher_index.get(e["class_name"], -1) for e in entries])
+
+    one_hot = np.zeros_like(soft)
+    one_hot[hard >= 0, hard[hard >= 0]] = 1.0
+    w = np.where(hard >= 0, SOFT_LABEL_WEIGHT, 1.0)[:, None]     # no folder match -> pure soft label
+    targets = (w * soft + (1.0 - w) * one_hot).astype(np.float32)
+
+    is_val = np.array([e["split"] == "val" for e in entries])
+    paths = np.array([e["path"] for e in entries])
+    train_ds = letterbox_dataset(data_dir, paths[~is_val].tolist(), targets[~is_val], img_size, BATCH_SIZE, training=True)
+    val_ds = letterbox_dataset(data_dir, paths[is_val].tolist(), targets[is_val], img_size, BATCH_SIZE)
+
+    student = build_student(num_classes, img_size, alpha)
+    student.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=LEARNRATE_DISTILL),
+        loss=keras.losses.CategoricalCrossentropy(),
+        metrics=[keras.metrics.TopKCategoricalAccuracy(k=1, name="teacher_agreement")]
+    )
+    student_path = os.path.join(model_dir, "dog_breed_student.h5")
+    print(f"=== Distilling into MobileNetV2 alpha={alpha} @ {img_size}px ({student.count_params():,} params) ===")
+    student.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=EPOCHS_DISTILL,
+        callbacks=[
+            keras.callbacks.ModelCheckpoint(student_path, monitor="val_loss", save_best_only=True, verbose=1),
+            keras.callbacks.EarlyStopping(monitor="val_loss", patience=6, restore_best_weights=True, verbose=1),
+            keras.callbacks.ReduceLROnPlateau(monitor="val_loss", factor=0.3, patience=3, min_lr=1e-7, verbose=1),
+            keras.callbacks.CSVLogger(os.path.join(model_dir, "training_log_distill.csv")),
+        ]
+    )
+    student.save(student_path)
+    print("Saved student to:", student_path)
+    # serving sidecar (model_registry.SERVING_SUFFIX): publish ships it, the API then skips TTA for this model
+    with open(os.path.splitext(student_path)[0] + ".serving.json", "w", encoding="utf-8") as f:
+        json.dump({"tta": False, "distilled_from": teacher_path}, f, indent=2)
+    print(f"Publish with: python model_registry.py publish <version> --breed {student_path}")
+
+    report = distill_report(teacher, student, teacher_path, student_path, data_dir,
+                            [e for e, v in zip(entries, is_val) if v], soft[is_val], hard[is_val])
+    with open(os.path.join(model_dir, "distill_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    return student, report
+
+def distill_report(teacher, student, teacher_path, student_path, data_dir, val_entries, teacher_probs, hard):
+    """Accuracy on the manifest val split + CPU latency: teacher with 10-view TTA vs one student pass."""
+    from PIL import Image
+    pils = [Image.open(dataset_manifest.entry_path(data_dir, e)).convert("RGB") for e in val_entries]
+    student_probs = np.concatenate([inference.predict_simple_batch(pils[i:i + 64], student)
+                                    for i in range(0, len(pils), 64)]) if pils else np.zeros_like(teacher_probs)
+    labelled = hard >= 0
+
+    def accuracy(probs):
+        return round(float((probs[labelled].argmax(1) == hard[labelled]).mean()), 4) if labelled.any() else None
+
+    sample = pils[0] if pils else Image.new("RGB", (500, 375), (127, 127, 127))
+    n_views = len(inference.TTA_ROTATIONS) * (2 if inference.TTA_HFLIP else 1)
+    return {
+        "val_images": len(val_entries),
+        "teacher": {
+            "path": teacher_path,
+            "input_size": teacher.input_shape[1],
+            "params": teacher.count_params(),
+            "file_mb": round(os.path.getsize(teacher_path) / 1e6, 2),
+            "passes_per_image": n_views,
+            "top1_accuracy_tta": accuracy(teacher_probs),
+            "latency_ms_tta": cpu_latency_ms(lambda: inference.predict_with_tta(sample, teacher)),
+        },
+        "student": {
+            "path": student_path,
+            "input_size": student.input_shape[1],
+            "params": student.count_params(),
+            "file_mb": round(os.path.getsize(student_path) / 1e6, 2),
+            "passes_per_image": 1,
+            "top1_accuracy": accuracy(student_probs),
+            "teacher_top1_agreement": round(float((student_probs.argmax(1) == teacher_probs.argmax(1)).mean()), 4) if pils else None,
+            "latency_ms": cpu_latency_ms(lambda: inference.predict_simple(sample, student)),
+        },
+    }
+
+# -----------------------------
+# INCREMENTAL CLASS ADDITION (new breed folders, no full retrain)
+# -----------------------------
+REPLAY_PER_CLASS = 20                  # cached embeddings kept per existing class
+EMBEDDING_CACHE = "embedding_cache.npz"
+EPOCHS_INCREMENTAL = 40
+LEARNRATE_INCREMENTAL = 1e-3
+INCREMENTAL_BATCH = 64
+
+def load_label_records(labels_json=TEACHER_LABELS_JSON):
+    """Label records of the served breed model, in class_index order."""
+    with open(labels_json, "r", encoding="utf-8") as f:
+        return sorted(normalize_labels(json.load(f)), key=lambda r: r["class_index"])
+
+def split_at_embedding(model):
+    """(image -> pooled backbone features model, head layers after the pooling) of a build_model() network."""
+    gap = next(l for l in model.layers if isinstance(l, layers.GlobalAveragePooling2D))
+    return keras.Model(model.inputs, gap.output), model.layers[model.layers.index(gap) + 1:]
+
+def cached_embeddings(extractor, model_path, data_dir, entries, cache_path):
+    """Pooled features per manifest entry, cached by content hash for this base model."""
+    cache_key = f"{os.path.abspath(model_path)}|{os.path.getmtime(model_path)}"
+    cached = {}
+    if os.path.isfile(cache_path):
+        npz = np.load(cache_path, allow_pickle=False)
+        if str(npz["cache_key"]) == cache_key:
+            cached = dict(zip(npz["sha1"].tolist(), npz["features"]))
+    todo = [e for e in entries if e["sha1"] not in cached]
+    print(f"Embeddings: {len(entries) - len(todo)} cached, {len(todo)} to compute")
+    if todo:
+        img_size = extractor.input_shape[1]
+        ds = letterbox_dataset(data_dir, [e["path"] for e in todo], np.zeros(len(todo), dtype=np.float32),
+                               img_size, BATCH_SIZE)
+        for e, feat in zip(todo, extractor.predict(ds.map(lambda x, y: x), verbose=1)):
+            cached[e["sha1"]] = feat.astype(np.float32)
+        np.savez(cache_path, sha1=np.array(list(cached)), features=np.stack(list(cached.values())), cache_key=cache_key)
+    return np.stack([cached[e["sha1"]] for e in entries]) if entries else np.zeros((0, extractor.output_shape[-1]))
+
+def replay_sample(entries, per_class, seed=SEED):
+    """Up to `per_class` entries per class, picked deterministically."""
+    rng = np.random.default_rng(seed)
+    by_class = {}
+    for e in entries:
+        by_class.setdefault(e["class_name"], []).append(e)
+    picked = []
+    for name in sorted(by_class):
+        rows = by_class[name]
+        picked += [rows[i] for i in sorted(rng.permutation(len(rows))[:per_class])]
+    return picked
+
+def expand_output(head, features, labels, num_old, num_classes, train_hidden=False):
+    """Head-only model on pooled features whose final Dense grows from num_old to num_classes units.
+
+    Old units keep their weights; each new unit is imprinted with the mean hidden
+    activation of its class, scaled like the existing units.
+    """
+    inputs = keras.Input(shape=(features.shape[1],))
+    x = inputs
+    for layer in head[:-1]:
+        layer.trainable = train_hidden and isinstance(layer, layers.Dense)
+        x = layer(x)                         # shared with the full model
+    hidden = keras.Model(inputs, x)
+    old_out = head[-1]
+    new_out = layers.Dense(num_classes, activation="softmax", name=old_out.name)
+    outputs = new_out(x)
+    head_model = keras.Model(inputs, outputs)
+
+    k_old, b_old = old_out.get_weights()
+    acts = hidden.predict(features, verbose=0)
+    norm = float(np.linalg.norm(k_old, axis=0).mean())
+    new_cols = []
+    for c in range(num_old, num_classes):
+        if not (labels == c).any():
+            raise ValueError(f"No training images for new class index {c}")
+        mean = acts[labels == c].mean(axis=0)
+        new_cols.append(mean / (np.linalg.norm(mean) + 1e-8) * norm)
+    new_out.set_weights([np.concatenate([k_old, np.stack(new_cols, axis=1)], axis=1),
+                         np.concatenate([b_old, np.full(num_classes - num_old, b_old.mean())])])
+    return head_model, new_out
+
+def add_classes(data_dir=DATA_DIR, model_dir=MODEL_DIR, base_model_path=TEACHER_MODEL_PATH,
+                labels_json=TEACHER_LABELS_JSON, train_hidden=False):
+    """Extend the served breed model with the class folders it doesn't know yet."""
+    os.makedirs(model_dir, exist_ok=True)
+    records = load_label_records(labels_json)
+    old_names = [r["class_name"] for r in records]
+    model = tf.keras.models.load_model(base_model_path, compile=False)
+    if model.output_shape[-1] != len(old_names):
+        raise ValueError(f"{labels_json} has {len(old_names)} classes, model outputs {model.output_shape[-1]}")
+
+    # new breed folders are usually added after the manifest was built for training — rescan (incremental)
+    entries = [e for e in dataset_manifest.build_manifest(data_dir) if e["path"].lower().endswith(TF_IMAGE_EXTENSIONS)]
+    new_names = [n for n in dataset_manifest.class_names(entries) if n not in set(old_names)]
+    if not new_names:
+        print("No new class folders in", data_dir)
+        return None
+    class_names = old_names + new_names          # appended: existing class indices never move
+    index = {n: i for i, n in enumerate(class_names)}
+    print(f"Adding {len(new_names)} classes to {len(old_names)}: {new_names}")
+
+    def pick(split):
+        rows = dataset_manifest.split_entries(entries, split)
+        new = [e for e in rows if e["class_name"] in new_names]
+        old = replay_sample([e for e in rows if e["class_name"] in index and e["class_name"] not in new_names],
+                            REPLAY_PER_CLASS if split == "train" else max(1, REPLAY_PER_CLASS // 4))
+        return new + old
+    train_entries, val_entries = pick("train"), pick("val")
+    # a small new folder can hash entirely into val — it still needs images to imprint and train on
+    starved = set(new_names) - {e["class_name"] for e in train_entries}
+    if starved:
+        print(f"WARNING: no train-split images for {sorted(starved)} — training on their val images instead")
+        train_entries += [e for e in val_entries if e["class_name"] in starved]
+        val_entries = [e for e in val_entries if e["class_name"] not in starved]
+
+    extractor, head = split_at_embedding(model)
+    cache_path = os.path.join(model_dir, EMBEDDING_CACHE)
+    x_train = cached_embeddings(extractor, base_model_path, data_dir, train_entries, cache_path)
+    x_val = cached_embeddings(extractor, base_model_path, data_dir, val_entries, cache_path)
+    y_train = np.array([index[e["class_name"]] for e in train_entries])
+    y_val = np.array([index[e["class_name"]] for e in val_entries])
+
+    head_model, new_out = expand_output(head, x_train, y_train, len(old_names), len(class_names), train_hidden)
+    head_model.compile(optimizer=keras.optimizers.Adam(learning_rate=LEARNRATE_INCREMENTAL),
+                       loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+    class_weights = compute_class_weights(data_dir, entries=train_entries, class_names=class_names)
+    head_model.fit(
+        x_train, y_train,
+        validation_data=(x_val, y_val) if len(y_val) else None,
+        epochs=EPOCHS_INCREMENTAL,
+        batch_size=INCREMENTAL_BATCH,
+        class_weight=class_weights,          # every index 0..C-1 — Keras rejects gaps
+        callbacks=[keras.callbacks.EarlyStopping(monitor="val_loss" if len(y_val) else "loss", patience=5,
+                                                 restore_best_weights=True, verbose=1)],
+        verbose=2,
+    )
+
+    # Same backbone + hidden head, wider output layer
+    full = keras.Model(model.inputs, new_out(model.layers[-1].input))
+    model_path = os.path.join(model_dir, "dog_breed_model.h5")
+    full.save(model_path, include_optimizer=False)
+
+    new_records = records + [{"class_index": index[n], "class_name": n, "breed_id": None,
+                              "display_name": n.replace("_", " ").replace("-", " ").title()} for n in new_names]
+    labels_path = os.path.join(model_dir, "class_labels.json")
+    with open(labels_path, "w", encoding="utf-8") as f:
+        json.dump(new_records, f, indent=2)
+    save_class_names(class_names, os.path.join(model_dir, CLASS_NAMES_JSON))
+
+    preds = head_model.predict(x_val, verbose=0).argmax(axis=1) if len(y_val) else np.array([])
+    is_new = y_val >= len(old_names)
+    def accuracy(mask):
+        return round(float((preds[mask] == y_val[mask]).mean()), 4) if mask.any() else None
+    report = {
+        "base_model": base_model_path,
+        "old_classes": len(old_names),
+        "new_classes": new_names,
+        "train_images": {"new": int((y_train >= len(old_names)).sum()), "replay": int((y_train < len(old_names)).sum())},
+        "val_accuracy": {"new": accuracy(is_new), "old_replay": accuracy(~is_new), "all": accuracy(np.ones_like(is_new))},
+        "model": model_path,
+        "labels": labels_path,
+    }
+    with open(os.path.join(model_dir, "incremental_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Publish with: python model_registry.py publish <version> --breed {model_path} --labels {labels_path}")
+    return full, report
+
 # -----------------------------
 # PREDICTION / TOP-K + COMPARE
 # -----------------------------
@@ -260,7 +642,7 @@ def preprocess_image_for_predict(image_path, img_size=IMG_SIZE):
     from PIL import Image
     img = Image.open(image_path).convert("RGB").resize((img_size, img_size))
     arr = np.array(img).astype("float32")
-    arr = preprocess_input(arr)
+    arr = keras.applications.mobilenet_v2.preprocess_input(arr)
     arr = np.expand_dims(arr, axis=0)
     return arr
 
@@ -295,18 +677,30 @@ def compare_breeds(predictions, traits_db=None):
 # -----------------------------
 def parse_args():
     p = argparse.ArgumentParser()
-    p.add_argument("--mode", choices=["train", "predict"], required=True)
+    p.add_argument("--mode", choices=["train", "predict", "distill", "add_classes"], required=True)
     p.add_argument("--data_dir", default=DATA_DIR)
     p.add_argument("--model_dir", default=MODEL_DIR)
     p.add_argument("--model_path", default=os.path.join(MODEL_DIR, "final_saved_model"))
     p.add_argument("--image_path", default=None)
     p.add_argument("--top_k", type=int, default=3)
+    p.add_argument("--teacher_path", default=TEACHER_MODEL_PATH)
+    p.add_argument("--student_size", type=int, default=STUDENT_IMG_SIZE)
+    p.add_argument("--student_alpha", type=float, default=STUDENT_ALPHA)
+    p.add_argument("--base_model", default=TEACHER_MODEL_PATH, help="add_classes: served breed model to extend")
+    p.add_argument("--labels_json", default=TEACHER_LABELS_JSON, help="add_classes: its class_labels.json")
+    p.add_argument("--train_hidden", action="store_true", help="add_classes: also fine-tune the hidden Dense layer")
     return p.parse_args()
 
 def main():
     args = parse_args()
     if args.mode == "train":
         train(data_dir=args.data_dir, model_dir=args.model_dir)
+    elif args.mode == "distill":
+        distill(data_dir=args.data_dir, model_dir=args.model_dir, teacher_path=args.teacher_path,
+                img_size=args.student_size, alpha=args.student_alpha)
+    elif args.mode == "add_classes":
+        add_classes(data_dir=args.data_dir, model_dir=args.model_dir, base_model_path=args.base_model,
+                    labels_json=args.labels_json, train_hidden=args.train_hidden)
     elif args.mode == "predict":
         if not args.image_path:
             raise SystemExit("Error: --image_path is required for predict mode")
@@ -0,0 +1,145 @@
+"""
+model_formats.py  —  DogScan AI  |  Alternative serving formats for the .h5 models
+
+Loading a Keras .h5 rebuilds every layer in Python and reads all weights into
+memory. Each served model can instead be pre-converted
+(python model_registry.py convert) next to its .h5:
+  <stem>.tflite        TFLite flatbuffer — the interpreter memory-maps the file
+                       instead of rebuilding layers; pages are shared between workers
+  <stem>_savedmodel/   TF SavedModel — graph loaded via tf.saved_model.load, no Keras rebuild
+Whether that pays off on a given host is measured, not assumed:
+measure_cold_start.py reports time to ready / first prediction per format.
+
+Both loaders return an object with the slice of the Keras API the serving code
+uses (predict(batch, verbose=0), input_shape, output_shape), so inference.py,
+the dog gate and shadow mode work unchanged. TensorFlow is imported lazily.
+
+MODEL_FORMAT (env): "auto" (default: tflite > savedmodel > h5, skipping artifacts
+older than their .h5) or one of "tflite" / "savedmodel" / "h5" to force it.
+"""
+
+import os, threading
+import numpy as np
+
+FORMATS = ("tflite", "savedmodel", "h5")
+SAVEDMODEL_SUFFIX = "_savedmodel"
+TFLITE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)     # batch sizes with their own allocated interpreter
+
+
+def artifact_path(h5_path, fmt):
+    stem = os.path.splitext(h5_path)[0]
+    return {"tflite": stem + ".tflite", "savedmodel": stem + SAVEDMODEL_SUFFIX, "h5": h5_path}[fmt]
+
+def resolve(h5_path, preference=None):
+    """(format, path) to load for a served .h5, following MODEL_FORMAT."""
+    preference = (preference or os.environ.get("MODEL_FORMAT", "auto")).lower()
+    if preference != "auto":
+        if preference not in FORMATS:
+            raise ValueError(f"Unknown MODEL_FORMAT {preference!r} (expected auto, {', '.join(FORMATS)})")
+        return preference, artifact_path(h5_path, preference)
+    h5_mtime = os.path.getmtime(h5_path) if os.path.exists(h5_path) else 0
+    for fmt in FORMATS[:-1]:
+        path = artifact_path(h5_path, fmt)
+        if os.path.exists(path) and os.path.getmtime(path) >= h5_mtime:
+            return fmt, path
+    return "h5", h5_path
+
+class TFLiteModel:
+    """tf.lite.Interpreter behind a Keras-like predict().
+
+    Resizing + allocate_tensors() on every batch-size change would cost a
+    reallocation per call (a TTA request alternates 8- and 2-row batches), so
+    there is one interpreter per TFLITE_BUCKETS size, allocated once on first
+    use; batches are zero-padded up to the next bucket and split above the
+    largest. Interpreters memory-map the same file, so weights are not duplicated."""
+
+    def __init__(self, path, num_threads=None):
+        import tensorflow as tf
+        self._tf = tf
+        self.path = path
+        self.num_threads = num_threads
+        self._buckets = {}                  # rows -> (interpreter, lock)
+        self._lock = threading.Lock()
+        interpreter, _ = self._bucket(1)
+        self._input  = interpreter.get_input_details()[0]
+        self._output = interpreter.get_output_details()[0]
+        self.input_shape  = (None, *(int(d) for d in self._input["shape"][1:]))
+        self.output_shape = (None, *(int(d) for d in self._output["shape"][1:]))
+
+    def _bucket(self, rows):
+        with self._lock:
+            if rows not in self._buckets:
+                interpreter = self._tf.lite.Interpreter(model_path=self.path, num_threads=self.num_threads)
+                inp = interpreter.get_input_details()[0]
+                interpreter.resize_tensor_input(inp["index"], [rows, *inp["shape"][1:]])
+                interpreter.allocate_tensors()
+                self._buckets[rows] = (interpreter, threading.Lock())
+            return self._buckets[rows]
+
+    def _invoke(self, chunk):
+        rows = next(b for b in TFLITE_BUCKETS if b >= len(chunk))
+        if rows > len(chunk):
+            chunk = np.concatenate([chunk, np.zeros((rows - len(chunk), *chunk.shape[1:]), chunk.dtype)])
+        interpreter, lock = self._bucket(rows)
+        with lock:
+            interpreter.set_tensor(self._input["index"], chunk)
+            interpreter.invoke()
+            return interpreter.get_tensor(self._output["index"]).copy()
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=self._input["dtype"])
+        step = TFLITE_BUCKETS[-1]
+        return np.concatenate([self._invoke(batch[i:i + step])[:len(batch[i:i + step])]
+                               for i in range(0, len(batch), step)], axis=0)
+
+class SavedModelRunner:
+    """serving_default signature of a SavedModel behind a Keras-like predict()."""
+
+    def __init__(self, path):
+        import tensorflow as tf
+        self._tf = tf
+        self.path = path
+        self._fn = tf.saved_model.load(path).signatures["serving_default"]
+        (self._input_name, in_spec), = self._fn.structured_input_signature[1].items()
+        (self._output_name, out_spec), = self._fn.structured_outputs.items()
+        self.input_shape  = tuple(in_spec.shape.as_list())
+        self.output_shape = tuple(out_spec.shape.as_list())
+
+    def predict(self, batch, verbose=0):
+        out = self._fn(**{self._input_name: self._tf.constant(batch, dtype=self._tf.float32)})
+        return out[self._output_name].numpy()
+
+def load(h5_path, preference=None, num_threads=None):
+    """Load one served model in the preferred available format -> (model, format).
+    num_threads only applies to TFLite (Keras / SavedModel use TF's shared pools)."""
+    fmt, path = resolve(h5_path, preference)
+    if fmt == "tflite":
+        return TFLiteModel(path, num_threads), fmt
+    if fmt == "savedmodel":
+        return SavedModelRunner(path), fmt
+    from tensorflow.keras.models import load_model
+    return load_model(path, compile=False), fmt
+
+WARM_UP_ROWS = (1, 2, 8)      # single image, and the 8 + 2 row batches of one TTA request
+
+def warm_up(model):
+    for rows in WARM_UP_ROWS:
+        model.predict(np.zeros((rows, *model.input_shape[1:]), dtype=np.float32), verbose=0)
+
+def convert(h5_path, formats=("tflite", "savedmodel")):
+    """Write the TFLite / SavedModel artifacts for one .h5 (float32, numerically the same model)."""
+    import tensorflow as tf
+    model = tf.keras.models.load_model(h5_path, compile=False)
+    written = []
+    if "tflite" in formats:
+        with open(artifact_path(h5_path, "tflite"), "wb") as f:
+            f.write(tf.lite.TFLiteConverter.from_keras_model(model).convert())
+        written.append(artifact_path(h5_path, "tflite"))
+    if "savedmodel" in formats:
+        path = artifact_path(h5_path, "savedmodel")
+        if hasattr(model, "export"):
+            model.export(path)
+        else:
+            tf.saved_model.save(model, path)
+        written.append(path)
+    return written
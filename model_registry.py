@@ -0,0 +1,395 @@
+"""
+model_registry.py  —  DogScan AI  |  Versioned model registry + hot reload
+Run: python model_registry.py list
+     python model_registry.py publish v4 --breed path/to/dog_breed_model.h5 [--calibration calibration.json] [--activate]
+     python model_registry.py activate v4
+     python model_registry.py rollback
+     python model_registry.py convert [v4] [--formats tflite savedmodel]
+
+Layout:
+  models/registry/manifest.json   {"current": "v4", "history": ["v3", "v4"], "versions": {...}}
+  models/registry/v4/             dog_breed_model.h5, dog_emotion_model.h5, ... (+ optional label JSONs,
+                                  calibration.json from eval_model.py)
+
+A model may carry serving metadata in a sidecar next to its .h5
+(dog_breed_model.serving.json, e.g. {"tta": false} for the distilled
+single-pass student); publish copies it with the model. BREED_TTA (env)
+"on" / "off" overrides the breed model's flag for every version.
+
+A version without a label file falls back to models/. Calibration belongs to
+one breed model, so it never falls back: a version without calibration.json
+is served uncalibrated (T=1.0); "legacy" uses models/calibration.json. Without
+a registry at all, the legacy models/trained_model/ files are served as "legacy".
+
+Workers hold the active ModelSet in a ModelHolder. A new version is loaded,
+validated and warmed up on a background thread and then swapped in with a
+single reference assignment; in-flight requests keep the set they started
+with. Every worker polls manifest.json, so `activate` / `rollback` reach all
+gunicorn workers without a restart; a change that lands while a load is in
+flight is loaded right after it.
+
+Each model is loaded in the preferred pre-converted format available
+(model_formats.py: TFLite / SavedModel next to the .h5, see `convert`), and
+the models of a set are warmed up in parallel.
+"""
+
+import os, json, time, shutil, argparse, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import model_formats
+from label_registry import LabelRegistry, BREED_FIELDS, DISEASE_FIELDS
+
+log = logging.getLogger(__name__)
+
+BASE_DIR       = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR     = os.path.join(BASE_DIR, "models")
+LEGACY_SUBDIR  = "trained_model"
+LEGACY_VERSION = "legacy"
+MANIFEST_FILE  = "manifest.json"
+CALIBRATION_FILE = "calibration.json"
+SERVING_SUFFIX   = ".serving.json"
+DEFAULT_SERVING  = {"tta": True}
+
+MODEL_FILES = {
+    "breed":   "dog_breed_model.h5",
+    "emotion": "dog_emotion_model.h5",
+    "age":     "dog_age_model.h5",
+    "disease": "dog_skin_disease_model.h5",
+}
+# kind -> (label file, name_key, response fields)
+LABEL_FILES = {
+    "breed":   ("class_labels.json",   "display_name", BREED_FIELDS),
+    "emotion": ("emotion_labels.json", "name",         None),
+    "age":     ("age_labels.json",     "name",         None),
+    "disease": ("disease_info.json",   "name",         DISEASE_FIELDS),
+}
+
+
+def registry_dir(models_dir=MODELS_DIR):
+    return os.path.join(models_dir, "registry")
+
+# -----------------------------
+# MANIFEST
+# -----------------------------
+def read_manifest(models_dir=MODELS_DIR):
+    path = os.path.join(registry_dir(models_dir), MANIFEST_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_manifest(manifest, models_dir=MODELS_DIR):
+    path = os.path.join(registry_dir(models_dir), MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)        # atomic — watchers never see a half-written manifest
+
+def manifest_mtime(models_dir=MODELS_DIR):
+    try:
+        return os.path.getmtime(os.path.join(registry_dir(models_dir), MANIFEST_FILE))
+    except OSError:
+        return None
+
+def current_version(models_dir=MODELS_DIR):
+    manifest = read_manifest(models_dir)
+    return manifest["current"] if manifest and manifest.get("current") else LEGACY_VERSION
+
+def version_dir(version, models_dir=MODELS_DIR):
+    if version == LEGACY_VERSION:
+        return os.path.join(models_dir, LEGACY_SUBDIR)
+    return os.path.join(registry_dir(models_dir), version)
+
+def resolve_file(version, filename, models_dir=MODELS_DIR):
+    """Version-specific file if present, else the shared one under models/."""
+    path = os.path.join(version_dir(version, models_dir), filename)
+    return path if os.path.isfile(path) else os.path.join(models_dir, filename)
+
+def publish(version, files, models_dir=MODELS_DIR, notes="", activate_now=False):
+    """Create registry/<version> from `files` (kind/label filename -> path); unchanged models are linked from current."""
+    manifest = read_manifest(models_dir) or {"current": None, "history": [], "versions": {}}
+    if version == LEGACY_VERSION or version in manifest["versions"]:
+        raise ValueError(f"Version {version!r} already exists")
+    base, target = current_version(models_dir), version_dir(version, models_dir)
+    os.makedirs(target)
+    for kind, filename in MODEL_FILES.items():
+        src = files.get(kind) or os.path.join(version_dir(base, models_dir), filename)
+        if not os.path.isfile(src):
+            raise FileNotFoundError(f"No {kind} model for version {version}: {src}")
+        for fmt in model_formats.FORMATS:             # .h5 plus any pre-converted siblings
+            artifact = model_formats.artifact_path(src, fmt)
+            if os.path.exists(artifact):
+                link_or_copy(artifact, model_formats.artifact_path(os.path.join(target, filename), fmt))
+        if os.path.isfile(serving_path(src)):
+            shutil.copy2(serving_path(src), serving_path(os.path.join(target, filename)))
+    for filename, _, _ in LABEL_FILES.values():
+        src = files.get(filename) or (base != LEGACY_VERSION and os.path.join(version_dir(base, models_dir), filename))
+        if src and os.path.isfile(src):
+            shutil.copy2(src, os.path.join(target, filename))
+    # The base's temperature only fits the base's breed model
+    src = files.get(CALIBRATION_FILE) or (not files.get("breed") and calibration_path(base, models_dir))
+    if src and os.path.isfile(src):
+        shutil.copy2(src, os.path.join(target, CALIBRATION_FILE))
+    elif files.get("breed"):
+        log.warning("Version %s has a new breed model but no calibration.json — it will be served with T=1.0", version)
+    manifest["versions"][version] = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "base": base, "notes": notes}
+    write_manifest(manifest, models_dir)
+    if activate_now:
+        activate(version, models_dir)
+    return target
+
+def calibration_path(version, models_dir=MODELS_DIR):
+    if version == LEGACY_VERSION:
+        return os.path.join(models_dir, CALIBRATION_FILE)
+    return os.path.join(version_dir(version, models_dir), CALIBRATION_FILE)
+
+def load_calibration(version, models_dir=MODELS_DIR):
+    """{"breed_temperature": T} of `version` (T=1.0 when it was never calibrated)."""
+    path = calibration_path(version, models_dir)
+    calibration = {"breed_temperature": 1.0}
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            calibration.update(json.load(f))
+        calibration["breed_temperature"] = float(calibration["breed_temperature"])
+    return calibration
+
+def serving_path(h5_path):
+    return os.path.splitext(h5_path)[0] + SERVING_SUFFIX
+
+def load_serving(h5_path, kind):
+    """Serving flags of one model file: its sidecar over DEFAULT_SERVING, then the BREED_TTA override."""
+    meta = dict(DEFAULT_SERVING)
+    if os.path.isfile(serving_path(h5_path)):
+        with open(serving_path(h5_path), "r", encoding="utf-8") as f:
+            meta.update(json.load(f))
+    override = os.environ.get("BREED_TTA", "auto").lower()
+    if kind == "breed" and override in ("on", "off"):
+        meta["tta"] = override == "on"
+    return meta
+
+def link_or_copy(src, dst):
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, copy_function=link_or_copy)
+        return dst
+    try:
+        os.link(src, dst)        # free for unchanged models
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+def convert(version, models_dir=MODELS_DIR, formats=("tflite", "savedmodel")):
+    """Write TFLite / SavedModel artifacts next to every .h5 of `version`."""
+    written = []
+    for filename in MODEL_FILES.values():
+        written += model_formats.convert(os.path.join(version_dir(version, models_dir), filename), formats)
+    return written
+
+def activate(version, models_dir=MODELS_DIR):
+    manifest = read_manifest(models_dir)
+    if not manifest or version not in manifest["versions"]:
+        raise ValueError(f"Unknown model version {version!r}")
+    if manifest.get("current") != version:
+        manifest["current"] = version
+        manifest["history"].append(version)
+        write_manifest(manifest, models_dir)
+    return version
+
+def rollback(models_dir=MODELS_DIR):
+    """Re-activate the version that was current before the present one."""
+    manifest = read_manifest(models_dir)
+    history = (manifest or {}).get("history", [])
+    if len(history) < 2:
+        raise ValueError("Nothing to roll back to")
+    history.pop()
+    manifest["current"] = history[-1]
+    write_manifest(manifest, models_dir)
+    return manifest["current"]
+
+# -----------------------------
+# LOADING + HOT SWAP
+# -----------------------------
+class ModelSet:
+    """One loaded, validated and warmed-up generation of the served models + labels."""
+
+    def __init__(self, version, models, labels, formats=None, calibration=None, serving=None):
+        self.version     = version
+        self.models      = models
+        self.labels      = labels
+        self.formats     = formats or {}
+        self.calibration = calibration or {"breed_temperature": 1.0}
+        self.serving     = serving or {kind: dict(DEFAULT_SERVING) for kind in models}
+        self.loaded_at = time.time()
+
+def load_model_set(version, models_dir=MODELS_DIR, progress=None, threads=None, runner=None):
+    """Load every model + label table of `version`; `progress` (dict) gets kind -> stage/seconds,
+    `threads` (kind -> n) sets per-model interpreter threads, `runner(kind, fn)` wraps each
+    model's load and warm-up (executor.ModelExecutor.pinned: lane CPU affinity)."""
+    progress = {} if progress is None else progress
+    runner = runner or (lambda kind, fn: fn())
+    progress.update({kind: {"stage": "pending"} for kind in MODEL_FILES})
+    models, labels, formats, serving = {}, {}, {}, {}
+    # Loading stays sequential (.h5 reads serialize on h5py's global lock anyway);
+    # measure_cold_start.py shows how much of startup it is per format
+    for kind, filename in MODEL_FILES.items():
+        started = time.perf_counter()
+        progress[kind] = {"stage": "loading"}
+        h5_path = os.path.join(version_dir(version, models_dir), filename)
+        models[kind], formats[kind] = runner(kind, lambda: model_formats.load(h5_path,
+                                                                              num_threads=(threads or {}).get(kind)))
+        serving[kind] = load_serving(h5_path, kind)
+        label_file, name_key, fields = LABEL_FILES[kind]
+        path = resolve_file(version, label_file, models_dir)
+        labels[kind] = LabelRegistry.from_file(os.path.dirname(path), os.path.basename(path), kind,
+                                               name_key=name_key, fields=fields)
+        # Label files must line up with the model heads — fail before swapping in
+        labels[kind].validate(models[kind].output_shape[-1])
+        progress[kind] = {"stage": "warming", "format": formats[kind],
+                          "load_s": round(time.perf_counter() - started, 2)}
+
+    def warm(kind):
+        started = time.perf_counter()
+        runner(kind, lambda: model_formats.warm_up(models[kind]))
+        progress[kind] = {**progress[kind], "stage": "ready", "warmup_s": round(time.perf_counter() - started, 2)}
+
+    # First predict traces/allocates per model — independent, so run them side by side
+    with ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="warmup") as pool:
+        list(pool.map(warm, models))
+    return ModelSet(version, models, labels, formats, load_calibration(version, models_dir), serving)
+
+class ModelHolder:
+    """Owns the active ModelSet of one worker and swaps in new versions in the background."""
+
+    def __init__(self, models_dir=MODELS_DIR, loader=load_model_set):
+        self.models_dir = models_dir
+        self.loader     = loader
+        self._current   = None
+        self._lock      = threading.Lock()
+        self._loading   = None
+        self._pending   = None        # target requested while a load was running
+        self.last_error = None
+        self.progress   = {}          # kind -> {"stage", "format", "load_s", "warmup_s"} of the latest load
+
+    @property
+    def current(self):
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.version if self._current else None
+
+    def load_initial(self):
+        self._current = self.loader(current_version(self.models_dir), self.models_dir, progress=self.progress)
+        log.info("Model version %s loaded and warmed up", self._current.version)
+        return self._current
+
+    def reload_async(self, version=None):
+        """Load `version` (default: manifest current) off-thread. Returns False if nothing started:
+        already serving it, or a load is running — then it is queued and loaded right after."""
+        version = version or current_version(self.models_dir)
+        with self._lock:
+            if self._loading:
+                self._pending = version if version != self._loading else None
+                return False
+            if version == self.version:
+                return False
+            self._loading = version
+        threading.Thread(target=self._reload, args=(version,), name=f"model-reload-{version}", daemon=True).start()
+        return True
+
+    def _reload(self, version):
+        started = time.perf_counter()
+        try:
+            new_set = self.loader(version, self.models_dir, progress=self.progress)
+            self._current = new_set            # atomic swap
+            self.last_error = None
+            log.info("Swapped in model version %s (%.1fs)", version, time.perf_counter() - started)
+        except Exception as e:
+            self.last_error = f"{version}: {e}"
+            log.exception("Loading model version %s failed — keeping %s", version, self.version)
+        finally:
+            with self._lock:
+                self._loading = None
+                pending, self._pending = self._pending, None
+        # activate / rollback that landed mid-load; a failed version is not retried in a loop
+        target = pending or current_version(self.models_dir)
+        if target != version:
+            self.reload_async(target)
+
+    def watch(self, poll_seconds):
+        """Poll the manifest and follow activate/rollback from any process."""
+        seen = manifest_mtime(self.models_dir)
+        def loop():
+            nonlocal seen
+            while True:
+                time.sleep(poll_seconds)
+                mtime = manifest_mtime(self.models_dir)
+                if mtime != seen:
+                    seen = mtime
+                    self.reload_async()
+        threading.Thread(target=loop, name="model-manifest-watch", daemon=True).start()
+
+    def status(self):
+        cur = self._current
+        return {
+            "version":    cur.version if cur else None,
+            "formats":    cur.formats if cur else {},
+            "loaded_at":  time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(cur.loaded_at)) if cur else None,
+            "loading":    self._loading,
+            "pending":    self._pending,
+            "calibration": cur.calibration if cur else None,
+            "breed_tta":  cur.serving["breed"]["tta"] if cur else None,
+            "last_error": self.last_error,
+            "target":     current_version(self.models_dir),
+        }
+
+# -----------------------------
+# CLI
+# -----------------------------
+def parse_args():
+    p = argparse.ArgumentParser(description="Manage the versioned model registry")
+    p.add_argument("--models_dir", default=MODELS_DIR)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    pub = sub.add_parser("publish")
+    pub.add_argument("version")
+    for kind in MODEL_FILES:
+        pub.add_argument(f"--{kind}", default=None, help=f"path to the new {kind} model (default: keep current)")
+    pub.add_argument("--labels", nargs="*", default=[], help="label JSON files to ship with this version")
+    pub.add_argument("--calibration", default=None, help="calibration.json written by eval_model.py for this breed model")
+    pub.add_argument("--notes", default="")
+    pub.add_argument("--activate", action="store_true")
+    act = sub.add_parser("activate")
+    act.add_argument("version")
+    sub.add_parser("rollback")
+    conv = sub.add_parser("convert", help="write TFLite / SavedModel copies of a version's .h5 models")
+    conv.add_argument("version", nargs="?", default=None, help="default: current version")
+    conv.add_argument("--formats", nargs="+", default=["tflite", "savedmodel"], choices=["tflite", "savedmodel"])
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    if args.cmd == "list":
+        manifest = read_manifest(args.models_dir)
+        if not manifest:
+            print(f"No registry — serving {LEGACY_VERSION} ({version_dir(LEGACY_VERSION, args.models_dir)})")
+            return
+        for version, info in manifest["versions"].items():
+            mark = "*" if version == manifest["current"] else " "
+            print(f"{mark} {version:12s} {info['created_at']}  base={info['base']}  {info['notes']}")
+    elif args.cmd == "publish":
+        files = {kind: getattr(args, kind) for kind in MODEL_FILES if getattr(args, kind)}
+        files.update({os.path.basename(p): p for p in args.labels})
+        if args.calibration:
+            files[CALIBRATION_FILE] = args.calibration
+        print("Published", publish(args.version, files, args.models_dir, args.notes, args.activate))
+    elif args.cmd == "activate":
+        print("Active version:", activate(args.version, args.models_dir))
+    elif args.cmd == "rollback":
+        print("Rolled back to:", rollback(args.models_dir))
+    elif args.cmd == "convert":
+        version = args.version or current_version(args.models_dir)
+        for path in convert(version, args.models_dir, args.formats):
+            print("Wrote", path)
+
+if __name__ == "__main__":
+    main()
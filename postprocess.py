@@ -0,0 +1,137 @@
+"""
+postprocess.py  —  DogScan AI  |  Batched prediction post-processing
+
+Shared by app.py (serving) and eval_model.py (offline evaluation) so both use
+the same thresholds and decision rules. Every function takes an (N, C)
+probability matrix (a 1-D vector is treated as N=1) and works on all rows at
+once; only building the per-row response dicts loops in Python.
+"""
+
+import numpy as np
+
+UNCERTAIN_THRESHOLDS = {
+    "max_prob":  0.55,     # highest prob below this -> likely mixed
+    "margin":    0.18,     # top1 - top2 below this  -> likely mixed
+    "top3_sum":  0.60,     # sum(top-k) below this   -> uncertain
+    "entropy":   0.8,      # entropy above this      -> likely mixed
+}
+MIXED_BREED_SETTINGS = {
+    "min_secondary_prob":  0.10,   # show mixed-breed components with at least 10%
+    "max_breeds_to_show":  4,
+    "confident_threshold": 0.75,   # only call it "pure breed" above 75%
+}
+
+
+def as_matrix(probs):
+    probs = np.asarray(probs, dtype=np.float32)
+    return probs[None, :] if probs.ndim == 1 else probs
+
+def apply_temperature(probs, T):
+    """Temperature scaling on probabilities (no logits needed). T == 1 is a no-op."""
+    probs = as_matrix(probs)
+    if T == 1.0:
+        return probs
+    scaled = np.clip(probs, 1e-12, 1.0) ** (1.0 / T)
+    return scaled / scaled.sum(axis=-1, keepdims=True)
+
+def top_k(probs, k):
+    """(indices, values) of the k largest entries per row, sorted descending — argpartition, not a full sort."""
+    probs = as_matrix(probs)
+    k = min(k, probs.shape[1])
+    if k < probs.shape[1]:
+        part = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(k), probs.shape).copy()
+    vals  = np.take_along_axis(probs, part, axis=1)
+    order = np.argsort(-vals, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(vals, order, axis=1)
+
+def entropy(probs):
+    p = np.clip(as_matrix(probs), 1e-12, 1.0)
+    return -np.sum(p * np.log(p), axis=1)
+
+def breed_stats(probs, k=3, temperature=1.0):
+    """Top-k, margin, top-k sum and entropy for every row."""
+    probs = apply_temperature(probs, temperature)
+    idx, vals = top_k(probs, k)
+    p1 = vals[:, 0]
+    p2 = vals[:, 1] if vals.shape[1] > 1 else np.zeros_like(p1)
+    topk_sum = vals.sum(axis=1)
+    mix_pct  = np.divide(vals * 100.0, topk_sum[:, None], out=np.zeros_like(vals), where=topk_sum[:, None] > 0)
+    return {
+        "probs":    probs,
+        "top_idx":  idx,
+        "top_probs": vals,
+        "p1":       p1,
+        "margin":   p1 - p2,
+        "topk_sum": topk_sum,
+        "entropy":  entropy(probs),
+        "mix_pct":  mix_pct,
+    }
+
+def classify(stats, thresholds=UNCERTAIN_THRESHOLDS, settings=MIXED_BREED_SETTINGS):
+    """Vectorized pure / mixed / uncertain decision. Returns (result_types, is_mixed, flags)."""
+    flags = {
+        "low_confidence":     stats["p1"]       < thresholds["max_prob"],
+        "close_margin":       stats["margin"]   < thresholds["margin"],
+        "spread_predictions": stats["topk_sum"] < thresholds["top3_sum"],
+        "high_entropy":       stats["entropy"]  > thresholds["entropy"],
+    }
+    is_mixed = flags["low_confidence"] | flags["close_margin"] | flags["high_entropy"]
+    is_pure  = stats["p1"] >= settings["confident_threshold"]
+    result_types = np.where(is_pure, "pure_breed", np.where(is_mixed, "mixed_breed", "uncertain"))
+    return result_types, is_mixed, flags
+
+_FLAG_VALUE = {
+    "low_confidence":     "p1",
+    "close_margin":       "margin",
+    "spread_predictions": "topk_sum",
+    "high_entropy":       "entropy",
+}
+
+def reasons_for_row(stats, flags, row):
+    return [f"{name} ({stats[_FLAG_VALUE[name]][row]:.2f})" for name, mask in flags.items() if mask[row]]
+
+def analyze_breeds(probs, labels, k=3, temperature=1.0):
+    """Breed analysis for every row of an (N, C) matrix; labels is a LabelRegistry."""
+    stats = breed_stats(probs, k, temperature)
+    result_types, is_mixed, flags = classify(stats)
+    min_secondary = MIXED_BREED_SETTINGS["min_secondary_prob"]
+    # entries hidden for mixed results, decided for all rows at once
+    keep = ~(is_mixed[:, None] & (stats["top_probs"] < min_secondary))
+
+    results = []
+    for row in range(stats["top_idx"].shape[0]):
+        top_breeds = []
+        for rank, (idx, raw, pct) in enumerate(zip(stats["top_idx"][row], stats["top_probs"][row], stats["mix_pct"][row])):
+            entry = labels.fragment(idx)
+            if not keep[row, rank] or not entry:
+                continue
+            top_breeds.append({
+                "rank":       rank + 1,
+                **entry,
+                "confidence": round(float(raw) * 100, 2),
+                "mix_share":  round(float(pct), 1),
+            })
+        results.append({
+            "result_type": str(result_types[row]),
+            "top_breeds":  top_breeds,
+            "entropy":     round(float(stats["entropy"][row]), 4),
+            "reasons":     reasons_for_row(stats, flags, row),
+        })
+    return results
+
+def top1_results(probs, labels):
+    """Top-1 label + confidence for every row (emotion / age)."""
+    probs = as_matrix(probs)
+    idx = probs.argmax(axis=1)
+    conf = probs[np.arange(len(idx)), idx]
+    return [{"class_index": int(i), "confidence": round(float(c) * 100, 2), **labels.fragment(i)}
+            for i, c in zip(idx, conf)]
+
+def ranked_results(probs, labels, k=3):
+    """Top-k label fragments + confidence for every row (disease)."""
+    idx, vals = top_k(probs, k)
+    return [[{"rank": rank + 1, **labels.fragment(i), "confidence": round(float(v) * 100, 2)}
+             for rank, (i, v) in enumerate(zip(row_idx, row_vals)) if labels.fragment(i)]
+            for row_idx, row_vals in zip(idx, vals)]
@@ -0,0 +1,81 @@
+"""
+quality.py  —  DogScan AI  |  Cheap pre-inference image quality gate
+
+Runs on a downscaled grayscale copy (longest side QUALITY_SIZE) in plain NumPy —
+no OpenCV — and costs well under a couple of milliseconds per image:
+  • resolution       original too small to classify
+  • blank            almost no contrast (empty frame, lens cap, solid fill)
+  • exposure         mean brightness / clipped-pixel share
+  • blur             variance of the 4-neighbour Laplacian
+
+assess() returns an action for the serving pipeline:
+  "reject"   — hard failure, don't run the models
+  "reduced"  — usable but poor; run the cheap path (no TTA)
+  "full"     — normal pipeline
+"""
+
+import numpy as np
+from PIL import Image
+
+QUALITY_SIZE = 256
+
+QUALITY_THRESHOLDS = {
+    "min_side":        64,      # px, original image — below: reject
+    "low_res_side":    160,     # px, original image — below: reduced
+    "blank_std":       4.0,     # gray-level std (0-255) — below: reject
+    "blur_reject":     15.0,    # Laplacian variance — below: reject
+    "blur_warn":       100.0,   # Laplacian variance — below: reduced
+    "dark_mean":       35.0,    # mean gray level — below: reduced
+    "bright_mean":     225.0,   # mean gray level — above: reduced
+    "clipped_share":   0.5,     # share of pixels at <=5 or >=250 — above: reduced
+}
+
+HARD_FLAGS = {"too_small", "blank", "very_blurry"}
+
+
+def grayscale_small(pil_img, size=QUALITY_SIZE):
+    """Nearest-neighbour subsample first (filtered resizes of a 12 MP photo cost >10 ms), then gray."""
+    w, h = pil_img.size
+    scale = min(1.0, size / max(w, h))
+    small = pil_img.resize((max(1, round(w * scale)), max(1, round(h * scale))),
+                           Image.NEAREST) if scale < 1.0 else pil_img
+    return np.asarray(small.convert("L"), dtype=np.float32)
+
+def laplacian_variance(gray):
+    lap = gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4.0 * gray[1:-1, 1:-1]
+    return float(lap.var()) if lap.size else 0.0
+
+def quality_metrics(pil_img):
+    gray = grayscale_small(pil_img)
+    return {
+        "width":         pil_img.width,
+        "height":        pil_img.height,
+        "mean":          round(float(gray.mean()), 2),
+        "std":           round(float(gray.std()), 2),
+        "clipped_share": round(float(((gray <= 5) | (gray >= 250)).mean()), 4),
+        "laplacian_var": round(laplacian_variance(gray), 2),
+    }
+
+def assess(pil_img, thresholds=QUALITY_THRESHOLDS):
+    m, t = quality_metrics(pil_img), thresholds
+    flags = []
+    short_side = min(m["width"], m["height"])
+    if short_side < t["min_side"]:                flags.append("too_small")
+    elif short_side < t["low_res_side"]:          flags.append("low_resolution")
+    if m["std"] < t["blank_std"]:                 flags.append("blank")
+    elif m["laplacian_var"] < t["blur_reject"]:   flags.append("very_blurry")
+    elif m["laplacian_var"] < t["blur_warn"]:     flags.append("blurry")
+    if m["mean"] < t["dark_mean"]:                flags.append("underexposed")
+    elif m["mean"] > t["bright_mean"]:            flags.append("overexposed")
+    elif m["clipped_share"] > t["clipped_share"]: flags.append("clipped")
+
+    if HARD_FLAGS.intersection(flags):
+        action = "reject"
+    elif flags:
+        action = "reduced"
+    else:
+        action = "full"
+    return {"action": action, "flags": flags, "metrics": m}
+
+def is_blurry(pil_img, thresh=QUALITY_THRESHOLDS["blur_warn"]):
+    return laplacian_variance(grayscale_small(pil_img)) < thresh
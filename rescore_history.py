@@ -0,0 +1,292 @@
+"""
+rescore_history.py  —  DogScan AI  |  Bulk re-scoring of past scans after a model upgrade
+Run: python rescore_history.py --input scans_export.csv --image_root uploads [--version v4]
+                               [--workers 2] [--cpu_share 0.5] [--batch 16] [--out rescore_v4.sqlite]
+     python rescore_history.py --image_dir uploads --scan_type breed
+
+Input: a CSV or JSON-lines export with one row per scan —
+  scan_id, scan_type ("breed" / "disease"), image (path, relative to --image_root),
+  top_result, confidence   (the stored values, optional — used to flag changes)
+or --image_dir, which scores every image below it (scan_id = relative path).
+
+Scoring is the app.py pipeline without Flask: quality gate, dog gate (DOG_GATE,
+same env as the server — non-dog photos get result_type "no_dog"), optional
+LOCALIZE crop, TTA breed + emotion + age or disease top-3, same calibration
+temperature. Batches run on a process
+pool, each worker with its own model set and a fixed TF thread count.
+
+Output: one SQLite file (table `rescored`, one row per scan incl. the full
+JSON result). Every finished batch is committed, so the job can be killed at
+any point and simply re-run — scans already scored by the target model version
+are skipped; with --force, rows left by another version are scored again.
+
+CPU share: workers × TF threads is sized to cpu_share × cores, workers are
+niced, and each worker idles after a batch whenever it would otherwise exceed
+its share (duty cycle).
+"""
+
+import os, csv, json, math, time, sqlite3, argparse, logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+log = logging.getLogger(__name__)
+
+BASE_DIR     = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR   = os.path.join(BASE_DIR, "models")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif")
+BATCH_SIZE   = 16
+CPU_SHARE    = 0.5
+TF_THREADS   = 1           # intra-op threads per worker
+NICE         = 10
+SCAN_TYPES   = ("breed", "disease")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS rescored (
+    scan_id         TEXT PRIMARY KEY,
+    scan_type       TEXT,
+    image_path      TEXT,
+    model_version   TEXT,
+    top_result      TEXT,
+    confidence      REAL,
+    result_type     TEXT,
+    old_top_result  TEXT,
+    old_confidence  REAL,
+    changed         INTEGER,
+    result          TEXT,
+    error           TEXT,
+    rescored_at     TEXT
+);
+"""
+
+# -----------------------------
+# INPUT
+# -----------------------------
+def read_jobs(input_path=None, image_root="", image_dir=None, scan_type="breed"):
+    if image_dir:
+        jobs = []
+        for root, _, files in os.walk(image_dir):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    jobs.append({"scan_id": os.path.relpath(path, image_dir), "scan_type": scan_type,
+                                 "image_path": path, "old_top_result": None, "old_confidence": None})
+        return jobs
+
+    with open(input_path, "r", encoding="utf-8", newline="") as f:
+        if input_path.lower().endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    jobs = []
+    for row in rows:
+        old_conf = row.get("confidence")
+        jobs.append({
+            "scan_id":        str(row["scan_id"]),
+            "scan_type":      row.get("scan_type") or scan_type,
+            "image_path":     os.path.join(image_root, row["image"]),
+            "old_top_result": row.get("top_result") or None,
+            "old_confidence": float(old_conf) if old_conf not in (None, "") else None,
+        })
+    return jobs
+
+# -----------------------------
+# CHECKPOINT (SQLite)
+# -----------------------------
+def open_output(path, version, force=False):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    stored = conn.execute("SELECT value FROM meta WHERE key = 'model_version'").fetchone()
+    if stored and stored[0] != version and not force:
+        raise SystemExit(f"{path} holds results of model version {stored[0]}, not {version} — "
+                         f"use another --out or --force")
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('model_version', ?)", (version,))
+    conn.commit()
+    return conn
+
+def finished_ids(conn, version, retry_errors=False):
+    """Scans already scored by `version` — rows from another version (kept by --force) are redone."""
+    query = "SELECT scan_id FROM rescored WHERE model_version = ?" + (" AND error IS NULL" if retry_errors else "")
+    return {row[0] for row in conn.execute(query, (version,))}
+
+def save_rows(conn, rows):
+    conn.executemany(
+        "INSERT OR REPLACE INTO rescored VALUES (:scan_id, :scan_type, :image_path, :model_version, :top_result, "
+        ":confidence, :result_type, :old_top_result, :old_confidence, :changed, :result, :error, :rescored_at)",
+        rows)
+    conn.commit()                       # one transaction per batch = the resume checkpoint
+
+# -----------------------------
+# WORKER
+# -----------------------------
+_WORKER = {}
+
+def init_worker(version, models_dir, tf_threads, duty):
+    try:
+        os.nice(NICE)
+    except (AttributeError, OSError):
+        pass
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    import model_registry
+    from dog_gate import DogGate
+    _WORKER["models"] = model_registry.load_model_set(version, models_dir)
+    _WORKER["duty"] = duty
+    try:
+        _WORKER["dog_gate"] = DogGate.from_env()
+    except Exception:
+        _WORKER["dog_gate"] = None            # fail open, like app.py startup
+        log.warning("Dog gate could not be loaded — breed scans are scored without it", exc_info=True)
+    _WORKER["localize"] = os.environ.get("LOCALIZE", "off").lower() == "on"
+
+def result_row(job, version, **fields):
+    row = {**job, "model_version": version, "top_result": None, "confidence": None, "result_type": None,
+           "changed": None, "result": None, "error": None, "rescored_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    row.update(fields)
+    if row["top_result"] is not None and job["old_top_result"] is not None:
+        row["changed"] = int(row["top_result"] != job["old_top_result"])
+    return row
+
+def score_batch(jobs):
+    """All jobs share one scan_type. Runs in a pool worker."""
+    from PIL import Image
+    import postprocess, quality
+    from inference import predict_breed_probs, predict_simple_batch
+
+    started = time.perf_counter()
+    ms = _WORKER["models"]
+    rows, imgs, pending = [], [], []
+    for job in jobs:
+        try:
+            img = Image.open(job["image_path"]).convert("RGB")
+        except Exception as e:
+            rows.append(result_row(job, ms.version, error=f"unreadable image: {e}"))
+            continue
+        q = quality.assess(img)
+        if q["action"] == "reject":
+            rows.append(result_row(job, ms.version, result_type="rejected_quality",
+                                   result=json.dumps({"quality": q})))
+            continue
+        imgs.append(img)
+        pending.append((job, q))
+
+    if pending and jobs[0]["scan_type"] == "breed" and _WORKER["dog_gate"]:
+        presence = _WORKER["dog_gate"].check_batch(imgs)
+        for (job, q), p in zip(pending, presence):
+            if not p["is_dog"]:
+                rows.append(result_row(job, ms.version, result_type="no_dog",
+                                       result=json.dumps({"dog_presence": p, "quality": q})))
+        pending = [jq for jq, p in zip(pending, presence) if p["is_dog"]]
+        imgs    = [img for img, p in zip(imgs, presence) if p["is_dog"]]
+
+    if pending and jobs[0]["scan_type"] == "breed":
+        if _WORKER["localize"]:
+            import localize
+            breed_model = getattr(ms.models["breed"], "wrapped", ms.models["breed"])
+            imgs = [crop for crop, _ in localize.localize_images(imgs, breed_model)]
+        probs    = predict_breed_probs(imgs, ms.models["breed"], [q["action"] for _, q in pending],
+                                       ms.serving["breed"]["tta"])
+        breeds   = postprocess.analyze_breeds(probs, ms.labels["breed"], k=3, temperature=ms.calibration["breed_temperature"])
+        emotions = postprocess.top1_results(predict_simple_batch(imgs, ms.models["emotion"]), ms.labels["emotion"])
+        ages     = postprocess.top1_results(predict_simple_batch(imgs, ms.models["age"]),     ms.labels["age"])
+        for (job, q), b, e, a in zip(pending, breeds, emotions, ages):
+            top = b["top_breeds"][0] if b["top_breeds"] else {}
+            rows.append(result_row(job, ms.version,
+                                   top_result=top.get("display_name") or top.get("class_name"),
+                                   confidence=top.get("confidence"), result_type=b["result_type"],
+                                   result=json.dumps({**b, "emotion": e, "age": a, "quality": q})))
+    elif pending:
+        diseases = postprocess.ranked_results(predict_simple_batch(imgs, ms.models["disease"]), ms.labels["disease"], k=3)
+        for (job, q), d in zip(pending, diseases):
+            top = d[0] if d else {}
+            rows.append(result_row(job, ms.version,
+                                   top_result=top.get("display_name") or top.get("class_name") or "Unknown",
+                                   confidence=top.get("confidence"), result_type="disease",
+                                   result=json.dumps({"top_diseases": d, "quality": q})))
+
+    busy = time.perf_counter() - started
+    if _WORKER["duty"] < 1.0:
+        time.sleep(busy * (1.0 / _WORKER["duty"] - 1.0))     # idle to stay within the CPU share
+    return rows
+
+# -----------------------------
+# DRIVER
+# -----------------------------
+def make_batches(jobs, batch_size):
+    batches = []
+    for scan_type in SCAN_TYPES:
+        typed = [j for j in jobs if j["scan_type"] == scan_type]
+        batches += [typed[i:i + batch_size] for i in range(0, len(typed), batch_size)]
+    return batches
+
+def plan_workers(cpu_share, workers=None, tf_threads=TF_THREADS):
+    """(workers, duty cycle) so that busy CPU ≈ cpu_share × cores."""
+    budget = max(0.05, cpu_share * (os.cpu_count() or 1))
+    workers = workers or max(1, math.floor(budget / tf_threads))
+    duty = min(1.0, budget / (workers * tf_threads))
+    return workers, duty
+
+def run(args):
+    import model_registry
+    version = args.version or model_registry.current_version(args.models_dir)
+    out = args.out or os.path.join(BASE_DIR, f"rescore_{version}.sqlite")
+    conn = open_output(out, version, args.force)
+
+    jobs = read_jobs(args.input, args.image_root, args.image_dir, args.scan_type)
+    unknown = [j for j in jobs if j["scan_type"] not in SCAN_TYPES]
+    if unknown:
+        log.warning("Skipping %d scans with unknown scan_type (e.g. %s)", len(unknown), unknown[0]["scan_type"])
+    done = finished_ids(conn, version, args.retry_errors)
+    todo = [j for j in jobs if j["scan_type"] in SCAN_TYPES and j["scan_id"] not in done]
+    batches = make_batches(todo, args.batch)
+    workers, duty = plan_workers(args.cpu_share, args.workers, args.tf_threads)
+    print(f"Model version {version}: {len(jobs)} scans, {len(jobs) - len(todo)} already done, "
+          f"{len(todo)} to score in {len(batches)} batches on {workers} workers "
+          f"x {args.tf_threads} threads (duty {duty:.0%}) -> {out}")
+    if not batches:
+        return out
+
+    started, scored = time.perf_counter(), 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(version, args.models_dir, args.tf_threads, duty)) as pool:
+        queue, in_flight = list(reversed(batches)), set()
+        while queue or in_flight:
+            while queue and len(in_flight) < workers * 2:      # bounded look-ahead, not the whole backlog
+                in_flight.add(pool.submit(score_batch, queue.pop()))
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                rows = fut.result()
+                save_rows(conn, rows)
+                scored += len(rows)
+                rate = scored / (time.perf_counter() - started)
+                print(f"  {scored}/{len(todo)} scans  {rate:.1f}/s  ETA {(len(todo) - scored) / max(rate, 1e-9) / 60:.1f} min")
+
+    summary = conn.execute("SELECT COUNT(*), SUM(changed), SUM(error IS NOT NULL) FROM rescored "
+                           "WHERE model_version = ?", (version,)).fetchone()
+    stale = conn.execute("SELECT COUNT(*) FROM rescored WHERE model_version != ?", (version,)).fetchone()[0]
+    print(f"Done: {summary[0]} scans in {out} — {summary[1] or 0} changed top result, {summary[2] or 0} errors"
+          + (f", {stale} rows from another model version (not in this input)" if stale else ""))
+    return out
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Re-score saved scans with the current (or a given) model version")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--input", help="CSV / JSON-lines export: scan_id, scan_type, image, top_result, confidence")
+    src.add_argument("--image_dir", help="score every image below this folder")
+    p.add_argument("--image_root", default="", help="base folder for relative image paths in --input")
+    p.add_argument("--scan_type", default="breed", choices=SCAN_TYPES, help="for --image_dir / rows without one")
+    p.add_argument("--models_dir", default=MODELS_DIR)
+    p.add_argument("--version", default=None, help="registry version (default: current)")
+    p.add_argument("--out", default=None, help="SQLite output (default: rescore_<version>.sqlite)")
+    p.add_argument("--batch", type=int, default=BATCH_SIZE)
+    p.add_argument("--cpu_share", type=float, default=CPU_SHARE, help="share of all cores to use, e.g. 0.5")
+    p.add_argument("--workers", type=int, default=None, help="default: sized from --cpu_share")
+    p.add_argument("--tf_threads", type=int, default=TF_THREADS)
+    p.add_argument("--retry_errors", action="store_true", help="re-score scans that failed last time")
+    p.add_argument("--force", action="store_true", help="allow an output file from another model version")
+    return p.parse_args()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    run(parse_args())
@@ -0,0 +1,253 @@
+"""
+shadow.py  —  DogScan AI  |  Shadow evaluation of a candidate breed model
+
+Mirrors a fraction of /predict/breed requests to a candidate model. The request
+thread only does a random draw and a non-blocking put on a bounded queue — when
+the queue is full the sample is dropped, never waited for. A background thread
+hands each sample to a separate, niced worker process that owns the candidate
+with its own capped TF thread pools (SHADOW_THREADS): a thread nice inside the
+API process would not help, since the candidate's ops would still run on the
+process-wide TF pools at normal priority, next to production requests. The
+candidate is served the way it would be in production: its own .serving.json
+decides TTA (a distilled student runs single-pass). A worker that dies or fails
+to load is restarted with backoff; samples arriving meanwhile are counted as
+"unavailable". Each comparison (top-1 agreement/flip, top-3 overlap, latency
+of both models) goes to an in-memory rolling window and a local JSON-lines log.
+
+Config (env):
+  SHADOW_MODEL_PATH   candidate .h5 / SavedModel (unset = shadow mode off)
+  SHADOW_FRACTION     share of requests mirrored            (default 0.1)
+  SHADOW_QUEUE_SIZE   pending samples before dropping       (default 16)
+  SHADOW_THREADS      TF intra-op threads of the worker     (default 1)
+  SHADOW_WINDOW       comparisons kept for /shadow/summary  (default 1000)
+  SHADOW_LOG          JSON-lines log file                   (default models/shadow_log.jsonl)
+"""
+
+import os, sys, json, time, queue, pickle, random, logging, threading, subprocess
+from collections import deque
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+LOG_MAX_BYTES = 20 * 1024 * 1024      # rotated to <log>.1 beyond this
+NICE_INCREMENT = 10
+SHADOW_THREADS = 1
+RESTART_BACKOFF_S     = 5.0     # first retry after a worker death / load failure ...
+MAX_RESTART_BACKOFF_S = 300.0   # ... doubling up to this
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 2) if values else None
+
+# -----------------------------
+# Worker process (owns the candidate)
+# -----------------------------
+def worker_main(model_path, threads):
+    """`python shadow.py --worker <model> <threads>`: a fresh interpreter (not a fork of the
+    API process, not a re-import of app.py) speaking pickled (predict_fn, pil_img) requests
+    on stdin and (status, payload) replies on stdout."""
+    out = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)                                   # stray prints / TF logs go to stderr, not the pipe
+    try:
+        os.nice(NICE_INCREMENT)
+    except (AttributeError, OSError):
+        pass
+    try:
+        import tensorflow as tf
+        from model_registry import load_serving
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+        model = tf.keras.models.load_model(model_path)
+        tta = load_serving(model_path, "breed")["tta"]
+    except Exception as e:
+        pickle.dump(("error", repr(e)), out)
+        out.flush()
+        return
+    pickle.dump(("ready", {"tta": tta}), out)
+    out.flush()
+    while True:
+        try:
+            predict_fn, pil_img = pickle.load(sys.stdin.buffer)
+        except EOFError:
+            return
+        try:
+            started = time.perf_counter()
+            # only quality-"full" requests are mirrored, so the action is always "full"
+            probs = np.asarray(predict_fn([pil_img], model, ["full"], tta)[0])
+            reply = ("ok", (probs, (time.perf_counter() - started) * 1000))
+        except Exception as e:
+            reply = ("error", repr(e))
+        pickle.dump(reply, out)
+        out.flush()
+
+class ShadowEvaluator:
+    def __init__(self, model_path, predict_fn, fraction=0.1, queue_size=16, window=1000, log_path=None,
+                 threads=SHADOW_THREADS):
+        self.model_path = model_path
+        self.predict_fn = predict_fn           # predict_breed_probs(pil_imgs, model, actions, tta) (module-level: pickled)
+        self.threads    = threads
+        self.fraction   = fraction
+        self.log_path   = log_path
+        self.records    = deque(maxlen=window)
+        self.queue      = queue.Queue(maxsize=queue_size)
+        self.candidate  = None
+        self.candidate_serving = None
+        self.load_error = None
+        self.retry_at   = 0.0
+        self.backoff    = RESTART_BACKOFF_S
+        self.submitted  = 0
+        self.dropped    = 0
+        self.failed     = 0
+        self.unavailable = 0
+        self.restarts   = 0
+        self._lock      = threading.Lock()
+        threading.Thread(target=self._worker, name="shadow-eval", daemon=True).start()
+
+    @classmethod
+    def from_env(cls, predict_fn, models_dir):
+        path = os.environ.get("SHADOW_MODEL_PATH")
+        if not path:
+            return None
+        return cls(
+            path, predict_fn,
+            fraction=float(os.environ.get("SHADOW_FRACTION", "0.1")),
+            queue_size=int(os.environ.get("SHADOW_QUEUE_SIZE", "16")),
+            window=int(os.environ.get("SHADOW_WINDOW", "1000")),
+            log_path=os.environ.get("SHADOW_LOG", os.path.join(models_dir, "shadow_log.jsonl")),
+            threads=int(os.environ.get("SHADOW_THREADS", SHADOW_THREADS)),
+        )
+
+    def submit(self, pil_img, primary_probs, primary_ms, primary_version):
+        """Called on the request thread — O(1), never blocks."""
+        if random.random() >= self.fraction:
+            return False
+        try:
+            self.queue.put_nowait((pil_img, primary_probs, primary_ms, primary_version))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if self.candidate is None and time.time() >= self.retry_at:
+                    self._load_candidate()
+                if self.candidate is None:
+                    with self._lock:
+                        self.unavailable += 1          # no worker (down, backing off): sample not compared
+                    continue
+                self._compare(*job)
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                log.exception("Shadow comparison failed")
+
+    def _worker_down(self, error):
+        """Forget the worker; the next start is attempted after the current backoff."""
+        self.candidate  = None
+        self.load_error = error
+        self.retry_at   = time.time() + self.backoff
+        log.error("Shadow worker for %s down (%s) — retrying in %.0fs", self.model_path, error, self.backoff)
+        self.backoff    = min(MAX_RESTART_BACKOFF_S, self.backoff * 2)
+
+    def _load_candidate(self):
+        """Start the worker process (first sample, or a restart); it loads the candidate and says "ready"."""
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker",
+                                 self.model_path, str(self.threads)],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        try:
+            status, payload = pickle.load(proc.stdout)
+        except EOFError:
+            status, payload = "error", f"worker exited with code {proc.wait()}"
+        if status != "ready":
+            proc.kill()
+            self._worker_down(payload)
+            return
+        if self.load_error is not None:
+            with self._lock:
+                self.restarts += 1
+        self.candidate, self.candidate_serving = proc, payload
+        self.load_error, self.backoff = None, RESTART_BACKOFF_S
+        log.info("Shadow candidate %s loaded in a worker process (pid %d, %d threads, nice +%d, tta %s)",
+                 self.model_path, proc.pid, self.threads, NICE_INCREMENT, payload["tta"])
+
+    def _predict_candidate(self, pil_img):
+        try:
+            pickle.dump((self.predict_fn, pil_img), self.candidate.stdin)
+            self.candidate.stdin.flush()
+            status, payload = pickle.load(self.candidate.stdout)
+        except (EOFError, OSError):
+            self._worker_down(f"worker exited with code {self.candidate.wait()}")
+            raise RuntimeError(self.load_error) from None
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def _compare(self, pil_img, primary_probs, primary_ms, primary_version):
+        cand_probs, cand_ms = self._predict_candidate(pil_img)
+
+        p_top3 = np.argsort(primary_probs)[::-1][:3]
+        c_top3 = np.argsort(cand_probs)[::-1][:3]
+        record = {
+            "ts":              round(time.time(), 3),
+            "primary_version": primary_version,
+            "primary_top1":    int(p_top3[0]),
+            "candidate_top1":  int(c_top3[0]),
+            "agree":           bool(p_top3[0] == c_top3[0]),
+            "top3_overlap":    len(set(p_top3.tolist()) & set(c_top3.tolist())),
+            "primary_conf":    round(float(primary_probs[p_top3[0]]), 4),
+            "candidate_conf":  round(float(cand_probs[c_top3[0]]), 4),
+            "l1_distance":     round(float(np.abs(primary_probs - cand_probs).sum()), 4),
+            "primary_ms":      round(primary_ms, 2),
+            "candidate_ms":    round(cand_ms, 2),
+        }
+        with self._lock:
+            self.records.append(record)
+        self._append_log(record)
+
+    def _append_log(self, record):
+        if not self.log_path:
+            return
+        if os.path.isfile(self.log_path) and os.path.getsize(self.log_path) > LOG_MAX_BYTES:
+            os.replace(self.log_path, self.log_path + ".1")
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def summary(self):
+        with self._lock:
+            records = list(self.records)
+            counters = {"submitted": self.submitted, "dropped": self.dropped, "failed": self.failed,
+                        "unavailable": self.unavailable, "restarts": self.restarts}
+        n = len(records)
+        agree = sum(r["agree"] for r in records)
+        return {
+            "candidate":      self.model_path,
+            "load_error":     self.load_error,
+            "candidate_tta":  self.candidate_serving["tta"] if self.candidate_serving else None,
+            "fraction":       self.fraction,
+            "queued":         self.queue.qsize(),
+            **counters,
+            "compared":       n,
+            "agreement_rate": round(agree / n, 4) if n else None,
+            "top1_flips":     n - agree,
+            "mean_top3_overlap": round(sum(r["top3_overlap"] for r in records) / n, 3) if n else None,
+            "latency_ms": {
+                "primary":   {"p50": percentile([r["primary_ms"] for r in records], 50),
+                              "p95": percentile([r["primary_ms"] for r in records], 95)},
+                "candidate": {"p50": percentile([r["candidate_ms"] for r in records], 50),
+                              "p95": percentile([r["candidate_ms"] for r in records], 95)},
+            },
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        worker_main(sys.argv[2], int(sys.argv[3]))
+    else:
+        sys.exit("usage: python shadow.py --worker <model_path> <threads>  (started by ShadowEvaluator)")
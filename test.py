@@ -3,6 +3,8 @@ import shutil
 import json
 from pathlib import Path
 
+import dataset_manifest
+
 # ========== Configuration ==========
 TRAIN_DIR = "dogs"  # Your training folder with breed subfolders
 OUTPUT_DIR = "breed_library_images"  # Where to save the extracted images
@@ -26,30 +28,36 @@ extracted_count = 0
 skipped_count = 0
 image_mapping = []
 
-# Process each breed folder
-breed_folders = sorted([f for f in os.listdir(TRAIN_DIR) 
-                       if os.path.isdir(os.path.join(TRAIN_DIR, f))])
+# Read the dataset manifest instead of listing every breed folder again
+manifest = dataset_manifest.load_manifest(TRAIN_DIR)
+images_by_breed = {}
+for entry in manifest:
+    if entry["path"].lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.webp')):
+        images_by_breed.setdefault(entry["class_name"], []).append(entry)
+# Walk class_info and match folders by class_name, never by position: a breed
+# folder without images is not in the manifest and would shift every later id
+unknown = sorted(set(dataset_manifest.class_names(manifest)) - {b['class_name'] for b in class_info})
+if unknown:
+    print(f"⚠️  Folders not in {CLASS_INFO_FILE}: {unknown}")
 
-for idx, folder_name in enumerate(breed_folders):
-    folder_path = os.path.join(TRAIN_DIR, folder_name)
-    
-    # Get all image files in this folder
-    image_files = [f for f in os.listdir(folder_path) 
-                   if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.webp'))]
+for breed in class_info:
+    idx = breed['class_index']
+    folder_name = breed['class_name']
+    # Manifest entries for this breed (sorted by path)
+    image_files = [e["path"].split("/", 1)[1] for e in images_by_breed.get(folder_name, [])]
     
     if not image_files:
         print(f"⚠️  Skipped: {folder_name} (no images found)")
         skipped_count += 1
         continue
     
-    # Get breed info from class_info.json
-    breed = class_info[idx]
+    # Breed info from class_info.json
     breed_id = breed['breed_id']
     breed_name = breed['display_name']
     class_name = breed['class_name']
     
     # Select the first image
-    source_image_path = os.path.join(folder_path, image_files[0])
+    source_image_path = os.path.join(TRAIN_DIR, folder_name, image_files[0])
     
     # Get file extension
     file_extension = os.path.splitext(image_files[0])[1].lower()
@@ -95,7 +103,8 @@ print(f"   • Mapping saved to: {mapping_file}")
 
 print("\n📋 NEXT STEPS:")
 print("   1. Check the images in 'breed_library_images/' folder")
-print("   2. Copy them to your project: public/images/breeds/")
+print("   2. Copy them to your project: frontend/public/image/breed_library_images/")
+print("      then run 'python build_breed_assets.py' to rebuild thumbnails + placeholders")
 print("   3. Run 'python generate_chatgpt_prompt.py' to create the prompt")
 print("   4. Use ChatGPT to generate full breed data")
 print("="*70)
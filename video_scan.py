@@ -0,0 +1,246 @@
+"""
+video_scan.py  —  DogScan AI  |  Multi-frame scan: frame selection + temporal aggregation
+
+Pure NumPy / Pillow helpers behind POST /predict/breed/stream in app.py:
+  • frame sources   uploaded stills, animated GIF / WebP clips, or video files
+                    (video needs the optional opencv-python package)
+  • FrameSelector   time-based sampling that backs off while the scene is static,
+                    plus a cheap frame-difference check (32 px grayscale, against
+                    the previous sampled frame, global and local change) that
+                    drops near-identical frames before any model runs, with a
+                    keyframe at least every KEYFRAME_INTERVAL_S
+  • TemporalAggregator  weighted running mean of the per-frame probabilities with
+                    a stability rule for early stopping
+
+Frames replace TTA here: each kept frame gets one pass, and the aggregate over
+frames plays the role of the rotation / flip average.
+"""
+
+import io, os, tempfile
+import numpy as np
+from PIL import Image, ImageSequence
+
+from quality import grayscale_small
+
+SAMPLE_FPS       = 4.0      # base sampling rate for timed sources (clips)
+MAX_INTERVAL_S   = 1.0      # slowest sampling while nothing changes
+BACKOFF          = 1.5      # interval growth per near-duplicate frame
+DIFF_SIZE        = 32       # px, longest side of the difference thumbnail
+DIFF_THRESHOLD   = 6.0      # mean abs gray difference (0-255) below which a frame is a duplicate
+PIXEL_DELTA      = 25.0     # a thumbnail pixel counts as changed beyond this gray difference ...
+CHANGED_SHARE    = 0.01     # ... and a frame is new once this share of pixels changed (small moving dog)
+KEYFRAME_INTERVAL_S = 1.0   # timed sources: select a frame at least this often, duplicate or not
+KEYFRAME_FRAMES  = 4        # untimed stills: ... or at least every this many frames
+MAX_DECODED      = 900      # frames decoded per request, at most
+FRAME_SIDE       = 1024     # px, frames are decoded / downscaled to this longest side (models run far below)
+MAX_FRAME_PIXELS = 50_000_000       # per frame, read from the header before decoding
+MAX_TOTAL_PIXELS = 2_000_000_000    # source pixels per request (stills: checked up front; clips: ends the clip)
+MAX_SELECTED     = 24       # frames sent to the models, at most
+BATCH_FRAMES     = 4        # frames per model batch / per streamed update
+MIN_FRAMES       = 4        # never stop before this many frames were used
+STABLE_UPDATES   = 2        # same top-1 for this many consecutive updates ...
+STABLE_CONFIDENCE = 0.75    # ... with at least this aggregated confidence -> stop early
+REDUCED_WEIGHT   = 0.5      # weight of frames the quality gate marked "reduced"
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".webm", ".avi", ".3gp")
+
+# -----------------------------
+# FRAME SOURCES — each yields (timestamp_s or None, load) where load() returns the
+# PIL RGB frame, at most FRAME_SIDE px; FrameSelector only calls it for sampled frames
+# -----------------------------
+def fit_frame(img):
+    """RGB, longest side <= FRAME_SIDE. JPEGs decode straight at reduced scale (draft)."""
+    img.draft("RGB", (FRAME_SIDE, FRAME_SIDE))
+    frame = img.convert("RGB")
+    frame.thumbnail((FRAME_SIDE, FRAME_SIDE), Image.BILINEAR)
+    return frame
+
+def check_frame_size(width, height, what):
+    if width * height > MAX_FRAME_PIXELS:
+        raise ValueError(f"{what} is {width}x{height} px, more than {MAX_FRAME_PIXELS // 1_000_000} MP")
+    return width * height
+
+def frames_from_images(blobs):
+    """Stills: headers are read and size-checked up front (ValueError -> 400 before any
+    streaming starts); pixels are decoded one frame at a time, only for sampled frames."""
+    images, total = [], 0
+    for i, blob in enumerate(blobs[:MAX_DECODED]):
+        try:
+            img = Image.open(io.BytesIO(blob))
+        except Exception as e:
+            raise ValueError(f"frame {i} is not a readable image ({type(e).__name__})") from None
+        total += check_frame_size(*img.size, f"frame {i}")
+        if total > MAX_TOTAL_PIXELS:
+            raise ValueError(f"frames add up to more than {MAX_TOTAL_PIXELS // 1_000_000} MP")
+        images.append(img)
+    if not images:
+        raise ValueError("no frames in the upload")
+    return ((None, (lambda img=img: fit_frame(img))) for img in images)
+
+def frames_from_animation(blob):
+    """Animated GIF / WebP / APNG; single images yield one frame."""
+    img = Image.open(io.BytesIO(blob))
+    canvas = check_frame_size(*img.size, "the clip")
+    t = 0.0
+    for index, frame in enumerate(ImageSequence.Iterator(img)):
+        if (index + 1) * canvas > MAX_TOTAL_PIXELS:
+            return
+        yield t, (lambda frame=frame: fit_frame(frame))
+        t += frame.info.get("duration", 100) / 1000.0
+
+def frames_from_video(blob, suffix=".mp4"):
+    try:
+        import cv2
+    except ImportError:
+        raise ValueError("Video clips need opencv-python on the model server; send frames or a GIF instead") from None
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        f.write(blob)
+        path = f.name
+    cap = cv2.VideoCapture(path)
+
+    def retrieve():
+        ok, frame = cap.retrieve()
+        if not ok:
+            raise ValueError("video frame could not be decoded")
+        return fit_frame(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        canvas = check_frame_size(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                                  "the clip")
+        index = 0
+        while (index + 1) * canvas <= MAX_TOTAL_PIXELS and cap.grab():     # grab only; retrieve if sampled
+            yield index / fps, retrieve
+            index += 1
+    finally:
+        cap.release()
+        os.unlink(path)
+
+def frames_from_clip(blob, filename=""):
+    """Decodes the first frame eagerly (ValueError if the clip cannot be read); later frames
+    stream lazily and a frame that fails to decode ends the clip there."""
+    if filename.lower().endswith(VIDEO_EXTENSIONS):
+        frames = frames_from_video(blob, os.path.splitext(filename)[1])
+    else:
+        frames = frames_from_animation(blob)
+    try:
+        ts, load = next(frames)
+        first = (ts, load())
+    except ValueError:
+        raise
+    except StopIteration:
+        raise ValueError("the clip has no decodable frames") from None
+    except Exception as e:
+        raise ValueError(f"the clip is not a readable GIF / WebP / video ({type(e).__name__})") from None
+    return _truncate_on_error(first, frames)
+
+def _truncate_on_error(first, frames):
+    yield first
+    try:
+        yield from frames
+    except Exception:
+        return
+
+# -----------------------------
+# FRAME SELECTION
+# -----------------------------
+def frame_difference(a, b):
+    if a.shape != b.shape:
+        return float("inf")
+    return float(np.abs(a - b).mean())
+
+def changed_share(a, b, delta=PIXEL_DELTA):
+    if a.shape != b.shape:
+        return 1.0
+    return float((np.abs(a - b) > delta).mean())
+
+def is_duplicate(a, b, diff_threshold=DIFF_THRESHOLD):
+    """Near-identical thumbnails: little change overall and no local change either."""
+    return frame_difference(a, b) < diff_threshold and changed_share(a, b) < CHANGED_SHARE
+
+class FrameSelector:
+    """Decides per decoded frame whether it is worth a model pass."""
+
+    def __init__(self, sample_fps=SAMPLE_FPS, diff_threshold=DIFF_THRESHOLD, max_selected=MAX_SELECTED):
+        self.base_interval  = 1.0 / sample_fps
+        self.interval       = self.base_interval
+        self.diff_threshold = diff_threshold
+        self.max_selected   = max_selected
+        self.last_time      = None       # last sampled frame
+        self.last_thumb     = None
+        self.selected_time  = None       # last selected frame
+        self.since_selected = 0
+        self.counts         = {"decoded": 0, "selected": 0, "not_sampled": 0, "duplicate": 0, "keyframe": 0,
+                               "unreadable": 0}
+
+    @property
+    def full(self):
+        return self.counts["selected"] >= self.max_selected
+
+    def keyframe_due(self, timestamp):
+        if timestamp is not None and self.selected_time is not None:
+            return timestamp - self.selected_time >= KEYFRAME_INTERVAL_S
+        return self.since_selected >= KEYFRAME_FRAMES
+
+    def offer(self, timestamp, frame):
+        """`frame` is a PIL image or a source's load(); the pixels are only decoded once the
+        frame is sampled. Returns the image if it is selected, else None."""
+        self.counts["decoded"] += 1
+        self.since_selected += 1
+        if timestamp is not None and self.last_time is not None and timestamp - self.last_time < self.interval:
+            self.counts["not_sampled"] += 1
+            return None
+        try:
+            pil_img = frame() if callable(frame) else frame
+        except Exception:
+            self.counts["unreadable"] += 1           # header was fine, the pixel data is not
+            return None
+        # compare with the previous sampled frame, not the last selected one: against a fixed
+        # reference a small dog moving in front of a static background never crosses the threshold
+        thumb = grayscale_small(pil_img, DIFF_SIZE)
+        previous, self.last_thumb = self.last_thumb, thumb
+        if timestamp is not None:
+            self.last_time = timestamp
+        if previous is not None and is_duplicate(thumb, previous, self.diff_threshold):
+            if not self.keyframe_due(timestamp):
+                self.counts["duplicate"] += 1
+                self.interval = min(MAX_INTERVAL_S, self.interval * BACKOFF)    # static scene: look less often
+                return None
+            self.counts["keyframe"] += 1
+        else:
+            self.interval = self.base_interval
+        self.selected_time  = timestamp
+        self.since_selected = 0
+        self.counts["selected"] += 1
+        return pil_img
+
+# -----------------------------
+# TEMPORAL AGGREGATION
+# -----------------------------
+class TemporalAggregator:
+    """Weighted running mean of per-frame probabilities for each model head."""
+
+    def __init__(self):
+        self.sums    = {}
+        self.weight  = 0.0
+        self.frames  = 0
+        self.top1_history = []
+
+    def add(self, probs_by_head, weights):
+        weights = np.asarray(weights, dtype=np.float32)
+        for head, probs in probs_by_head.items():
+            contrib = (np.asarray(probs, dtype=np.float32) * weights[:, None]).sum(axis=0)
+            self.sums[head] = self.sums.get(head, 0.0) + contrib
+        self.weight += float(weights.sum())
+        self.frames += len(weights)
+        self.top1_history.append(int(self.mean("breed").argmax()))
+
+    def mean(self, head):
+        return self.sums[head] / max(self.weight, 1e-12)
+
+    def stable(self, min_frames=MIN_FRAMES, updates=STABLE_UPDATES, confidence=STABLE_CONFIDENCE):
+        """Enough frames, same top-1 for the last `updates` updates and a confident aggregate."""
+        if self.frames < min_frames or len(self.top1_history) < updates:
+            return False
+        recent = self.top1_history[-updates:]
+        return len(set(recent)) == 1 and float(self.mean("breed").max()) >= confidence